@@ -81,6 +81,7 @@ from bpy.props import (
         )
 
 from . import auto_load
+from .measureit_arch_units import update_units
 auto_load.init()
 
 # --------------------------------------------------------------
@@ -167,7 +168,8 @@ def register():
                         ('32', "1/32\"", "1/32th Inch"),
                         ('64', "1/64\"", "1/64th Inch")),
                 name="Imperial Precision",
-                description="Measurement Precision for Imperial Units")                  
+                description="Measurement Precision for Imperial Units",
+                update=update_units)                  
     Scene.measureit_arch_use_depth_clipping = BoolProperty(name="Use Depth Clipping",
                                              description="Lines Behind Objects Won't Be Rendered (Slower)",
                                              default=True)
@@ -287,7 +289,8 @@ def register():
 
     Scene.measureit_arch_hide_units = BoolProperty(name="hide_units",
                                               description="Do not display unit of measurement on viewport",
-                                              default=False)
+                                              default=False,
+                                              update=update_units)
     Scene.measureit_arch_render = BoolProperty(name="Render",
                                           description="Save an image with measures over"
                                                       " render image",
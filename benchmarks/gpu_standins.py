@@ -0,0 +1,223 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: gpu_standins.py
+# Recording stand-ins for gpu, bgl, blf and gpu_extras. They count
+# the calls made by the draw functions instead of drawing, so the
+# Python side of drawing can be timed in background Blender
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import sys
+import types
+import zlib
+from collections import Counter
+
+
+# Calls made through the stand-ins, keyed by 'module.function'
+callCounts = Counter()
+
+# Vertices passed to batch_for_shader, and drawn with those batches
+vertexCounts = Counter()
+
+
+def reset_counts():
+    callCounts.clear()
+    vertexCounts.clear()
+
+
+class Recorder():
+    # Any attribute is another recorder, calling one counts the call
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        recorder = Recorder(self._name + '.' + attr)
+        setattr(self, attr, recorder)
+        return recorder
+
+    def __call__(self, *args, **kwargs):
+        callCounts[self._name] += 1
+        return ContextRecorder(self._name + '()')
+
+
+class ContextRecorder(Recorder):
+    # Returned by calls, usable in with statements (offscreen.bind(),
+    # gpu.matrix.push_pop())
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class Shader(Recorder):
+    # gpu.types.GPUShader, built from shader sources or given a name
+    def __init__(self, *args, **kwargs):
+        name = args[0] if len(args) == 1 else 'GPUShader'
+        Recorder.__init__(self, 'shader.' + name)
+
+
+class Batch():
+    def __init__(self, shader, primType, content, indices=None):
+        self.primType = primType
+        self.numVerts = 0
+        for attr in content.values():
+            self.numVerts = len(attr)
+            break
+        vertexCounts['batched'] += self.numVerts
+        callCounts['gpu_extras.batch.batch_for_shader'] += 1
+
+    def program_set(self, shader):
+        callCounts['batch.program_set'] += 1
+
+    def draw(self, shader=None):
+        callCounts['batch.draw'] += 1
+        vertexCounts['drawn'] += self.numVerts
+
+
+class GPUOffScreen(Recorder):
+    def __init__(self, width, height, *args, **kwargs):
+        Recorder.__init__(self, 'offscreen')
+        self.width = width
+        self.height = height
+        self.color_texture = 0
+        callCounts['gpu.types.GPUOffScreen'] += 1
+
+
+class Buffer(bytearray):
+    # bgl.Buffer backed by zeroed bytes, glReadPixels leaves it empty
+    def __init__(self, glType, dimensions, data=None):
+        size = dimensions
+        if not isinstance(dimensions, int):
+            size = 1
+            for dim in dimensions:
+                size *= dim
+        itemSize = 4 if glType in (bgl.GL_INT, bgl.GL_FLOAT) else 1
+        bytearray.__init__(self, size * itemSize)
+        self.glType = glType
+        self.length = size
+        callCounts['bgl.Buffer'] += 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, int):
+            return 0
+        return bytearray.__getitem__(self, idx)
+
+    def to_list(self):
+        return [0] * self.length
+
+
+class GLModule(types.ModuleType):
+    # GL_ constants are stable ints, gl functions are recorders
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        if attr.startswith('GL_'):
+            value = zlib.crc32(attr.encode()) & 0xffff
+        else:
+            value = Recorder('bgl.' + attr)
+        setattr(self, attr, value)
+        return value
+
+
+bgl = GLModule('bgl')
+bgl.__all__ = ['Buffer']
+bgl.Buffer = Buffer
+
+
+class FontModule(types.ModuleType):
+    # Text is measured from its length so sizes are the same everywhere
+    ROTATION = 1
+    CLIPPING = 2
+    SHADOW = 4
+
+    def __init__(self, name):
+        types.ModuleType.__init__(self, name)
+        self.sizes = {}
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'):
+            raise AttributeError(attr)
+        recorder = Recorder('blf.' + attr)
+        setattr(self, attr, recorder)
+        return recorder
+
+    def load(self, filepath):
+        callCounts['blf.load'] += 1
+        return 1
+
+    def size(self, font_id, size, dpi=72):
+        callCounts['blf.size'] += 1
+        self.sizes[font_id] = size * dpi / 72
+
+    def dimensions(self, font_id, text):
+        callCounts['blf.dimensions'] += 1
+        size = self.sizes.get(font_id, 11)
+        return (len(text) * size * 0.55, size * 0.75)
+
+
+blf = FontModule('blf')
+
+
+def install():
+    # Must run before the add-on is imported
+    gpu = types.ModuleType('gpu')
+    gpu.types = types.ModuleType('gpu.types')
+    gpu.types.GPUShader = Shader
+    gpu.types.GPUOffScreen = GPUOffScreen
+    gpu.shader = types.ModuleType('gpu.shader')
+    gpu.shader.unbind = Recorder('gpu.shader.unbind')
+    gpu.shader.from_builtin = Shader
+    gpu.matrix = Recorder('gpu.matrix')
+    gpu.state = Recorder('gpu.state')
+
+    gpuExtras = types.ModuleType('gpu_extras')
+    gpuExtras.batch = types.ModuleType('gpu_extras.batch')
+    gpuExtras.batch.batch_for_shader = Batch
+    gpuExtras.presets = types.ModuleType('gpu_extras.presets')
+    gpuExtras.presets.draw_texture_2d = Recorder('gpu_extras.presets.draw_texture_2d')
+
+    sys.modules['gpu'] = gpu
+    sys.modules['gpu.types'] = gpu.types
+    sys.modules['gpu.shader'] = gpu.shader
+    sys.modules['gpu_extras'] = gpuExtras
+    sys.modules['gpu_extras.batch'] = gpuExtras.batch
+    sys.modules['gpu_extras.presets'] = gpuExtras.presets
+    sys.modules['bgl'] = bgl
+    sys.modules['blf'] = blf
+
+
+# Module level shaders of the add-on, only created outside of
+# background mode, see measureit_arch_geometry.py
+shaderNames = ('shader', 'lineShader', 'lineGroupShader', 'triShader', 'dashedLineShader',
+               'depthShader', 'pointShader', 'textShader')
+
+
+def install_shaders(modules):
+    # Background sessions leave the add-on's shaders as None, give
+    # every module that holds them a recording shader instead
+    shaders = {name: Shader(name) for name in shaderNames}
+    for module in modules:
+        for name in shaderNames:
+            if name in module.__dict__ and module.__dict__[name] is None:
+                setattr(module, name, shaders[name])
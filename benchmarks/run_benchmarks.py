@@ -0,0 +1,232 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: run_benchmarks.py
+# Times the Python side of the draw, text, crease and render paths
+# on synthetic scenes, with gpu, bgl and blf replaced by recording
+# stand-ins. Runs in background Blender, no GPU needed:
+#
+#   blender -b --factory-startup --python benchmarks/run_benchmarks.py -- \
+#       [--scale small|medium|large] [--repeat N] [--baseline FILE]
+#       [--save-baseline] [--tolerance 1.25] [--output FILE]
+#
+# Results are compared with the baseline of the same scale, the run
+# fails when a case is slower than tolerance x its baseline median.
+# Baselines are machine dependent, record them with --save-baseline
+# on the machine that checks them
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+import types
+
+import bpy
+from mathutils import Quaternion
+
+benchDir = os.path.dirname(os.path.abspath(__file__))
+addonDir = os.path.dirname(benchDir)
+sys.path.insert(0, benchDir)
+
+import gpu_standins
+gpu_standins.install()
+
+sys.path.insert(0, os.path.dirname(addonDir))
+addon = importlib.import_module(os.path.basename(addonDir))
+
+import synthetic_scene
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else []
+    parser = argparse.ArgumentParser(prog='run_benchmarks.py')
+    parser.add_argument('--scale', choices=sorted(synthetic_scene.scales), default='medium')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--baseline', default=os.path.join(benchDir, 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    parser.add_argument('--output', default='')
+    return parser.parse_args(argv)
+
+
+def get_addon_modules():
+    return [module for name, module in sys.modules.items()
+            if module is not None and (name == addon.__name__ or name.startswith(addon.__name__ + '.'))]
+
+
+def bench_context(scene, objects):
+    # Stands in for a 3D viewport's context, the draw functions read
+    # the area size and the region view from it
+    region3d = types.SimpleNamespace(view_rotation=Quaternion((0.8, 0.3, 0.2, 0.5)).normalized(),
+                                     view_perspective='PERSP')
+    spaceData = types.SimpleNamespace(type='VIEW_3D', region_quadviews=[], region_3d=region3d)
+    area = types.SimpleNamespace(type='VIEW_3D', width=1280, height=720, spaces=[spaceData],
+                                 tag_redraw=lambda: None)
+    return types.SimpleNamespace(
+        scene=scene,
+        view_layer=bpy.context.view_layer,
+        area=area,
+        region=None,
+        space_data=spaceData,
+        selected_objects=objects,
+        object=objects[0],
+        window=None,
+        window_manager=bpy.context.window_manager,
+    )
+
+
+def time_case(func, repeat, setup=None):
+    # First call separately, later calls reuse cached batches and text
+    times = []
+    for idx in range(repeat + 1):
+        if setup is not None:
+            setup()
+        gpu_standins.reset_counts()
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    warm = sorted(times[1:])
+    return {
+        'first_ms': round(times[0], 3),
+        'median_ms': round(warm[len(warm) // 2], 3),
+        'min_ms': round(warm[0], 3),
+        'max_ms': round(warm[-1], 3),
+        'calls': sum(gpu_standins.callCounts.values()),
+        'verts_drawn': gpu_standins.vertexCounts['drawn'],
+    }
+
+
+def run_cases(args):
+    geometry = importlib.import_module(addon.__name__ + '.measureit_arch_geometry')
+    main = importlib.import_module(addon.__name__ + '.measureit_arch_main')
+    render = importlib.import_module(addon.__name__ + '.measureit_arch_render')
+    baseclass = importlib.import_module(addon.__name__ + '.measureit_arch_baseclass')
+
+    addon.register()
+    gpu_standins.install_shaders(get_addon_modules())
+
+    scene = bpy.context.scene
+    objects = synthetic_scene.build_scene(args.scale, geometry.add_line_group_pairs)
+    context = bench_context(scene, objects)
+    scene.measureit_arch_gl_ghost = True
+
+    def flag_text():
+        for obj in objects:
+            for dims in (obj.DimensionGenerator[0].alignedDimensions, obj.DimensionGenerator[0].axisDimensions,
+                         obj.DimensionGenerator[0].angleDimensions, obj.DimensionGenerator[0].arcDimensions,
+                         obj.AnnotationGenerator[0].annotations):
+                for item in dims:
+                    baseclass.queue_text_update(item)
+
+    def add_creases():
+        bpy.ops.measureit_arch.addlinebyproperty(use_approximate=True)
+
+    def remove_creases():
+        for obj in objects:
+            lineGen = obj.LineGenerator[0]
+            while len(lineGen.line_groups) > synthetic_scene.scales[args.scale]['lineGroups']:
+                lineGen.line_groups.remove(len(lineGen.line_groups) - 1)
+                lineGen.line_num -= 1
+
+    # Render at least once so every text label has been rasterized
+    main.draw_main(context)
+
+    results = {}
+    results['draw_main'] = time_case(lambda: main.draw_main(context), args.repeat)
+    results['draw_main_3d'] = time_case(lambda: main.draw_main_3d(context), args.repeat)
+    results['draw_main_3d_cold'] = time_case(lambda: main.draw_main_3d(context), args.repeat,
+                                             setup=geometry.clear_batches)
+    results['update_text'] = time_case(lambda: main.draw_main(context), args.repeat, setup=flag_text)
+    results['render_main'] = time_case(lambda: render.render_main(None, context), args.repeat)
+    results['add_line_by_property'] = time_case(add_creases, max(args.repeat // 5, 1), setup=remove_creases)
+    remove_creases()
+
+    addon.unregister()
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Returns the cases slower than tolerance x their baseline
+    slower = []
+    print("\n%-24s %12s %12s %8s" % ("case", "median ms", "baseline ms", "ratio"))
+    for case, result in results.items():
+        base = baseline.get(case)
+        if base is None or base['median_ms'] == 0:
+            print("%-24s %12.3f %12s %8s" % (case, result['median_ms'], "-", "-"))
+            continue
+        ratio = result['median_ms'] / base['median_ms']
+        flag = ''
+        if ratio > tolerance:
+            slower.append(case)
+            flag = '  SLOWER'
+        print("%-24s %12.3f %12.3f %8.2f%s" % (case, result['median_ms'], base['median_ms'], ratio, flag))
+    return slower
+
+
+def main():
+    args = parse_args()
+    print("MeasureIt-ARCH: Benchmarking the " + args.scale + " scene, " + str(args.repeat) + " runs per case")
+    results = run_cases(args)
+
+    report = {
+        'scale': args.scale,
+        'params': synthetic_scene.scales[args.scale],
+        'blender': bpy.app.version_string,
+        'machine': platform.node(),
+        'results': results,
+    }
+    if args.output != '':
+        with open(args.output, 'w') as outFile:
+            json.dump(report, outFile, indent=2)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseFile:
+            baselines = json.load(baseFile)
+
+    if args.save_baseline:
+        baselines[args.scale] = report
+        with open(args.baseline, 'w') as baseFile:
+            json.dump(baselines, baseFile, indent=2, sort_keys=True)
+        print("MeasureIt-ARCH: Saved the " + args.scale + " baseline to " + args.baseline)
+        return 0
+
+    if args.scale not in baselines:
+        compare(results, {}, args.tolerance)
+        print("MeasureIt-ARCH: No " + args.scale + " baseline in " + args.baseline + ", nothing to compare")
+        return 0
+
+    slower = compare(results, baselines[args.scale]['results'], args.tolerance)
+    if len(slower) != 0:
+        print("MeasureIt-ARCH: Slower than the baseline: " + ", ".join(slower))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    exitCode = main()
+    sys.stdout.flush()
+    if exitCode != 0:
+        sys.exit(exitCode)
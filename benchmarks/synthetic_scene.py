@@ -0,0 +1,176 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: synthetic_scene.py
+# Builds benchmark scenes of grid meshes carrying line groups,
+# dimensions and annotations, seeded so every run is the same
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import math
+import random
+
+import bpy
+import numpy as np
+
+
+# Scene sizes, objects x line groups x dimensions of each kind x annotations
+scales = {
+    'small': {'objects': 4, 'gridSize': 16, 'lineGroups': 2, 'dimensions': 4, 'annotations': 2},
+    'medium': {'objects': 16, 'gridSize': 48, 'lineGroups': 4, 'dimensions': 16, 'annotations': 8},
+    'large': {'objects': 64, 'gridSize': 96, 'lineGroups': 8, 'dimensions': 32, 'annotations': 16},
+}
+
+
+def clear_scene():
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+
+
+def new_grid_mesh(name, gridSize):
+    # gridSize x gridSize verts on a bumpy plane so creases exist
+    xs, ys = np.meshgrid(np.arange(gridSize, dtype=np.float32), np.arange(gridSize, dtype=np.float32))
+    zs = np.where((xs.astype(np.int32) // 4 + ys.astype(np.int32) // 4) % 2 == 0, 0.0, 0.5)
+    verts = np.stack((xs.ravel(), ys.ravel(), zs.ravel()), axis=1) / gridSize
+
+    rows = np.arange(gridSize - 1)
+    quadStart = (rows[:, None] * gridSize + rows[None, :]).ravel()
+    faces = np.stack((quadStart, quadStart + 1, quadStart + gridSize + 1, quadStart + gridSize), axis=1)
+
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata(verts.tolist(), [], faces.tolist())
+    mesh.update()
+    return mesh
+
+
+def add_line_groups(obj, count, rand, add_line_group_pairs):
+    lineGen = obj.LineGenerator.add()
+    edgeVerts = np.empty(len(obj.data.edges) * 2, dtype=np.int32)
+    obj.data.edges.foreach_get('vertices', edgeVerts)
+    edgeVerts = edgeVerts.reshape(-1, 2)
+
+    for idx in range(count):
+        lGroup = lineGen.line_groups.add()
+        lGroup.itemType = 'L'
+        lGroup.name = 'Line ' + str(idx + 1)
+        lGroup.lineWeight = 1 + idx % 3
+        lGroup.lineDrawHidden = idx % 3 == 1
+        lGroup.lineDrawDashed = idx % 4 == 2
+        picked = rand.sample(range(len(edgeVerts)), min(len(edgeVerts), len(edgeVerts) // count + 1))
+        add_line_group_pairs(obj, lGroup, edgeVerts[sorted(picked)].ravel().tolist())
+        lineGen.line_num += 1
+
+
+def add_dimensions(obj, count, rand, gridSize):
+    dimGen = obj.DimensionGenerator.add()
+    numVerts = gridSize * gridSize
+
+    for idx in range(count):
+        a = rand.randrange(numVerts - gridSize - 1)
+        dim = dimGen.alignedDimensions.add()
+        dim.name = 'Dimension ' + str(idx + 1)
+        dim.dimObjectA = obj
+        dim.dimObjectB = obj
+        dim.dimPointA = a
+        dim.dimPointB = a + gridSize + 1
+        dim.dimOffset = 0.05
+        dim.dimLeaderOffset = 0.01
+        # select_normal() reads the view from bpy.context, which has no
+        # 3D view in background mode, so pin the view plane
+        dim.dimViewPlane = 'XY'
+        dimGen.wrappedDimensions.add().itemType = 'D-ALIGNED'
+
+        dim = dimGen.axisDimensions.add()
+        dim.name = 'Axis ' + str(idx + 1)
+        dim.dimObjectA = obj
+        dim.dimObjectB = obj
+        dim.dimPointA = a
+        dim.dimPointB = a + gridSize + 1
+        dim.dimOffset = 0.05
+        dim.dimViewPlane = 'XY'
+        dimGen.wrappedDimensions.add().itemType = 'D-AXIS'
+
+        for collection, itemType in ((dimGen.angleDimensions, 'D-ANGLE'), (dimGen.arcDimensions, 'D-ARC')):
+            dim = collection.add()
+            dim.itemType = itemType
+            dim.name = itemType + ' ' + str(idx + 1)
+            dim.dimPointA = a
+            dim.dimPointB = a + 1
+            dim.dimPointC = a + gridSize + 1
+            dim.dimViewPlane = 'XY'
+            if itemType == 'D-ANGLE':
+                dim.dimRadius = 0.05
+            dimGen.wrappedDimensions.add().itemType = itemType
+
+    dimGen.measureit_arch_num = min(len(dimGen.wrappedDimensions), 1000)
+
+
+def add_annotations(obj, count, rand, gridSize):
+    annotationGen = obj.AnnotationGenerator.add()
+    for idx in range(count):
+        annotation = annotationGen.annotations.add()
+        annotationGen.num_annotations += 1
+        annotation.itemType = 'A'
+        annotation.name = 'Annotation ' + str(idx + 1)
+        annotation.annotationAnchorObject = obj
+        annotation.annotationAnchor = rand.randrange(gridSize * gridSize)
+        annotation.fontSize = 24
+        field = annotation.textFields.add()
+        field.text = 'Annotation ' + str(idx + 1)
+        field = annotation.textFields.add()
+        field.text = ''
+
+
+def build_scene(scale, add_line_group_pairs, seed=1):
+    # Returns the scene's objects, a camera looks at all of them
+    params = scales[scale]
+    rand = random.Random(seed)
+    clear_scene()
+    scene = bpy.context.scene
+
+    objects = []
+    columns = int(math.ceil(math.sqrt(params['objects'])))
+    for idx in range(params['objects']):
+        mesh = new_grid_mesh('Bench Mesh ' + str(idx), params['gridSize'])
+        obj = bpy.data.objects.new('Bench ' + str(idx), mesh)
+        obj.location = (idx % columns * 1.5, idx // columns * 1.5, 0)
+        scene.collection.objects.link(obj)
+        objects.append(obj)
+
+    bpy.context.view_layer.update()
+    for obj in objects:
+        add_line_groups(obj, params['lineGroups'], rand, add_line_group_pairs)
+        add_dimensions(obj, params['dimensions'], rand, params['gridSize'])
+        add_annotations(obj, params['annotations'], rand, params['gridSize'])
+        obj.select_set(True)
+    bpy.context.view_layer.objects.active = objects[0]
+
+    cameraData = bpy.data.cameras.new('Bench Camera')
+    camera = bpy.data.objects.new('Bench Camera', cameraData)
+    camera.location = (columns * 0.75, columns * 0.75, columns * 2.5)
+    scene.collection.objects.link(camera)
+    scene.camera = camera
+    scene.render.resolution_x = 1920
+    scene.render.resolution_y = 1080
+    scene.render.resolution_percentage = 50
+    bpy.context.view_layer.update()
+    return objects
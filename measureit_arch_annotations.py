@@ -40,15 +40,16 @@ from bpy.props import (
         PointerProperty,
         BoolVectorProperty
         )
-from .measureit_arch_baseclass import BaseProp, BaseWithText
+from .measureit_arch_baseclass import BaseProp, BaseWithText, queue_text_update, update_text_source
 from .measureit_arch_main import get_smart_selected, get_selected_vertex
 from .measureit_arch_geometry import draw_arc
 from mathutils import Vector, Matrix
 import math
 
 def annotation_update_flag(self,context):
+    update_text_source(self)
     for textField in self.textFields:
-        textField.text_updated = True
+        queue_text_update(textField)
         update_custom_props(self,context)
 
 def update_custom_props(self,context):
@@ -4,12 +4,176 @@ import blf
 import gpu
 import math
 from mathutils import Matrix
+from .measureit_arch_profiling import update_profiling
 from bpy.types import PropertyGroup, Panel, Object, Operator, SpaceView3D, Scene
 from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, BoolProperty, StringProperty, \
                 FloatProperty, EnumProperty, PointerProperty
 
+# ------------------------------------------------------
+# Style index
+# name -> style lookup per scene and style collection, and a reverse
+# style -> users index so editing a style only flags the items using it
+# ------------------------------------------------------
+styleIndex = {}
+styleUsers = {}
+styleUsersDirty = True
+
+# (generator, item collection, style collection) of every styled item type
+styleUserCollections = (
+    ('DimensionGenerator', 'alignedDimensions', 'alignedDimensions'),
+    ('DimensionGenerator', 'angleDimensions', 'alignedDimensions'),
+    ('DimensionGenerator', 'axisDimensions', 'alignedDimensions'),
+    ('DimensionGenerator', 'boundsDimensions', 'alignedDimensions'),
+    ('DimensionGenerator', 'arcDimensions', 'alignedDimensions'),
+    ('AnnotationGenerator', 'annotations', 'annotations'),
+    ('LineGenerator', 'line_groups', 'line_groups'))
+
+def invalidate_style_index():
+    global styleUsersDirty
+    styleIndex.clear()
+    styleUsersDirty = True
+
+def get_style(scene, collection, item):
+    # Returns the style item uses, or item itself if it has none
+    if not item.uses_style:
+        return item
+    styles = getattr(scene.StyleGenerator, collection)
+    key = (scene.name, collection)
+    if key not in styleIndex or styleIndex[key][0] != len(styles):
+        styleIndex[key] = (len(styles), {style.name: idx for idx, style in enumerate(styles)})
+    idx = styleIndex[key][1].get(item.style)
+
+    # Styles renamed since the index was built
+    if idx is not None and styles[idx].name != item.style:
+        del styleIndex[key]
+        return get_style(scene, collection, item)
+
+    if idx is None:
+        return item
+    return styles[idx]
+
+def build_style_users():
+    global styleUsersDirty
+    styleUsers.clear()
+    for obj in bpy.data.objects:
+        for genName, itemsName, styleCollection in styleUserCollections:
+            if genName not in obj:
+                continue
+            items = getattr(getattr(obj, genName)[0], itemsName)
+            for idx, item in enumerate(items):
+                if item.uses_style:
+                    userKey = (styleCollection, item.style)
+                    styleUsers.setdefault(userKey, []).append((obj.name, genName, itemsName, idx))
+    styleUsersDirty = False
+
+def get_style_users(collection, styleName, rebuilt=False):
+    if styleUsersDirty:
+        build_style_users()
+        rebuilt = True
+
+    users = []
+    for objName, genName, itemsName, idx in styleUsers.get((collection, styleName), []):
+        obj = bpy.data.objects.get(objName)
+        items = None
+        if obj is not None and genName in obj:
+            items = getattr(getattr(obj, genName)[0], itemsName)
+        if items is None or idx >= len(items) or not items[idx].uses_style or items[idx].style != styleName:
+            # Items deleted, moved or renamed since the index was built
+            if rebuilt:
+                continue
+            build_style_users()
+            return get_style_users(collection, styleName, True)
+        users.append(items[idx])
+    return users
+
+def invalidate_style_users():
+    global styleUsersDirty
+    styleUsersDirty = True
+
+# ------------------------------------------------------
+# Text queue
+# Items whose labels need to be rasterized again, keyed by (object
+# name, path of the item) with the style collection of the item as
+# value. draw_main() only updates the queued items, and scans every
+# item once after a file load
+# ------------------------------------------------------
+textQueue = {}
+textQueueState = {'fullScan': True}
+
+# Annotations that take their text from a custom property, these
+# are checked on every draw, same keys as textQueue
+textSources = {}
+
+# style collection of each item collection with labels
+textStyleCollections = {itemsName: styleCollection
+                        for genName, itemsName, styleCollection in styleUserCollections
+                        if genName != 'LineGenerator'}
+
+def queue_text_update(item):
+    # Flags item, a dimension, an annotation or one of their text
+    # fields, and queues the item that owns the label
+    item.text_updated = True
+    owner = item.id_data
+    if not isinstance(owner, Object):
+        return
+    path = item.path_from_id()
+    if '.textFields[' in path:
+        path = path.rsplit('.textFields[', 1)[0]
+    itemsName = path.split('.')[-1].split('[')[0]
+    if itemsName in textStyleCollections:
+        textQueue[(owner.name, path)] = textStyleCollections[itemsName]
+
+def update_text_source(annotation):
+    key = (annotation.id_data.name, annotation.path_from_id())
+    if annotation.annotationTextSource != '':
+        textSources[key] = 'annotations'
+    elif key in textSources:
+        del textSources[key]
+
+def request_text_scan():
+    textQueueState['fullScan'] = True
+
+def scan_text_items():
+    # Queues every item with a label
+    textQueue.clear()
+    textSources.clear()
+    for obj in bpy.data.objects:
+        for genName, itemsName, styleCollection in styleUserCollections:
+            if genName not in obj or itemsName not in textStyleCollections:
+                continue
+            items = getattr(getattr(obj, genName)[0], itemsName)
+            for idx, item in enumerate(items):
+                key = (obj.name, genName + '[0].' + itemsName + '[' + str(idx) + ']')
+                textQueue[key] = styleCollection
+                if getattr(item, 'annotationTextSource', '') != '':
+                    textSources[key] = styleCollection
+    textQueueState['fullScan'] = False
+
+def resolve_text_item(key):
+    # Returns (object, item) of a textQueue key, (None, None) if it's gone
+    obj = bpy.data.objects.get(key[0])
+    if obj is None:
+        return None, None
+    try:
+        return obj, obj.path_resolve(key[1])
+    except ValueError:
+        return obj, None
+
 def update_flag(self,context):
-    self.text_updated = True
+    if getattr(self, 'is_style', False):
+        # Flag the items drawn with this style instead of the style itself
+        collection = self.path_from_id().split('.')[-1].split('[')[0]
+        for user in get_style_users(collection, self.name):
+            if hasattr(user, 'text_updated'):
+                queue_text_update(user)
+    else:
+        if hasattr(self, 'text_updated'):
+            queue_text_update(self)
+
+def update_style_user(self,context):
+    # Items start or stop using a style, or switch styles
+    update_flag(self, context)
+    invalidate_style_users()
 
 def update_active_dim(self,context):
     dimGen = context.object.DimensionGenerator[0]
@@ -41,12 +205,12 @@ class BaseProp:
     uses_style: BoolProperty(name= "uses Style",
                 description= "This property Group Uses a Style",
                 default=False,
-                update = update_flag)
+                update = update_style_user)
 
     style: StringProperty(name="Style Name",
             description="Item Name",
             default="",
-            update = update_flag)
+            update = update_style_user)
 
     itemType: StringProperty(name="Item Type",
             description= 'flag for common operators',
@@ -250,6 +414,11 @@ class MeasureItARCHSceneProps(PropertyGroup):
                                 description="(EXPERIMENTAL) Display Measureit-ARCH Gizmos",
                                 default=False)
 
+    enable_profiling: BoolProperty(name="Profiling",
+                                description="Time the draw functions every frame, see the Profiling panel",
+                                default=False,
+                                update=update_profiling)
+
     
 
 bpy.utils.register_class(MeasureItARCHSceneProps)
@@ -306,9 +475,16 @@ class DeletePropButton(Operator):
         elif 'D' in self.item_type:
             itemGroup = Generator.alignedDimensions
             
-        # Delete element
+        # Line groups can keep their edges in a mesh attribute
+        if self.item_type == 'L' and not self.is_style:
+            attrName = itemGroup[self.tag].lineAttribute
+            if attrName != '' and hasattr(mainObj.data, 'attributes') and attrName in mainObj.data.attributes:
+                mainObj.data.attributes.remove(mainObj.data.attributes[attrName])
+
+        # Delete element, items after it move down one index
         itemGroup[self.tag].free = True
         itemGroup.remove(self.tag)
+        invalidate_style_users()
         # redraw
         context.area.tag_redraw()
 
@@ -363,6 +539,10 @@ class DeleteAllItemsButton(Operator):
                             typeContainer.remove(0)
 
             elif self.item_type is 'L':
+                mesh = mainobject.data
+                for line in mainobject.LineGenerator[0].line_groups:
+                    if line.lineAttribute != '' and hasattr(mesh, 'attributes') and line.lineAttribute in mesh.attributes:
+                        mesh.attributes.remove(mesh.attributes[line.lineAttribute])
                 for line in mainobject.LineGenerator[0].line_groups:
                     mainobject.LineGenerator[0].line_groups.remove(0)
                     mainobject.LineGenerator[0].line_num = 0
@@ -224,10 +224,9 @@ class AddAlignedDimensionButton(Operator):
 
             # Edit Context
             if bpy.context.mode == 'EDIT_MESH':
+                smartSelection = get_smart_selection(context)
                 for mainobject in context.objects_in_mode:
-                    mylist = get_smart_selected(mainobject)
-                    if len(mylist) < 2:  # if not selected linked vertex
-                        mylist = get_selected_vertex(mainobject)
+                    mylist = smartSelection.get(mainobject.name, [])
                     if len(mylist) >= 2:
                         #Check Generators
                         if 'DimensionGenerator' not in mainobject:
@@ -288,8 +287,11 @@ class AddAlignedDimensionButton(Operator):
                     if obj.name != mainobject.name:
                         linkobject = obj
 
+                # Read both meshes once
+                selection = get_selection_lists((linkobject, mainobject))
+
                  # Verify destination vertex
-                mylinkvertex = get_selected_vertex(linkobject)
+                mylinkvertex = selection[linkobject.name]['verts']
                 if len(mylinkvertex) != 1:
                     if len(mylinkvertex) == 0:
                         mylinkvertex.append(9999999)
@@ -299,7 +301,7 @@ class AddAlignedDimensionButton(Operator):
                                     "Select only 1")
                         return {'FINISHED'}
                 # Verify origin vertex
-                myobjvertex = get_selected_vertex(mainobject)
+                myobjvertex = selection[mainobject.name]['verts']
                 if len(myobjvertex) != 1:
                     if len(myobjvertex) == 0:
                         myobjvertex.append(9999999)
@@ -487,10 +489,9 @@ class AddAxisDimensionButton(Operator):
 
             # Edit Context
             if bpy.context.mode == 'EDIT_MESH':
+                smartSelection = get_smart_selection(context)
                 for mainobject in context.objects_in_mode:
-                    mylist = get_smart_selected(mainobject)
-                    if len(mylist) < 2:  # if not selected linked vertex
-                        mylist = get_selected_vertex(mainobject)
+                    mylist = smartSelection.get(mainobject.name, [])
                     if len(mylist) >= 2:
                         #Check Generators
                         if 'DimensionGenerator' not in mainobject:
@@ -549,8 +550,11 @@ class AddAxisDimensionButton(Operator):
                     if obj.name != mainobject.name:
                         linkobject = obj
 
+                # Read both meshes once
+                selection = get_selection_lists((linkobject, mainobject))
+
                  # Verify destination vertex
-                mylinkvertex = get_selected_vertex(linkobject)
+                mylinkvertex = selection[linkobject.name]['verts']
                 if len(mylinkvertex) != 1:
                     if len(mylinkvertex) == 0:
                         mylinkvertex.append(9999999)
@@ -560,7 +564,7 @@ class AddAxisDimensionButton(Operator):
                                     "Select only 1")
                         return {'FINISHED'}
                 # Verify origin vertex
-                myobjvertex = get_selected_vertex(mainobject)
+                myobjvertex = selection[mainobject.name]['verts']
                 if len(myobjvertex) != 1:
                     if len(myobjvertex) == 0:
                         myobjvertex.append(9999999)
@@ -753,10 +757,11 @@ class AddAreaButton(Operator): # LEGACY
             # Add properties
             scene = context.scene
             mainobject = context.object
-            mylist = get_smart_selected(mainobject)
+            selection = get_selection_lists((mainobject,))[mainobject.name]
+            mylist = selection['smart']
 
             if len(mylist) < 1:  # if not selected linked vertex
-                mylist = get_selected_vertex(mainobject)
+                mylist = selection['verts']
 
             if len(mylist) >= 1:
                 if 'DimensionGenerator' not in mainobject:
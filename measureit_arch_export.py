@@ -0,0 +1,421 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_export.py
+# Vector export of measures, projects the layout of the draw
+# functions through the scene camera on the CPU and writes
+# SVG or PDF sheets. Needs no GPU, runs with blender -b
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import bpy
+import zlib
+from math import atan2, degrees, sqrt
+from xml.sax.saxutils import escape
+
+import numpy as np
+from bpy.props import BoolProperty, EnumProperty
+from bpy.types import Operator
+from bpy_extras.io_utils import ExportHelper
+
+from .measureit_arch_geometry import begin_layout_capture, end_layout_capture, begin_frame_cache, clear_frame_cache, \
+    draw_alignedDimensions, draw_angleDimension, draw_axisDimension, draw_boundsDimension, \
+    draw_arcDimension, draw_line_group, draw_annotation
+from .measureit_arch_visibility import get_camera_matrix, project_coords, get_line_visibility
+
+
+# Line shaders offset by 0.00118 * thickness in NDC on each side
+lineWidthFactor = 0.00118
+
+# Height of 'Tp' in em, labels are measured with it in update_text()
+labelHeightEm = 0.93
+
+# PDF sheets are sized at 96 dpi
+pdfScale = 0.75
+
+
+# ------------------------------------------------------------------
+# Export button, writes the camera view as a vector sheet
+# ------------------------------------------------------------------
+class ExportVectorButton(Operator, ExportHelper):
+    bl_idname = "measureit_arch.export_vector"
+    bl_label = "Export Vector"
+    bl_description = "Export measures, lines and annotations seen by the scene camera as an SVG or PDF sheet"
+    bl_category = 'MeasureitArch'
+
+    filename_ext = ".svg"
+
+    format: EnumProperty(
+        items=(('SVG', "SVG", "Scalable Vector Graphics"),
+               ('PDF', "PDF", "Portable Document Format")),
+        name="Format",
+        description="File format of the sheet",
+        default='SVG')
+
+    useOcclusion: BoolProperty(
+        name="Hidden Lines",
+        description="Remove line group segments hidden by the scene's meshes, "
+                    "or draw them in the hidden line style",
+        default=True)
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.camera is not None
+
+    def check(self, context):
+        # Keep the file extension in sync with the format
+        self.filename_ext = "." + self.format.lower()
+        return super().check(context)
+
+    def execute(self, context):
+        filepath = bpy.path.ensure_ext(self.filepath, "." + self.format.lower())
+
+        print("MeasureIt-ARCH: Exporting " + filepath)
+        sheet = export_sheet(context, self.useOcclusion)
+        try:
+            if self.format == 'PDF':
+                write_pdf(filepath, sheet)
+            else:
+                write_svg(filepath, sheet)
+        except OSError as e:
+            self.report({'ERROR'}, "MeasureIt-ARCH: Unable to write " + filepath + ", " + str(e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "MeasureIt-ARCH: Exported " + filepath)
+        return {'FINISHED'}
+
+
+# -------------------------------------------------------------
+# Run the draw functions in capture mode, same objects as render_main
+# -------------------------------------------------------------
+def draw_layout(context):
+    sceneProps = context.scene.MeasureItArchProps
+
+    for myobj in context.view_layer.objects:
+        if myobj.visible_get() is True:
+            mat = myobj.matrix_world
+            if 'DimensionGenerator' in myobj:
+                measureGen = myobj.DimensionGenerator[0]
+                draw_alignedDimensions(context, myobj, measureGen, measureGen.alignedDimensions, mat)
+                for dim in measureGen.angleDimensions:
+                    draw_angleDimension(context, myobj, measureGen, dim, mat)
+                for dim in measureGen.axisDimensions:
+                    draw_axisDimension(context, myobj, measureGen, dim, mat)
+                for dim in measureGen.boundsDimensions:
+                    draw_boundsDimension(context, myobj, measureGen, dim, mat)
+                for dim in measureGen.arcDimensions:
+                    draw_arcDimension(context, myobj, measureGen, dim, mat)
+
+            if 'LineGenerator' in myobj:
+                draw_line_group(context, myobj, myobj.LineGenerator[0], mat)
+
+            if 'AnnotationGenerator' in myobj:
+                draw_annotation(context, myobj, myobj.AnnotationGenerator[0], mat)
+
+    deps = context.view_layer.depsgraph
+    for obj_int in deps.object_instances:
+        if obj_int.is_instance:
+            myobj = obj_int.object
+            mat = obj_int.matrix_world
+
+            if 'LineGenerator' in myobj:
+                draw_line_group(context, myobj, myobj.LineGenerator[0], mat)
+
+            if sceneProps.instance_dims:
+                if 'AnnotationGenerator' in myobj:
+                    draw_annotation(context, myobj, myobj.AnnotationGenerator[0], mat)
+
+                if 'DimensionGenerator' in myobj:
+                    DimGen = myobj.DimensionGenerator[0]
+                    draw_alignedDimensions(context, myobj, DimGen, DimGen.alignedDimensions, mat)
+                    for dim in DimGen.angleDimensions:
+                        draw_angleDimension(context, myobj, DimGen, dim, mat)
+                    for dim in DimGen.axisDimensions:
+                        draw_axisDimension(context, myobj, DimGen, dim, mat)
+
+
+def capture_layout(context):
+    # Returns the world space lines, tris and text cards of the scene
+    sceneProps = context.scene.MeasureItArchProps
+    sceneProps.is_render_draw = True
+    try:
+        # Labels changed since they were last drawn are measured during
+        # the first pass, run it again so their cards fit the new text
+        for layoutPass in range(2):
+            capture = begin_layout_capture()
+            begin_frame_cache()
+            try:
+                draw_layout(context)
+            finally:
+                end_layout_capture()
+                clear_frame_cache()
+            if not capture['remeasured']:
+                break
+    finally:
+        sceneProps.is_render_draw = False
+    return capture
+
+
+def project_segments(coords, matrix, width, height):
+    # Sheet segments of world space line coords, dropping any that
+    # reach behind the camera
+    points, w = project_coords(coords, matrix, width, height)
+    segments = points.reshape(-1, 2, 2)
+    inFront = (w.reshape(-1, 2) > 0).all(axis=1)
+    return segments[inFront]
+
+
+def export_sheet(context, useOcclusion=True):
+    # Builds the sheet in pixels of the render resolution:
+    # {'width', 'height', 'lines': [...], 'tris': [...], 'text': [...]}
+    scene = context.scene
+    depsgraph = context.view_layer.depsgraph
+    render_scale = scene.render.resolution_percentage / 100
+    width = int(scene.render.resolution_x * render_scale)
+    height = int(scene.render.resolution_y * render_scale)
+    matrix = get_camera_matrix(scene, depsgraph, width, height)
+
+    capture = capture_layout(context)
+    sheet = {'width': width, 'height': height, 'lines': [], 'tris': [], 'text': []}
+
+    for item in capture['lines']:
+        coords = item['coords']
+        hiddenSegments = np.empty((0, 2, 2))
+        hidden = item['hidden']
+
+        # Line groups are depth tested against the scene, split them
+        # into the pieces seen by the camera and the ones behind meshes
+        if useOcclusion and item['occlude']:
+            coords, hiddenCoords = get_line_visibility(scene, depsgraph, item['group'], coords, matrix, width, height)
+            if hidden is not None:
+                hiddenSegments = project_segments(hiddenCoords, matrix, width, height)
+
+        line = {
+            'segments': project_segments(coords, matrix, width, height),
+            'color': item['color'],
+            'width': lineWidthFactor * item['weight'] * height,
+            'dash': get_dash(item['dashScale'], height),
+            'hiddenSegments': hiddenSegments}
+        if hidden is not None:
+            line['hiddenColor'] = hidden['color']
+            line['hiddenWidth'] = lineWidthFactor * hidden['weight'] * height
+            line['hiddenDash'] = get_dash(hidden['dashScale'], height)
+        sheet['lines'].append(line)
+
+    for item in capture['tris']:
+        points, w = project_coords(item['coords'], matrix, width, height)
+        tris = points.reshape(-1, 3, 2)
+        inFront = (w.reshape(-1, 3) > 0).all(axis=1)
+        sheet['tris'].append({'tris': tris[inFront], 'color': item['color']})
+
+    for item in capture['text']:
+        label = get_label_placement(item['card'], matrix, width, height)
+        if label is not None:
+            label['text'] = item['text']
+            label['color'] = item['color']
+            sheet['text'].append(label)
+
+    return sheet
+
+
+def get_dash(dashScale, height):
+    # The dashed shader draws where sin(20 * ndc length * u_Scale) > 0.5,
+    # a third of each period. Returns (on, off) in pixels or None
+    if dashScale <= 0:
+        return None
+    period = 2 * np.pi / (20 * dashScale) * height / 2
+    return (period / 3, period * 2 / 3)
+
+
+def get_label_placement(card, matrix, width, height):
+    # Card Indicies:
+    #     1----------------2
+    #     |                |
+    #     0----------------3
+    points, w = project_coords(card, matrix, width, height)
+    if (w <= 0).any():
+        return None
+    c0, c1, c2, c3 = points
+    dirX = c3 - c0
+    cardWidth = sqrt(dirX[0] ** 2 + dirX[1] ** 2)
+    if cardWidth == 0:
+        return None
+    dirX = dirX / cardWidth
+
+    # Keep text readable, left to right and upright on the sheet
+    if dirX[0] < 0 or (dirX[0] == 0 and dirX[1] > 0):
+        dirX = -dirX
+    up = np.array((dirX[1], -dirX[0]))
+
+    cardY = c1 - c0
+    cardHeight = abs(float(cardY @ up))
+    if cardHeight == 0:
+        return None
+
+    # Labels are rasterized with the baseline a fifth of the card
+    # height above its bottom edge
+    if cardY @ up >= 0:
+        bottom = (c0 + c3) / 2
+    else:
+        bottom = (c1 + c2) / 2
+    baseline = bottom + up * cardHeight / 5
+
+    return {
+        'position': (float(baseline[0]), float(baseline[1])),
+        'angle': degrees(atan2(dirX[1], dirX[0])),
+        'direction': (float(dirX[0]), float(dirX[1])),
+        'size': cardHeight / labelHeightEm,
+        'width': cardWidth}
+
+
+# -------------------------------------------------------------
+# SVG writer
+# -------------------------------------------------------------
+def svg_color(color):
+    return 'rgb({},{},{})'.format(*[int(round(max(0, min(1, c)) * 255)) for c in color[:3]])
+
+
+def svg_path_lines(segments):
+    return ' '.join('M{:.2f} {:.2f}L{:.2f} {:.2f}'.format(a[0], a[1], b[0], b[1]) for a, b in segments)
+
+
+def svg_lines(segments, color, width, dash):
+    attrs = 'fill="none" stroke="{}" stroke-opacity="{:.3f}" stroke-width="{:.2f}"'.format(
+        svg_color(color), color[3], width)
+    if dash is not None:
+        attrs += ' stroke-dasharray="{:.2f} {:.2f}"'.format(*dash)
+    else:
+        attrs += ' stroke-linecap="round"'
+    return '<path {} d="{}"/>'.format(attrs, svg_path_lines(segments))
+
+
+def write_svg(filepath, sheet):
+    width = sheet['width']
+    height = sheet['height']
+    out = ['<?xml version="1.0" encoding="UTF-8"?>',
+           '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" width="{0}" height="{1}" viewBox="0 0 {0} {1}">'.format(width, height)]
+
+    for item in sheet['lines']:
+        if len(item['hiddenSegments']) != 0:
+            out.append(svg_lines(item['hiddenSegments'], item['hiddenColor'], item['hiddenWidth'], item['hiddenDash']))
+        if len(item['segments']) != 0:
+            out.append(svg_lines(item['segments'], item['color'], item['width'], item['dash']))
+
+    for item in sheet['tris']:
+        if len(item['tris']) == 0:
+            continue
+        d = ' '.join('M{:.2f} {:.2f}L{:.2f} {:.2f}L{:.2f} {:.2f}Z'.format(*tri.ravel()) for tri in item['tris'])
+        out.append('<path fill="{}" fill-opacity="{:.3f}" stroke="none" d="{}"/>'.format(
+            svg_color(item['color']), item['color'][3], d))
+
+    for label in sheet['text']:
+        x, y = label['position']
+        out.append('<text x="{:.2f}" y="{:.2f}" transform="rotate({:.3f} {:.2f} {:.2f})" '
+                   'font-family="sans-serif" font-size="{:.2f}" text-anchor="middle" '
+                   'fill="{}" fill-opacity="{:.3f}">{}</text>'.format(
+                       x, y, label['angle'], x, y, label['size'],
+                       svg_color(label['color']), label['color'][3], escape(label['text'])))
+
+    out.append('</svg>')
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(out))
+
+
+# -------------------------------------------------------------
+# PDF writer, a single page using the standard Helvetica font
+# -------------------------------------------------------------
+def pdf_string(text):
+    text = text.encode('cp1252', 'replace')
+    return b'(' + text.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def write_pdf(filepath, sheet):
+    width = sheet['width']
+    height = sheet['height']
+    alphas = {}
+
+    def alpha_state(alpha):
+        # Opacity needs a graphics state per alpha value
+        if alpha not in alphas:
+            alphas[alpha] = 'GS' + str(len(alphas))
+        return '/' + alphas[alpha] + ' gs'
+
+    def line_ops(segments, color, lineWidth, dash):
+        ops = [alpha_state(color[3]),
+               '{:.3f} {:.3f} {:.3f} RG {:.2f} w'.format(color[0], color[1], color[2], lineWidth)]
+        ops.append('[{:.2f} {:.2f}] 0 d 0 J'.format(*dash) if dash is not None else '[] 0 d 1 J')
+        ops.extend('{:.2f} {:.2f} m {:.2f} {:.2f} l'.format(a[0], a[1], b[0], b[1]) for a, b in segments)
+        ops.append('S')
+        return ops
+
+    # Draw in sheet pixels with y down, like the SVG
+    ops = ['{} 0 0 {} 0 {:.2f} cm'.format(pdfScale, -pdfScale, height * pdfScale)]
+    for item in sheet['lines']:
+        if len(item['hiddenSegments']) != 0:
+            ops.extend(line_ops(item['hiddenSegments'], item['hiddenColor'], item['hiddenWidth'], item['hiddenDash']))
+        if len(item['segments']) != 0:
+            ops.extend(line_ops(item['segments'], item['color'], item['width'], item['dash']))
+
+    for item in sheet['tris']:
+        if len(item['tris']) == 0:
+            continue
+        color = item['color']
+        ops.append(alpha_state(color[3]))
+        ops.append('{:.3f} {:.3f} {:.3f} rg'.format(color[0], color[1], color[2]))
+        ops.extend('{:.2f} {:.2f} m {:.2f} {:.2f} l {:.2f} {:.2f} l h'.format(*tri.ravel()) for tri in item['tris'])
+        ops.append('f')
+
+    content = ('\n'.join(ops) + '\n').encode('latin-1')
+    for label in sheet['text']:
+        color = label['color']
+        dx, dy = label['direction']
+        # Helvetica widths aren't known here, center on the rasterized width
+        x = label['position'][0] - dx * label['width'] / 2
+        y = label['position'][1] - dy * label['width'] / 2
+        content += '{}\n{:.3f} {:.3f} {:.3f} rg\nBT /F1 {:.2f} Tf {:.4f} {:.4f} {:.4f} {:.4f} {:.2f} {:.2f} Tm '.format(
+            alpha_state(color[3]), color[0], color[1], color[2], label['size'],
+            dx, dy, dy, -dx, x, y).encode('latin-1')
+        content += pdf_string(label['text']) + b' Tj ET\n'
+
+    stream = zlib.compress(content)
+    extGState = ' '.join('/{} << /CA {:.3f} /ca {:.3f} >>'.format(name, alpha, alpha) for alpha, name in alphas.items())
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {:.2f} {:.2f}] /Contents 4 0 R '
+        '/Resources << /Font << /F1 5 0 R >> /ExtGState << {} >> >> >>'.format(
+            width * pdfScale, height * pdfScale, extGState).encode('latin-1'),
+        b'<< /Length ' + str(len(stream)).encode() + b' /Filter /FlateDecode >>\nstream\n' + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for idx, obj in enumerate(objects):
+        offsets.append(len(data))
+        data += str(idx + 1).encode() + b' 0 obj\n' + obj + b'\nendobj\n'
+    xref = len(data)
+    data += 'xref\n0 {}\n0000000000 65535 f \n'.format(len(objects) + 1).encode()
+    for offset in offsets:
+        data += '{:010d} 00000 n \n'.format(offset).encode()
+    data += 'trailer\n<< /Size {} /Root 1 0 R >>\nstartxref\n{}\n%%EOF\n'.format(len(objects) + 1, xref).encode()
+
+    with open(filepath, 'wb') as f:
+        f.write(data)
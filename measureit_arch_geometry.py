@@ -31,13 +31,17 @@ from gpu_extras.batch import batch_for_shader
 # noinspection PyUnresolvedReferences
 import blf
 from blf import ROTATION
-from math import fabs, degrees, radians, sqrt, cos, sin, pi, floor
+from math import fabs, degrees, radians, sqrt, cos, sin, pi
 from mathutils import Vector, Matrix, Euler, Quaternion
 import bmesh
 from bpy_extras import view3d_utils, mesh_utils
 import bpy_extras.object_utils as object_utils
 from sys import exc_info
 from .shaders import *
+from .measureit_arch_baseclass import get_style, queue_text_update
+from .measureit_arch_profiling import profile, profilerState, add_time
+from .measureit_arch_units import get_formatter
+from .measureit_arch_text import get_text_offscreen, get_font_id, get_font_height, queue_text, defer_text, clear_text_atlas
 import math
 import time
 import numpy as np
@@ -45,43 +49,72 @@ from array import array
 import random
 
 
-lastMode = None
 lineBatch3D = {}
 dashedBatch3D = {}
 hiddenBatch3D = {}
+depthBatch3D = {}
+
+# Geometry revisions, bumped from the depsgraph_update_post handler.
+# Line group coords and batches are only rebuilt when the revision
+# of their object changes, keyed by (object name, line group id),
+# see get_line_group_key()
+geomRevision = {}
+lineGroupRevision = {}
+lineCoords3D = {}
+
+# Normalized (min, max) vertex pairs in each line group's lineBuffer,
+# keyed like lineCoords3D, see get_line_group_keys()
+lineGroupKeys = {}
+
+# Vertex coords per (object name, evaluated), valid for the current frame.
+# Only filled while a draw pass is running, operators read the mesh directly
+frameVerts = {}
+frameState = {'active': False}
+
+# Edges of each line attribute per (object name, evaluated), valid for
+# the current frame, see get_line_attribute_pairs()
+frameLineEdges = {}
+
+# Edge to face adjacency per mesh name, see get_edge_face_index()
+edgeFaceIndex = {}
 
 # define Shaders
-shader = gpu.types.GPUShader(
-    Base_Shader_2D.vertex_shader,
-    Base_Shader_2D.fragment_shader)
-
-lineShader = gpu.types.GPUShader(
-    Base_Shader_3D.vertex_shader,
-    Line_Shader_3D.fragment_shader,
-    geocode=Line_Shader_3D.geometry_shader)
-
-lineGroupShader = gpu.types.GPUShader(
-    Line_Group_Shader_3D.vertex_shader,
-    Line_Group_Shader_3D.fragment_shader,
-    geocode=Line_Group_Shader_3D.geometry_shader)
-
-triShader = gpu.types.GPUShader(
-    Base_Shader_3D.vertex_shader,
-    Base_Shader_3D.fragment_shader)
-
-dashedLineShader = gpu.types.GPUShader(
-    Dashed_Shader_3D.vertex_shader,
-    Dashed_Shader_3D.fragment_shader,
-    geocode=Dashed_Shader_3D.geometry_shader)
-
-pointShader = gpu.types.GPUShader(
-    Point_Shader_3D.vertex_shader,
-    Point_Shader_3D.fragment_shader,
-    geocode=Point_Shader_3D.geometry_shader)
-
-textShader = gpu.types.GPUShader(
-    Text_Shader.vertex_shader,
-    Text_Shader.fragment_shader)
+# Shaders need a GPU, background sessions only use the layout capture
+if not bpy.app.background:
+    shader = gpu.types.GPUShader(
+        Base_Shader_2D.vertex_shader,
+        Base_Shader_2D.fragment_shader)
+
+    lineShader = gpu.types.GPUShader(
+        Base_Shader_3D.vertex_shader,
+        Line_Shader_3D.fragment_shader,
+        geocode=Line_Shader_3D.geometry_shader)
+
+    lineGroupShader = gpu.types.GPUShader(
+        Line_Group_Shader_3D.vertex_shader,
+        Line_Group_Shader_3D.fragment_shader,
+        geocode=Line_Group_Shader_3D.geometry_shader)
+
+    triShader = gpu.types.GPUShader(
+        Base_Shader_3D.vertex_shader,
+        Base_Shader_3D.fragment_shader)
+
+    dashedLineShader = gpu.types.GPUShader(
+        Dashed_Shader_3D.vertex_shader,
+        Dashed_Shader_3D.fragment_shader,
+        geocode=Dashed_Shader_3D.geometry_shader)
+
+    depthShader = gpu.types.GPUShader(
+        Base_Shader_3D.vertex_shader,
+        DepthOnlyFrag.fragment_shader)
+
+    pointShader = gpu.types.GPUShader(
+        Point_Shader_3D.vertex_shader,
+        Point_Shader_3D.fragment_shader,
+        geocode=Point_Shader_3D.geometry_shader)
+else:
+    shader = lineShader = lineGroupShader = triShader = None
+    dashedLineShader = depthShader = pointShader = None
 
 fontSizeMult = 6
 
@@ -90,7 +123,375 @@ def clear_batches():
     lineBatch3D.clear()
     dashedBatch3D.clear()
     hiddenBatch3D.clear()
+    depthBatch3D.clear()
+    lineGroupRevision.clear()
+    lineCoords3D.clear()
+    lineGroupKeys.clear()
+    edgeFaceIndex.clear()
+    clear_text_atlas()
+
+def tag_geometry_update(datablock):
+    key = (type(datablock).__name__, datablock.name)
+    geomRevision[key] = geomRevision.get(key, 0) + 1
+
+def get_geometry_revision(myobj):
+    revision = [geomRevision.get(('Object', myobj.name), 0), myobj.mode]
+    if myobj.data is not None:
+        revision.append(geomRevision.get((type(myobj.data).__name__, myobj.data.name), 0))
+    return tuple(revision)
+
+def clear_object_batches(objName):
+    # Drops the line group caches of an object, used when it's renamed
+    for cache in (lineBatch3D, dashedBatch3D, hiddenBatch3D, lineGroupRevision, lineCoords3D, lineGroupKeys):
+        for key in [key for key in cache if key[0] == objName]:
+            del cache[key]
+
+def new_line_group_id(lineGen):
+    # Ids are never reused within an object, even after groups are deleted
+    lineGen.last_group_id = max([lineGen.last_group_id] + [group.groupId for group in lineGen.line_groups]) + 1
+    return lineGen.last_group_id
+
+def get_line_group_key(myobj, lineGroup):
+    # Cache key of lineGroup. Names aren't unique, groups get an id when
+    # they're created, groups from older files when they're first used
+    if lineGroup.groupId == 0:
+        lineGroup.groupId = new_line_group_id(myobj.LineGenerator[0])
+    return (myobj.name, lineGroup.groupId)
+
+def invalidate_line_group(myobj, lineGroup):
+    cacheKey = get_line_group_key(myobj, lineGroup)
+    lineGroupRevision.pop(cacheKey, None)
+    lineGroupKeys.pop(cacheKey, None)
+
+# ----------------------------------------------------
+# Line group membership, a set of (min, max) vertex pairs kept next
+# to lineBuffer so adding and removing lines only costs as much as
+# the selection. Duplicate pairs are never added to the buffer. The
+# set is stored with a copy of the buffer it was built from, undo or
+# other edits of the buffer don't match it and rebuild the set
+# ----------------------------------------------------
+def get_line_buffer(lineGroup):
+    if 'lineBuffer' not in lineGroup:
+        return np.empty(0, dtype=np.int64)
+    return np.array(lineGroup['lineBuffer'].to_list(), dtype=np.int64)
+
+def set_line_buffer(myobj, lineGroup, buffer, keys):
+    lineGroup['lineBuffer'] = buffer.tolist()
+    invalidate_line_group(myobj, lineGroup)
+    lineGroupKeys[get_line_group_key(myobj, lineGroup)] = (buffer, keys)
+
+def get_line_group_keys(myobj, lineGroup):
+    cacheKey = get_line_group_key(myobj, lineGroup)
+    buffer = get_line_buffer(lineGroup)
+    cached = lineGroupKeys.get(cacheKey)
+    if cached is not None and np.array_equal(cached[0], buffer):
+        return cached[1]
+
+    pairs = buffer[:len(buffer) // 2 * 2].reshape(-1, 2)
+    keys = set(zip(pairs.min(axis=1).tolist(), pairs.max(axis=1).tolist()))
+
+    # Groups from older files can hold duplicates, drop them once
+    if len(keys) * 2 != len(buffer):
+        _, first = np.unique(np.sort(pairs, axis=1), axis=0, return_index=True)
+        set_line_buffer(myobj, lineGroup, pairs[np.sort(first)].ravel(), keys)
+        lineGroup.numLines = max(lineGroup.numLines - (len(pairs) - len(keys)), 0)
+        return keys
+
+    lineGroupKeys[cacheKey] = (buffer, keys)
+    return keys
+
+def add_buffer_pairs(myobj, lineGroup, vertList):
+    # Appends the pairs in vertList that aren't in the lineBuffer yet,
+    # returns the number of lines added
+    keys = get_line_group_keys(myobj, lineGroup)
+    added = []
+    for x in range(0, len(vertList) - 1, 2):
+        a = vertList[x]
+        b = vertList[x + 1]
+        key = (min(a, b), max(a, b))
+        if a != b and key not in keys:
+            keys.add(key)
+            added.append(a)
+            added.append(b)
+
+    if len(added) != 0:
+        buffer = np.concatenate((get_line_buffer(lineGroup), np.array(added, dtype=np.int64)))
+        set_line_buffer(myobj, lineGroup, buffer, keys)
+        lineGroup.numLines += len(added) // 2
+    return len(added) // 2
+
+def remove_buffer_pairs(myobj, lineGroup, vertList):
+    # Removes the pairs in vertList from the lineBuffer in either
+    # direction, returns the number of lines removed
+    keys = get_line_group_keys(myobj, lineGroup)
+    removed = set()
+    for x in range(0, len(vertList) - 1, 2):
+        a = vertList[x]
+        b = vertList[x + 1]
+        key = (min(a, b), max(a, b))
+        if key in keys:
+            removed.add(key)
+
+    if len(removed) != 0:
+        keys -= removed
+        pairs = get_line_buffer(lineGroup).reshape(-1, 2)
+        packed = pairs.min(axis=1) << 32 | pairs.max(axis=1)
+        packedRemoved = np.array([a << 32 | b for a, b in removed], dtype=np.int64)
+        keep = ~np.isin(packed, packedRemoved)
+        set_line_buffer(myobj, lineGroup, pairs[keep].ravel(), keys)
+        lineGroup.numLines = max(lineGroup.numLines - len(removed), 0)
+    return len(removed)
+
+# ----------------------------------------------------
+# Line groups on meshes that support attributes (Blender 2.91+) keep
+# their edges as an INT edge attribute named by lineGroup.lineAttribute.
+# The attribute follows the edges through topology edits and modifiers,
+# pairs of vertices that aren't an edge still go to the lineBuffer
+# ----------------------------------------------------
+lineAttributePrefix = 'measureit_arch_line'
+
+def supports_line_attributes(myobj):
+    return myobj.type == 'MESH' and hasattr(myobj.data, 'attributes')
+
+def get_line_attribute(myobj, lineGroup, create=False):
+    # Name of the group's edge attribute, '' when it only uses its lineBuffer
+    if not supports_line_attributes(myobj):
+        return ''
+    if lineGroup.lineAttribute == '' and create:
+        names = set(myobj.data.attributes.keys())
+        if myobj.mode == 'EDIT':
+            names.update(bmesh.from_edit_mesh(myobj.data).edges.layers.int.keys())
+        idx = 0
+        while lineAttributePrefix + '_' + str(idx) in names:
+            idx += 1
+        lineGroup.lineAttribute = lineAttributePrefix + '_' + str(idx)
+    return lineGroup.lineAttribute
+
+def get_edge_indices(mesh, vertList):
+    # Index of the edge joining each pair in vertList, -1 for pairs
+    # that aren't an edge
+    pairs = np.array(vertList[:len(vertList) // 2 * 2], dtype=np.int64).reshape(-1, 2)
+    edgeVerts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edgeVerts)
+    edgeVerts = edgeVerts.reshape(-1, 2).astype(np.int64)
+    edgeKeys = edgeVerts.min(axis=1) << 32 | edgeVerts.max(axis=1)
+    pairKeys = pairs.min(axis=1) << 32 | pairs.max(axis=1)
+
+    keyOrder = np.argsort(edgeKeys)
+    pos = np.searchsorted(edgeKeys[keyOrder], pairKeys)
+    pos = np.minimum(pos, max(len(keyOrder) - 1, 0))
+    edgeIdx = np.full(len(pairs), -1, dtype=np.int64)
+    if len(keyOrder) != 0:
+        found = edgeKeys[keyOrder[pos]] == pairKeys
+        edgeIdx[found] = keyOrder[pos[found]]
+    return edgeIdx
+
+def set_line_attribute_edges(myobj, attrName, vertList, value):
+    # Flags the edges joining the pairs in vertList, returns the number
+    # of edges that changed and the pairs that aren't edges
+    mesh = myobj.data
+    changed = 0
+    others = []
+    if myobj.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(mesh)
+        bm.verts.ensure_lookup_table()
+        layer = bm.edges.layers.int.get(attrName)
+        if layer is None:
+            layer = bm.edges.layers.int.new(attrName)
+        for x in range(0, len(vertList) - 1, 2):
+            edge = bm.edges.get((bm.verts[vertList[x]], bm.verts[vertList[x + 1]]))
+            if edge is None:
+                others.append(vertList[x])
+                others.append(vertList[x + 1])
+            elif edge[layer] != value:
+                edge[layer] = value
+                changed += 1
+        if changed != 0:
+            bmesh.update_edit_mesh(mesh, False, False)
+        return changed, others
+
+    edgeIdx = get_edge_indices(mesh, vertList)
+    for x in np.flatnonzero(edgeIdx < 0).tolist():
+        others.append(vertList[x * 2])
+        others.append(vertList[x * 2 + 1])
+    edgeIdx = np.unique(edgeIdx[edgeIdx >= 0])
+    if len(edgeIdx) != 0:
+        attr = mesh.attributes.get(attrName)
+        if attr is None:
+            attr = mesh.attributes.new(attrName, 'INT', 'EDGE')
+        flags = np.empty(len(mesh.edges), dtype=np.int32)
+        attr.data.foreach_get('value', flags)
+        changed = int(np.count_nonzero(flags[edgeIdx] != value))
+        if changed != 0:
+            flags[edgeIdx] = value
+            attr.data.foreach_set('value', flags)
+            mesh.update()
+    return changed, others
+
+def read_line_attribute(mesh, attrName):
+    # Vertex pairs of the edges flagged in attrName as an (n, 2) array
+    attr = mesh.attributes.get(attrName)
+    if attr is None or attr.domain != 'EDGE' or len(mesh.edges) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    flags = np.empty(len(mesh.edges), dtype=np.int32)
+    attr.data.foreach_get('value', flags)
+    edgeVerts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edgeVerts)
+    return edgeVerts.reshape(-1, 2)[flags != 0]
+
+def read_edit_line_attribute(mesh, attrName):
+    bm = bmesh.from_edit_mesh(mesh)
+    layer = bm.edges.layers.int.get(attrName)
+    if layer is None:
+        return np.empty((0, 2), dtype=np.int32)
+    pairs = [(edge.verts[0].index, edge.verts[1].index) for edge in bm.edges if edge[layer] != 0]
+    return np.array(pairs, dtype=np.int32).reshape(-1, 2)
+
+def get_line_attribute_pairs(myobj, lineGroup, evalMods):
+    # Flagged edges of the group on the mesh that's drawn this frame,
+    # the evaluated mesh's edges are read along with its verts
+    attrName = get_line_attribute(myobj, lineGroup)
+    if attrName == '':
+        return None
+    key = get_frame_key(myobj, evalMods)
+    edges = frameLineEdges.setdefault(key, {})
+    if attrName not in edges:
+        if myobj.mode == 'EDIT':
+            edges[attrName] = read_edit_line_attribute(myobj.data, attrName)
+        elif key[1]:
+            edges[attrName] = np.empty((0, 2), dtype=np.int32)
+        else:
+            edges[attrName] = read_line_attribute(myobj.data, attrName)
+    return edges[attrName]
+
+def add_line_group_pairs(myobj, lineGroup, vertList):
+    # Adds the pairs in vertList to the group, edges go to its attribute
+    # and other pairs to its lineBuffer. Returns the number of lines added
+    attrName = get_line_attribute(myobj, lineGroup, create=True)
+    added = 0
+    if attrName != '':
+        added, vertList = set_line_attribute_edges(myobj, attrName, vertList, 1)
+        lineGroup.numLines += added
+        invalidate_line_group(myobj, lineGroup)
+    return added + add_buffer_pairs(myobj, lineGroup, vertList)
+
+def remove_line_group_pairs(myobj, lineGroup, vertList):
+    # Removes the pairs in vertList from the group's attribute and
+    # lineBuffer, returns the number of lines removed
+    attrName = get_line_attribute(myobj, lineGroup)
+    removed = 0
+    if attrName != '':
+        removed = set_line_attribute_edges(myobj, attrName, vertList, 0)[0]
+        lineGroup.numLines = max(lineGroup.numLines - removed, 0)
+        invalidate_line_group(myobj, lineGroup)
+    return removed + remove_buffer_pairs(myobj, lineGroup, vertList)
+
+# ----------------------------------------------------
+# Layout capture, while active the draw functions record
+# their world space lines, triangles and text cards here
+# instead of drawing them, see measureit_arch_export.py
+# ----------------------------------------------------
+layoutCapture = None
+
+def begin_layout_capture():
+    global layoutCapture
+    layoutCapture = {'lines': [], 'tris': [], 'text': [], 'remeasured': False}
+    return layoutCapture
+
+def end_layout_capture():
+    global layoutCapture
+    capture = layoutCapture
+    layoutCapture = None
+    return capture
+
+def draw_lines(coords, rgb, lineWeight, viewport, offset=-0.001):
+    if layoutCapture is not None:
+        if len(coords) != 0:
+            layoutCapture['lines'].append({
+                'coords': np.array([tuple(co) for co in coords], dtype=np.float32),
+                'color': tuple(rgb),
+                'weight': lineWeight,
+                'dashScale': 0,
+                'group': None,
+                'hidden': None,
+                'occlude': False})
+        return
+
+    lineShader.bind()
+    lineShader.uniform_float("Viewport",viewport)
+    lineShader.uniform_float("thickness",lineWeight)
+    lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
+    lineShader.uniform_float("offset", offset)
+
+    batch = batch_for_shader(lineShader, 'LINES', {"pos": coords})
+    batch.program_set(lineShader)
+    batch.draw()
+    gpu.shader.unbind()
+
+def draw_tris(coords, rgb, offset=-0.001):
+    if len(coords) == 0:
+        return
+    if layoutCapture is not None:
+        layoutCapture['tris'].append({
+            'coords': np.array([tuple(co) for co in coords], dtype=np.float32),
+            'color': tuple(rgb)})
+        return
+
+    bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
+    triShader.bind()
+    triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
+    triShader.uniform_float("offset", offset)
+
+    batch = batch_for_shader(triShader, 'TRIS', {"pos": coords})
+    batch.program_set(triShader)
+    batch.draw()
+    gpu.shader.unbind()
+    bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
+
+def draw_points(coords, rgb, thickness, viewport, offset=-0.001):
+    # Points only round off line joints, exports don't need them
+    if layoutCapture is not None:
+        return
+
+    pointShader.bind()
+    pointShader.uniform_float("Viewport",viewport)
+    pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
+    pointShader.uniform_float("thickness", thickness)
+    pointShader.uniform_float("offset", offset)
 
+    batch = batch_for_shader(pointShader, 'POINTS', {"pos": coords})
+    batch.program_set(pointShader)
+    batch.draw()
+    gpu.shader.unbind()
+
+def capture_text(textobj, textprops, card, rgb):
+    # Labels keep the size of their last raster, measure them here instead
+    # so the next layout pass gets cards that fit the current text. The
+    # label is queued so its mask is rasterized again at the new size
+    width, height = get_text_size(textobj, textprops)
+    if width != textobj.textWidth or height != textobj.textHeight:
+        textobj.textWidth = width
+        textobj.textHeight = height
+        queue_text_update(textobj)
+        layoutCapture['remeasured'] = True
+
+    if textobj.text != "":
+        layoutCapture['text'].append({
+            'text': textobj.text,
+            'card': [tuple(co) for co in card],
+            'color': tuple(rgb)})
+
+def get_text_size(textField, props):
+    # Size of the label texture in pixels, measured without drawing
+    size = 20
+    resolution = props.textResolution
+    font_id = get_font_id(props.font)
+    blf.size(font_id, size, resolution)
+    fheight = get_font_height(font_id, size, resolution)
+    fwidth = blf.dimensions(font_id, textField.text)[0]
+    return math.ceil(fwidth), math.ceil(fheight)
+
+@profile('update_text')
 def update_text(textobj, props, context):
     update_flag = False
 
@@ -98,35 +499,19 @@ def update_text(textobj, props, context):
         if textField.text_updated:
             update_flag = True
 
-        if textobj.text_updated or textField.text_updated or props.text_updated or update_flag:
-            # Get textitem Properties
-            rawRGB = props.color
-            rgb = (pow(rawRGB[0], (1/2.2)), pow(rawRGB[1], (1/2.2)), pow(rawRGB[2], (1/2.2)), rawRGB[3])
-            size = 20
-            resolution = props.textResolution
-
-            # Get Font Id
-            badfonts = [None]
-            if 'Bfont' in bpy.data.fonts:
-                badfonts.append(bpy.data.fonts['Bfont'])
-            if props.font not in badfonts:
-                vecFont = props.font
-                fontPath = vecFont.filepath
-                font_id = blf.load(fontPath)
-            else:
-                font_id = 0
+        # Labels from older versions were stored as RGBA, redraw them as masks
+        if 'textureMask' not in textField and textField.text != "":
+            update_flag = True
 
-            # Set BLF font Properties
-            blf.color(font_id, rgb[0], rgb[1], rgb[2], rgb[3])
-            blf.size(font_id, size, resolution)
-            
+        if textobj.text_updated or textField.text_updated or update_flag:
+            font_id = get_font_id(props.font)
             text = textField.text
 
             # Calculate Optimal Dimensions for Text Texture.
-            fheight = blf.dimensions(font_id, 'Tp')[1]
-            fwidth = blf.dimensions(font_id, text)[0]
-            width = math.ceil(fwidth)
-            height = math.ceil(fheight)
+            width, height = get_text_size(textField, props)
+
+            # Text is drawn white as a coverage mask, Text_Shader applies the color
+            blf.color(font_id, 1.0, 1.0, 1.0, 1.0)
             
 
             # Save Texture size to textobj Properties
@@ -135,17 +520,18 @@ def update_text(textobj, props, context):
 
             # Start Offscreen Draw
             if width != 0 and height != 0:
-                textOffscreen = gpu.types.GPUOffScreen(width, height)
-                texture_buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
+                textOffscreen = get_text_offscreen(width, height)
+                texture_buffer = bgl.Buffer(bgl.GL_BYTE, width * height)
                 
                 with textOffscreen.bind():
                     # Clear Past Draw and Set 2D View matrix
-                    bgl.glClearColor(rgb[0], rgb[1], rgb[2], 0)
+                    bgl.glClearColor(0, 0, 0, 0)
                     bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
                     
+                    # The offscreen is shared and may be larger than this label
                     view_matrix = Matrix([
-                        [2 / width, 0, 0, -1],
-                        [0, 2 / height, 0, -1],
+                        [2 / textOffscreen.width, 0, 0, -1],
+                        [0, 2 / textOffscreen.height, 0, -1],
                         [0, 0, 1, 0],
                         [0, 0, 0, 1]])
                     
@@ -156,15 +542,18 @@ def update_text(textobj, props, context):
                     blf.position(font_id, 0, height/5, 0)
                     blf.draw(font_id, text)
                     
-                    # Read Offscreen To Texture Buffer
+                    # Read the red channel of the Offscreen as the coverage mask,
+                    # white text blended over black leaves the text alpha in red
                     bgl.glReadBuffer(bgl.GL_BACK)
-                    bgl.glReadPixels(0, 0, width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, texture_buffer)
+                    bgl.glPixelStorei(bgl.GL_PACK_ALIGNMENT, 1)
+                    bgl.glReadPixels(0, 0, width, height, bgl.GL_RED, bgl.GL_UNSIGNED_BYTE, texture_buffer)
+                    bgl.glPixelStorei(bgl.GL_PACK_ALIGNMENT, 4)
                     
-                    # Write Texture Buffer to ID Property as List
+                    # Write the mask to an ID Property as bytes, one per pixel
                     if 'texture' in textField:
                         del textField['texture']
-                    textField['texture'] = texture_buffer
-                    textOffscreen.free()
+                    mask = np.array(texture_buffer.to_list(), dtype=np.int8).view(np.uint8)
+                    textField['textureMask'] = mask.tobytes()
                     textField.text_updated = False
                     textField.texture_updated = True
             
@@ -175,214 +564,233 @@ def update_text(textobj, props, context):
                     bpy.data.images.new(str('test'), width, height)
                 image = bpy.data.images[str('test')]
                 image.scale(width, height)
-                image.pixels = [v / 255 for v in texture_buffer]
-
-def draw_alignedDimension(context, myobj, measureGen, dim, mat):
-    # GL Settings
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-    bgl.glDepthFunc(bgl.GL_LEQUAL)
-    bgl.glDepthMask(False)
+                pixels = np.ones((width * height, 4), dtype=np.float32)
+                pixels[:, 3] = np.frombuffer(textField['textureMask'], dtype=np.uint8) / 255
+                image.pixels = pixels.ravel()
+
+    # Style edits flag textobj, all of its fields have been redrawn now
+    textobj.text_updated = False
+
+# ----------------------------------------------------
+# Dimension layout kernel, lays out every dimension of a
+# type with NumPy array operations instead of per dimension
+# Vector math. The viewport, render_main and exports all
+# draw from the buffers it returns
+# ----------------------------------------------------
+def normalize_rows(vectors):
+    # Zero length rows stay zero, like Vector.normalized()
+    lengths = np.linalg.norm(vectors, axis=1)
+    return vectors / np.where(lengths == 0, 1, lengths)[:, None]
+
+def sort_point_pairs(p1, p2):
+    # sortPoints() for (n, 3) arrays of endpoints
+    absDiff = np.abs(p1 - p2)
+    domAxis = np.zeros(len(p1), dtype=np.int64)
+    domAxis[(absDiff[:, 1] > absDiff[:, 0]) & (absDiff[:, 1] > absDiff[:, 2])] = 1
+    domAxis[(absDiff[:, 2] > absDiff[:, 0]) & (absDiff[:, 2] > absDiff[:, 1])] = 2
+
+    rows = np.arange(len(p1))
+    a = p1[rows, domAxis]
+    b = p2[rows, domAxis]
+    swap = np.where(domAxis == 0, b > a, b < a)[:, None]
+    return np.where(swap, p2, p1), np.where(swap, p1, p2)
+
+def rotate_about_axes(vectors, axes, angles):
+    # Rotates each vector around its unit axis, Matrix.Rotation() per row
+    cosAngles = np.cos(angles)[:, None]
+    sinAngles = np.sin(angles)[:, None]
+    axisDots = np.einsum('ij,ij->i', axes, vectors)[:, None]
+    rotated = (vectors * cosAngles + np.cross(axes, vectors) * sinAngles
+               + axes * axisDots * (1 - cosAngles))
+    # Dimensions without a length have no axis to rotate around
+    return np.where(np.any(axes != 0, axis=1)[:, None], rotated, vectors)
+
+def layout_aligned_dimensions(p1, p2, normals, rotations, offsets, geoOffsets, capSizes, cardSizes):
+    # p1, p2 and normals are (n, 3) arrays of sorted endpoints and the
+    # normals from select_normal(), cardSizes is (n, 2) text card sizes.
+    # Returns the lead and dimension lines as (n, 6, 3), text cards as
+    # (n, 4, 3) and the per dimension vectors the end caps need
+    distVectors = p1 - p2
+    dists = np.linalg.norm(distVectors, axis=1)
+    normDistVectors = normalize_rows(distVectors)
+
+    # Offset vector from the face normal and user rotation
+    userOffsetVectors = rotate_about_axes(normals, normDistVectors, rotations)
+    offsetDistances = userOffsetVectors * offsets[:, None]
+    geoOffsetDistances = normalize_rows(offsetDistances) * geoOffsets[:, None]
+    shortOffsets = np.linalg.norm(offsetDistances, axis=1) < np.linalg.norm(geoOffsetDistances, axis=1)
+    offsetDistances = np.where(shortOffsets[:, None], geoOffsetDistances, offsetDistances)
+    leadExtensions = normalize_rows(offsetDistances) * (0.005 * capSizes)[:, None]
+
+    dimLineStarts = p1 + offsetDistances
+    dimLineEnds = p2 + offsetDistances
+    lines = np.stack((
+        p1 + geoOffsetDistances, dimLineStarts + leadExtensions,
+        p2 + geoOffsetDistances, dimLineEnds + leadExtensions,
+        dimLineStarts, dimLineEnds), axis=1)
+    textLocs = (dimLineStarts + dimLineEnds) / 2
+
+    # Text cards, moved past the end of the line when they don't fit
+    cardX = normDistVectors * cardSizes[:, 0:1]
+    cardY = normalize_rows(userOffsetVectors) * cardSizes[:, 1:2]
+    flipCaps = np.linalg.norm(cardX, axis=1) + capSizes / 100 > dists
+    flippedOrigins = (dimLineEnds - (cardX / 2 + normalize_rows(cardX) * (capSizes / 100)[:, None])
+                      - cardY / 2)
+    origins = np.where(flipCaps[:, None], flippedOrigins, textLocs)
+    cards = np.stack((
+        origins - cardX / 2, origins - cardX / 2 + cardY,
+        origins + cardX / 2 + cardY, origins + cardX / 2), axis=1)
+
+    return {
+        'lines': lines,
+        'cards': cards,
+        'textLocs': textLocs,
+        'offsetVectors': userOffsetVectors,
+        'flipCaps': flipCaps,
+    }
+
+def get_dimension_points(dim, dimProps, mat):
+    # World space endpoints of a two point dimension, None for
+    # vertices that no longer exist
+    aMatrix = mat
+    bMatrix = mat
+    if dim.dimObjectB != dim.dimObjectA:
+        bMatrix = dim.dimObjectB.matrix_world - dim.dimObjectA.matrix_world + mat
+
+    points = []
+    for obj, idx, matrix in ((dim.dimObjectA, dim.dimPointA, aMatrix), (dim.dimObjectB, dim.dimPointB, bMatrix)):
+        if idx == 9999999:
+            points.append(tuple(obj.location))
+            continue
+        vert = get_mesh_vertex(obj, idx, dimProps.evalMods)
+        points.append(None if vert is None else tuple(get_point(vert, obj, matrix)))
+    return points
+
+@profile('draw_alignedDimension')
+def draw_alignedDimensions(context, myobj, measureGen, dims, mat):
+    # Draws the aligned dimensions in dims with one layout pass and
+    # one draw call per style
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
 
-    dimProps = dim
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
-
-    bgl.glEnable(bgl.GL_DEPTH_TEST)
-    if dimProps.inFront:
-         bgl.glDisable(bgl.GL_DEPTH_TEST)
-
-    lineWeight = dimProps.lineWeight
-    # check all visibility conditions
-    if dim.dimVisibleInView is None or dim.dimVisibleInView.name == context.scene.camera.data.name:
-        inView = True        
+    if sceneProps.is_render_draw:
+        viewport = [scene.render.resolution_x, scene.render.resolution_y]
     else:
-        inView = False    
-    if dim.visible and dimProps.visible and inView:
-
-        if sceneProps.is_render_draw:
-            viewport = [context.scene.render.resolution_x, context.scene.render.resolution_y]
-        else:
-            viewport = [context.area.width, context.area.height]
-
-        # Obj Properties
-        scene = context.scene
-        pr = scene.measureit_arch_gl_precision
-        textFormat = "%1." + str(pr) + "f"
-        rawRGB = dimProps.color
-        rgb = (pow(rawRGB[0], (1/2.2)), pow(rawRGB[1], (1/2.2)), pow(rawRGB[2], (1/2.2)), rawRGB[3])
-        
-        # Define Caps as a tuple of capA and capB to reduce code duplications
-        caps = (dimProps.endcapA, dimProps.endcapB)
-        capSize = dimProps.endcapSize
-
-        offset = dim.dimOffset
-        geoOffset = dim.dimLeaderOffset
-
-        # get points positions from indicies
-        aMatrix = mat
-        bMatrix = mat
-        if dim.dimObjectB != dim.dimObjectA:
-            bMatrix = dim.dimObjectB.matrix_world - dim.dimObjectA.matrix_world + mat
-
-        # get points positions from indicies
-        if dim.dimPointA == 9999999:
-            p1 = dim.dimObjectA.location
-        else:
-            p1 = get_point(get_mesh_vertex(dim.dimObjectA,dim.dimPointA,dimProps.evalMods), dim.dimObjectA, aMatrix)
-
-        if dim.dimPointB == 9999999:
-            p2 = dim.dimObjectB.location
-        else:
-            p2 = get_point(get_mesh_vertex(dim.dimObjectB,dim.dimPointB,dimProps.evalMods), dim.dimObjectB, bMatrix)
-
-
-
-        #check dominant Axis
-        sortedPoints = sortPoints(p1, p2)
-        p1 = sortedPoints[0]
-        p2 = sortedPoints[1]
-    
-        
-        #calculate distance & MidpointGY
-        distVector = Vector(p1)-Vector(p2)
-        dist = distVector.length
-        midpoint = interpolate3d(p1, p2, fabs(dist / 2))
-        normDistVector = distVector.normalized()
-        absNormDisVector = Vector((abs(normDistVector[0]),abs(normDistVector[1]),abs(normDistVector[2])))
-
-
-        # Compute offset vector from face normal and user input
-        rotationMatrix = Matrix.Rotation(dim.dimRotation, 4, normDistVector)
-        selectedNormal = Vector(select_normal(myobj, dim, normDistVector, midpoint, dimProps))
-        
-        userOffsetVector = rotationMatrix@selectedNormal
-        offsetDistance = userOffsetVector*offset
-        geoOffsetDistance = offsetDistance.normalized()*geoOffset
-
-        if offsetDistance < geoOffsetDistance:
-            offsetDistance = geoOffsetDistance
-
+        viewport = [context.area.width, context.area.height]
 
-        #Set Gizmo Props
-        dim.gizLoc = midpoint
-        dim.gizRotDir = userOffsetVector
-        
-        # Define Lines
-        leadStartA = Vector(p1) + geoOffsetDistance
-        leadEndA = Vector(p1) + offsetDistance + (offsetDistance.normalized()*0.005*capSize)
+    # check all visibility conditions
+    visible = []
+    points = []
+    for dim in dims:
+        dimProps = get_style(scene, 'alignedDimensions', dim)
+        if not (dim.visible and dimProps.visible):
+            continue
+        if dim.dimVisibleInView is not None and dim.dimVisibleInView.name != scene.camera.data.name:
+            continue
+        dimPoints = get_dimension_points(dim, dimProps, mat)
+        if None in dimPoints:
+            continue
+        visible.append((dim, dimProps))
+        points.append(dimPoints)
+    if len(visible) == 0:
+        return
 
-        leadStartB = Vector(p2) + geoOffsetDistance
-        leadEndB = Vector(p2) + offsetDistance + (offsetDistance.normalized()*0.005*capSize)
+    points = np.array(points, dtype=np.float64)
+    p1, p2 = sort_point_pairs(points[:, 0], points[:, 1])
+    normDistVectors = normalize_rows(p1 - p2)
+    midpoints = (p1 + p2) / 2
+    dists = np.linalg.norm(p1 - p2, axis=1)
 
-        dimLineStart = Vector(p1)+offsetDistance
-        dimLineEnd = Vector(p2)+offsetDistance
-        textLoc = interpolate3d(dimLineStart, dimLineEnd, fabs(dist / 2))
+    pr = scene.measureit_arch_gl_precision
+    textFormat = "%1." + str(pr) + "f"
 
-        # i,j,k as card axis
-        i = Vector((1,0,0))
-        j = Vector((0,1,0))
-        k = Vector((0,0,1))
+    # Per dimension inputs, normals depend on the mesh around each dimension
+    count = len(visible)
+    normals = np.empty((count, 3))
+    params = np.empty((count, 4))
+    cardSizes = np.empty((count, 2))
+    for idx, (dim, dimProps) in enumerate(visible):
+        normals[idx] = select_normal(myobj, dim, Vector(normDistVectors[idx]), Vector(midpoints[idx]), dimProps)
+        params[idx] = (dim.dimRotation, dim.dimOffset, dim.dimLeaderOffset, dimProps.endcapSize)
 
-        # Check for text field
+        # format text and update if necessary
         if len(dim.textFields) == 0:
             dim.textFields.add()
-
         dimText = dim.textFields[0]
+        distanceText = str(format_distance(textFormat, float(dists[idx])))
+        if dimText.text != distanceText:
+            dimText.text = distanceText
+            queue_text_update(dimText)
 
-        # format text and update if necessary
-        distanceText = str(format_distance(textFormat,dist))
-        if dimText.text != str(distanceText):
-            dimText.text = str(distanceText)
-            dimText.text_updated = True
-        
-        width = dimText.textWidth
-        height = dimText.textHeight 
-        
+        cardScale = 0.1 * (dimProps.fontSize / fontSizeMult) / dimProps.textResolution
+        cardSizes[idx] = (dimText.textWidth * cardScale, dimText.textHeight * cardScale)
 
-        resolution = dimProps.textResolution
-        size = dimProps.fontSize/fontSizeMult
-        sx = (width/resolution)*0.1*size
-        sy = (height/resolution)*0.1*size
-        origin = Vector(textLoc)
-        cardX = normDistVector.normalized() * sx
-        cardY = userOffsetVector.normalized() *sy
+    layout = layout_aligned_dimensions(p1, p2, normals, params[:, 0], params[:, 1], params[:, 2], params[:, 3], cardSizes)
+
+    # Text and style groups
+    groups = {}
+    capGroups = {}
+    for idx, (dim, dimProps) in enumerate(visible):
+        #Set Gizmo Props
+        dim.gizLoc = midpoints[idx].tolist()
+        dim.gizRotDir = layout['offsetVectors'][idx].tolist()
 
-        flipCaps = False
-        if (cardX.length + capSize/100) > dist:
-            flipCaps=True
-            origin = Vector(dimLineEnd) - Vector(cardX/2 + cardX.normalized()*capSize/100) -Vector(cardY/2)
-        
-        square = [(origin-(cardX/2)),(origin-(cardX/2)+cardY),(origin+(cardX/2)+cardY),(origin+(cardX/2))]
         if scene.measureit_arch_gl_show_d:
-            draw_text_3D(context,dimText,dimProps,myobj,square)
+            draw_text_3D(context, dim.textFields[0], dimProps, myobj, list(layout['cards'][idx]))
 
-        #Collect coords and endcaps
-        coords = [leadStartA,leadEndA,leadStartB,leadEndB,dimLineStart,dimLineEnd]
-        filledCoords = []
-        pos = (dimLineStart,dimLineEnd)
-        i=0
-        for cap in caps:
-            capCoords = generate_end_caps(context,dimProps,cap,capSize,pos[i],userOffsetVector,textLoc,i,flipCaps)
-            i += 1 
-            for coord in capCoords[0]:
-                coords.append(coord)
-            for filledCoord in capCoords[1]:
-                filledCoords.append(filledCoord)
+        rawRGB = dimProps.color
+        rgb = (pow(rawRGB[0], (1/2.2)), pow(rawRGB[1], (1/2.2)), pow(rawRGB[2], (1/2.2)), rawRGB[3])
+        groupKey = (rgb, dimProps.lineWeight, dimProps.inFront)
+        if groupKey not in groups:
+            groups[groupKey] = {'dims': [], 'capLines': [], 'capTris': []}
+        groups[groupKey]['dims'].append(idx)
+
+        # Caps of the same shape are placed together
+        for capIdx, cap in enumerate((dimProps.endcapA, dimProps.endcapB)):
+            capKey = (groupKey, cap, dimProps.endcapArrowAngle, dimProps.endcapSize, capIdx)
+            capGroups.setdefault(capKey, []).append(idx)
+
+    for (groupKey, cap, arrowAngle, capSize, capIdx), capDims in capGroups.items():
+        capLines, capTris = place_end_caps(cap, arrowAngle, capSize, layout['lines'][capDims, 4 + capIdx],
+                                           layout['textLocs'][capDims], layout['offsetVectors'][capDims],
+                                           np.full(len(capDims), capIdx), layout['flipCaps'][capDims])
+        groups[groupKey]['capLines'].append(capLines)
+        groups[groupKey]['capTris'].append(capTris)
+
+    for (rgb, lineWeight, inFront), group in groups.items():
+        # GL Settings
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_MULTISAMPLE)
+            bgl.glEnable(bgl.GL_BLEND)
+            bgl.glDepthFunc(bgl.GL_LEQUAL)
+            bgl.glDepthMask(False)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            if inFront:
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
 
-        
-        # Keep this out of the loop to avoid extra draw calls 
-        if len(filledCoords) != 0:
-            #bind shader
-            bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-            triShader.bind()
-            triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-            triShader.uniform_float("offset", -0.001)
-
-            batch = batch_for_shader(triShader, 'TRIS', {"pos": filledCoords})
-            batch.program_set(triShader)
-            batch.draw()
-            gpu.shader.unbind()
-            bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
-        
-        #bind shader
-        
-        lineShader.bind()
-        lineShader.uniform_float("Viewport",viewport)
-        lineShader.uniform_float("thickness",lineWeight)
-        lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        lineShader.uniform_float("offset", -0.001)
+        coords = np.concatenate([layout['lines'][group['dims']].reshape(-1, 3)] + group['capLines'])
+        draw_tris(np.concatenate(group['capTris']).astype(np.float32), rgb)
+        draw_lines(coords.astype(np.float32), rgb, lineWeight, viewport)
 
-        # batch & Draw Shader   
-        batch = batch_for_shader(lineShader, 'LINES', {"pos": coords})
-        batch.program_set(lineShader)
-        batch.draw()
-        gpu.shader.unbind()
-        
         #Reset openGL Settings
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(True)
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(True)
 
+@profile('draw_boundsDimension')
 def draw_boundsDimension(context, myobj, measureGen, dim, mat):
-    # GL Settings
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-    bgl.glDepthFunc(bgl.GL_LEQUAL)
-    bgl.glDepthMask(False)
     sceneProps = context.scene.MeasureItArchProps
-    dimProps = dim
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
+    dimProps = get_style(context.scene, 'alignedDimensions', dim)
 
-    bgl.glEnable(bgl.GL_DEPTH_TEST)
-    if dim.inFront:
-         bgl.glDisable(bgl.GL_DEPTH_TEST)
+    # GL Settings
+    if layoutCapture is None:
+        bgl.glEnable(bgl.GL_MULTISAMPLE)
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glDepthFunc(bgl.GL_LEQUAL)
+        bgl.glDepthMask(False)
+        bgl.glEnable(bgl.GL_DEPTH_TEST)
+        if dim.inFront:
+            bgl.glDisable(bgl.GL_DEPTH_TEST)
 
     lineWeight = dimProps.lineWeight
     # check all visibility conditions
@@ -535,7 +943,7 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat):
                 distanceText = str(format_distance(textFormat,dist))
                 if dimText.text != str(distanceText):
                     dimText.text = str(distanceText)
-                    dimText.text_updated = True
+                    queue_text_update(dimText)
                 
                 width = dimText.textWidth
                 height = dimText.textHeight 
@@ -577,58 +985,30 @@ def draw_boundsDimension(context, myobj, measureGen, dim, mat):
 
                 
                 # Keep this out of the loop to avoid extra draw calls 
-                if len(filledCoords) != 0:
-                    #bind shader
-                    bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-                    triShader.bind()
-                    triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-                    triShader.uniform_float("offset", -0.001)
-
-                    batch = batch_for_shader(triShader, 'TRIS', {"pos": filledCoords})
-                    batch.program_set(triShader)
-                    batch.draw()
-                    gpu.shader.unbind()
-                    bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
-                
-                #bind shader
-                
-                lineShader.bind()
-                lineShader.uniform_float("Viewport",viewport)
-                lineShader.uniform_float("thickness",lineWeight)
-                lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-                lineShader.uniform_float("offset", -0.001)
-
-                # batch & Draw Shader   
-                batch = batch_for_shader(lineShader, 'LINES', {"pos": coords})
-                batch.program_set(lineShader)
-                batch.draw()
-                gpu.shader.unbind()
+                draw_tris(filledCoords, rgb)
+                draw_lines(coords, rgb, lineWeight, viewport)
             idx+=1
         #Reset openGL Settings
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(True)
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(True)
 
+@profile('draw_axisDimension')
 def draw_axisDimension(context, myobj, measureGen,dim, mat):
-    # GL Settings
-
     #start = time.perf_counter()
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-    bgl.glDepthFunc(bgl.GL_LEQUAL)
-    bgl.glDepthMask(False)
-
-    dimProps = dim
-
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
+    dimProps = get_style(context.scene, 'alignedDimensions', dim)
 
     sceneProps = context.scene.MeasureItArchProps
 
-    bgl.glEnable(bgl.GL_DEPTH_TEST)
-    if dimProps.inFront:
-         bgl.glDisable(bgl.GL_DEPTH_TEST)
+    # GL Settings
+    if layoutCapture is None:
+        bgl.glEnable(bgl.GL_MULTISAMPLE)
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glDepthFunc(bgl.GL_LEQUAL)
+        bgl.glDepthMask(False)
+        bgl.glEnable(bgl.GL_DEPTH_TEST)
+        if dimProps.inFront:
+            bgl.glDisable(bgl.GL_DEPTH_TEST)
 
     lineWeight = dimProps.lineWeight
     #check all visibility conditions
@@ -830,7 +1210,7 @@ def draw_axisDimension(context, myobj, measureGen,dim, mat):
         distanceText = str(format_distance(textFormat,dist))
         if dimText.text != str(distanceText):
             dimText.text = str(distanceText)
-            dimText.text_updated = True
+            queue_text_update(dimText)
         
         width = dimText.textWidth
         height = dimText.textHeight 
@@ -907,46 +1287,21 @@ def draw_axisDimension(context, myobj, measureGen,dim, mat):
 
         
         # Keep this out of the loop to avoid extra draw calls 
-        if len(filledCoords) != 0:
-            #bind shader
-            bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-            triShader.bind()
-            triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-            triShader.uniform_float("offset", -0.001)
-
-            batch = batch_for_shader(triShader, 'TRIS', {"pos": filledCoords})
-            batch.program_set(triShader)
-            batch.draw()
-            gpu.shader.unbind()
-            bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
-        
-        #bind shader
-        lineShader.bind()
-        lineShader.uniform_float("Viewport",viewport)
-        lineShader.uniform_float("thickness",lineWeight)
-        lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        lineShader.uniform_float("offset", -0.001)
-
-        # batch & Draw Shader   
-        batch = batch_for_shader(lineShader, 'LINES', {"pos": coords})
-        batch.program_set(lineShader)
-        batch.draw()
-        gpu.shader.unbind()
+        draw_tris(filledCoords, rgb)
+        draw_lines(coords, rgb, lineWeight, viewport)
 
         #Reset openGL Settings
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(True)
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(True)
 
         #end = time.perf_counter()
         #print(("draw time: "+ "%.3f"%((end-start)*1000)) + ' ms')  
 
+@profile('draw_angleDimension')
 def draw_angleDimension(context, myobj, DimGen, dim,mat):
-    dimProps = dim
+    dimProps = get_style(context.scene, 'alignedDimensions', dim)
     sceneProps = context.scene.MeasureItArchProps
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
 
     # Check Visibility Conditions
     inView = False
@@ -955,12 +1310,13 @@ def draw_angleDimension(context, myobj, DimGen, dim,mat):
     
     if inView and dim.visible and dimProps.visible:
          # GL Settings
-        bgl.glEnable(bgl.GL_MULTISAMPLE)
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        if dimProps.inFront:
-            bgl.glDisable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(False)
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_MULTISAMPLE)
+            bgl.glEnable(bgl.GL_BLEND)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            if dimProps.inFront:
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(False)
 
         lineWeight = dimProps.lineWeight
         if sceneProps.is_render_draw:
@@ -1035,7 +1391,7 @@ def draw_angleDimension(context, myobj, DimGen, dim,mat):
 
         if dim.textFields[0].text != str(angleText):
             dim.textFields[0].text = str(angleText)
-            dim.textFields[0].text_updated = True
+            queue_text_update(dim.textFields[0])
         
         #make text card
         vecX = midVec.cross(norm).normalized()
@@ -1058,12 +1414,6 @@ def draw_angleDimension(context, myobj, DimGen, dim,mat):
 
         
 
-        lineShader.bind()
-        lineShader.uniform_float("Viewport",viewport)
-        lineShader.uniform_float("thickness",lineWeight)
-        lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        lineShader.uniform_float("offset", -offset)
-
         # Draw Point Pass for Clean Corners
         # I'm being lazy here, should do a proper lineadjacency
         # with miters and do this in one pass
@@ -1074,17 +1424,7 @@ def draw_angleDimension(context, myobj, DimGen, dim,mat):
             pointCoords.append((vert*radius)+p2)
         pointCoords.append((endVec*radius)+p2)
 
-        #configure shaders
-        pointShader.bind()
-        pointShader.uniform_float("Viewport",viewport)
-        pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        pointShader.uniform_float("thickness", lineWeight)
-        pointShader.uniform_float("offset", -0.001)
-        gpu.shader.unbind()
-
-        batch3d = batch_for_shader(pointShader, 'POINTS', {"pos":pointCoords})
-        batch3d.program_set(pointShader)
-        batch3d.draw()
+        draw_points(pointCoords, rgb, lineWeight, viewport)
 
         
 
@@ -1113,36 +1453,20 @@ def draw_angleDimension(context, myobj, DimGen, dim,mat):
                 filledCoords.append(filledCoord)
 
        
-        if len(filledCoords) != 0:
-            #bind shader
-            bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-            triShader.bind()
-            triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-            triShader.uniform_float("offset", -offset) #z offset this a little to avoid zbuffering
-
-            batch = batch_for_shader(triShader, 'TRIS', {"pos": filledCoords})
-            batch.program_set(triShader)
-            batch.draw()
-            gpu.shader.unbind()
-            bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
-
-        batch = batch_for_shader(lineShader, 'LINES', {"pos": coords})
-        batch.program_set(lineShader)
-        batch.draw()
-        gpu.shader.unbind()
+        #z offset this a little to avoid zbuffering
+        draw_tris(filledCoords, rgb, -offset)
+        draw_lines(coords, rgb, lineWeight, viewport, -offset)
 
         #Reset openGL Settings
-        bgl.glDisable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(True)
+        if layoutCapture is None:
+            bgl.glDisable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(True)
 
 
+@profile('draw_arcDimension')
 def draw_arcDimension(context, myobj, DimGen, dim,mat):
-    dimProps = dim
+    dimProps = get_style(context.scene, 'alignedDimensions', dim)
     sceneProps = context.scene.MeasureItArchProps
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
 
     # Check Visibility Conditions
     inView = False
@@ -1151,12 +1475,13 @@ def draw_arcDimension(context, myobj, DimGen, dim,mat):
     
     if inView and dim.visible and dimProps.visible:
         # GL Settings
-        bgl.glEnable(bgl.GL_MULTISAMPLE)
-        bgl.glEnable(bgl.GL_BLEND)
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        if dimProps.inFront:
-            bgl.glDisable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(False)
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_MULTISAMPLE)
+            bgl.glEnable(bgl.GL_BLEND)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            if dimProps.inFront:
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(False)
 
         lineWeight = dimProps.lineWeight
         if sceneProps.is_render_draw:
@@ -1286,23 +1611,12 @@ def draw_arcDimension(context, myobj, DimGen, dim,mat):
 
         
 
-        if len(filledCoords) != 0:
-            #bind shader
-            bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-            triShader.bind()
-            triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-            triShader.uniform_float("offset", -offset) #z offset this a little to avoid zbuffering
-
-            mappedFilledCoords = []
-            for coord in filledCoords:
-                mappedFilledCoords.append(coord+center)
+        mappedFilledCoords = []
+        for coord in filledCoords:
+            mappedFilledCoords.append(coord+center)
 
-
-            batch = batch_for_shader(triShader, 'TRIS', {"pos": mappedFilledCoords})
-            batch.program_set(triShader)
-            batch.draw()
-            gpu.shader.unbind()
-            bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
+        #z offset this a little to avoid zbuffering
+        draw_tris(mappedFilledCoords, rgb, -offset)
 
         
         #### TEXT
@@ -1328,12 +1642,12 @@ def draw_arcDimension(context, myobj, DimGen, dim,mat):
 
         if lengthText.text != str(lengthStr):
             lengthText.text = str(lengthStr)
-            lengthText.text_updated = True
+            queue_text_update(lengthText)
 
         
         if radiusText.text != str(lengthStr):
             radiusText.text = str(radStr)
-            radiusText.text_updated = True
+            queue_text_update(radiusText)
         
         #make Radius text card
         width = radiusText.textWidth
@@ -1387,16 +1701,7 @@ def draw_arcDimension(context, myobj, DimGen, dim,mat):
             point_coords.append(coord+center)
 
 
-        lineShader.bind()
-        lineShader.uniform_float("Viewport",viewport)
-        lineShader.uniform_float("thickness",lineWeight)
-        lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        lineShader.uniform_float("offset", -offset)
-
-        batch = batch_for_shader(lineShader, 'LINES', {"pos": draw_coords})
-        batch.program_set(lineShader)
-        batch.draw()
-        gpu.shader.unbind()
+        draw_lines(draw_coords, rgb, lineWeight, viewport, -offset)
 
         # Draw the arc itself
         Coords = []
@@ -1415,42 +1720,18 @@ def draw_arcDimension(context, myobj, DimGen, dim,mat):
             draw_coords.append(coord+center)
             point_coords2.append(coord+center)  
 
-        lineShader.bind()
-        lineShader.uniform_float("thickness",lineWeight-1)
-        batch = batch_for_shader(lineShader, 'LINES', {"pos": draw_coords})
-        batch.program_set(lineShader)
-        batch.draw()
-        gpu.shader.unbind()
-
-        pointShader.bind()
-        pointShader.uniform_float("Viewport",viewport)
-        pointShader.uniform_float("thickness",lineWeight)
-        pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-        pointShader.uniform_float("offset", -offset)
+        draw_lines(draw_coords, rgb, lineWeight-1, viewport, -offset)
 
-        batch = batch_for_shader(pointShader, 'POINTS', {"pos": point_coords})
-        batch.program_set(pointShader)
-        batch.draw()
-
-        pointShader.uniform_float("thickness",lineWeight-1)
-        batch = batch_for_shader(pointShader, 'POINTS', {"pos": point_coords2})
-        batch.program_set(pointShader)
-        batch.draw()
+        draw_points(point_coords, rgb, lineWeight, viewport, -offset)
+        draw_points(point_coords2, rgb, lineWeight-1, viewport, -offset)
 
         pointCenter = [center]
-        pointShader.uniform_float("thickness",lineWeight*4)
-        batch = batch_for_shader(pointShader, 'POINTS', {"pos": pointCenter})
-        batch.program_set(pointShader)
-        batch.draw()
-
-        gpu.shader.unbind()
+        draw_points(pointCenter, rgb, lineWeight*4, viewport, -offset)
 
-        
-
- 
         #Reset openGL Settings
-        bgl.glDisable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthMask(True)
+        if layoutCapture is None:
+            bgl.glDisable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthMask(True)
 
 
 def select_normal(myobj, dim, normDistVector, midpoint, dimProps):
@@ -1510,14 +1791,12 @@ def select_normal(myobj, dim, normDistVector, midpoint, dimProps):
             
         #get Adjacent Face normals if possible
         possibleNormals = []
-        faces = myobj.data.polygons
-        if len(faces)<2000:    
-            for face in myobj.data.polygons:
-                if dim.dimPointA in face.vertices and dim.dimPointB in face.vertices:
-                    worldNormal = myobj.matrix_local@Vector(face.normal)
-                    worldNormal -= myobj.location
-                    worldNormal.normalize()
-                    possibleNormals.append(worldNormal)
+        edgeFaces = get_edge_face_index(myobj)
+        for faceNormal in get_edge_face_normals(edgeFaces, dim.dimPointA, dim.dimPointB):
+            worldNormal = myobj.matrix_local@Vector(faceNormal)
+            worldNormal -= myobj.location
+            worldNormal.normalize()
+            possibleNormals.append(worldNormal)
                         
         # Check if Face Normals are available
         if len(possibleNormals) != 2: badNormals = True
@@ -1563,11 +1842,134 @@ def select_normal(myobj, dim, normDistVector, midpoint, dimProps):
     bestNormal.normalize()
     return bestNormal 
         
+# --------------------------------------------------------------------
+# Edge to face adjacency
+# Built once per mesh revision with NumPy, so looking up the faces of
+# an edge doesn't require a scan of every polygon in the mesh
+# --------------------------------------------------------------------
+def get_edge_face_index(myobj):
+    mesh = myobj.data
+    revision = get_geometry_revision(myobj)
+    if mesh.name in edgeFaceIndex and edgeFaceIndex[mesh.name]['revision'] == revision:
+        return edgeFaceIndex[mesh.name]
+
+    index = build_edge_face_index(get_edge_face_arrays(mesh))
+    set_edge_face_index(myobj, index, revision)
+    return index
+
+def set_edge_face_index(myobj, index, revision):
+    index['revision'] = revision
+    edgeFaceIndex[myobj.data.name] = index
+
+def get_edge_face_arrays(mesh):
+    # Raw mesh arrays for build_edge_face_index(), read on the main thread
+    numFaces = len(mesh.polygons)
+    edgeVerts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edgeVerts)
+    loopEdges = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('edge_index', loopEdges)
+    loopTotals = np.empty(numFaces, dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotals)
+    normals = np.empty(numFaces * 3, dtype=np.float32)
+    mesh.polygons.foreach_get('normal', normals)
+    return {
+        'numVerts': len(mesh.vertices),
+        'edgeVerts': edgeVerts,
+        'loopEdges': loopEdges,
+        'loopTotals': loopTotals,
+        'normals': normals,
+    }
+
+def build_edge_face_index(arrays):
+    # Only uses NumPy, safe to run outside of the main thread
+    numVerts = arrays['numVerts']
+    edgeVerts = arrays['edgeVerts'].reshape(-1, 2).astype(np.int64)
+    edgeVerts.sort(axis=1)
+    edgeKeys = edgeVerts[:, 0] * numVerts + edgeVerts[:, 1]
+    keyOrder = np.argsort(edgeKeys)
+
+    loopEdges = arrays['loopEdges']
+    loopTotals = arrays['loopTotals']
+    loopFaces = np.repeat(np.arange(len(loopTotals)), loopTotals)
+
+    # Group the faces of each loop by edge, edgeStart holds the offsets
+    loopOrder = np.argsort(loopEdges, kind='stable')
+    edgeStart = np.searchsorted(loopEdges[loopOrder], np.arange(len(edgeVerts) + 1))
+
+    return {
+        'revision': None,
+        'numVerts': numVerts,
+        'edgeVerts': edgeVerts,
+        'sortedKeys': edgeKeys[keyOrder],
+        'keyOrder': keyOrder,
+        'edgeStart': edgeStart,
+        'edgeFaces': loopFaces[loopOrder],
+        'normals': arrays['normals'].reshape(-1, 3),
+    }
+
+def get_edge_faces(index, a, b):
+    numVerts = index['numVerts']
+    if a >= numVerts or b >= numVerts or a == b:
+        return []
+    key = min(a, b) * numVerts + max(a, b)
+    pos = np.searchsorted(index['sortedKeys'], key)
+    if pos == len(index['sortedKeys']) or index['sortedKeys'][pos] != key:
+        return []
+    edge = index['keyOrder'][pos]
+    return index['edgeFaces'][index['edgeStart'][edge]:index['edgeStart'][edge + 1]]
+
+def get_edge_face_normals(index, a, b):
+    return index['normals'][get_edge_faces(index, a, b)]
+
+def get_crease_edges(index, angle):
+    # Edges whose two faces meet at more than angle, as (n, 2) vertex
+    # indices. Edges without exactly two faces are always creases
+    edgeStart = index['edgeStart']
+    normals = index['normals']
+    manifold = np.diff(edgeStart) == 2
+    firstLoop = edgeStart[:-1][manifold]
+    normalA = normals[index['edgeFaces'][firstLoop]]
+    normalB = normals[index['edgeFaces'][firstLoop + 1]]
+
+    crease = ~manifold
+    crease[manifold] = np.einsum('ij,ij->i', normalA, normalB) < cos(angle)
+    return index['edgeVerts'][crease]
+
+def get_approximate_crease_edges(index, vertNormals, angle):
+    # Faster test, compares each face normal with the averaged vertex
+    # normals of its edges. Edges without faces are skipped
+    edgeVerts = index['edgeVerts']
+    edgeNormals = vertNormals[edgeVerts[:, 0]] + vertNormals[edgeVerts[:, 1]]
+    lengths = np.linalg.norm(edgeNormals, axis=1)
+    edgeNormals /= np.where(lengths == 0, 1, lengths)[:, None]
+
+    loopEdges = np.repeat(np.arange(len(edgeVerts)), np.diff(index['edgeStart']))
+    faceNormals = index['normals'][index['edgeFaces']]
+    dots = np.einsum('ij,ij->i', faceNormals, edgeNormals[loopEdges])
+    return edgeVerts[np.unique(loopEdges[dots < cos(angle)])]
+
+def get_vertex_normals(mesh):
+    normals = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('normal', normals)
+    return normals.reshape(-1, 3)
+
+def find_crease_edges(arrays, angle, approximate):
+    # Crease edges from get_edge_face_arrays(), with 'vertNormals' added
+    # for the approximate test. Only uses NumPy, safe to run in a thread
+    index = build_edge_face_index(arrays)
+    if approximate:
+        creaseEdges = get_approximate_crease_edges(index, arrays['vertNormals'], angle)
+    else:
+        creaseEdges = get_crease_edges(index, angle)
+    return index, creaseEdges
+
+@profile('draw_line_group')
 def draw_line_group(context, myobj, lineGen, mat):
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-    bgl.glEnable(bgl.GL_DEPTH_TEST)
-    bgl.glDepthMask(False)
+    if layoutCapture is None:
+        bgl.glEnable(bgl.GL_MULTISAMPLE)
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glEnable(bgl.GL_DEPTH_TEST)
+        bgl.glDepthMask(False)
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
     
@@ -1579,16 +1981,13 @@ def draw_line_group(context, myobj, lineGen, mat):
 
     for idx in range(0, lineGen.line_num):
         lineGroup = lineGen.line_groups[idx]
-        lineProps = lineGroup
-        if lineGroup.uses_style:
-            for lineStyle in context.scene.StyleGenerator.line_groups:
-                if lineStyle.name == lineGroup.style:
-                    lineProps= lineStyle
+        lineProps = get_style(context.scene, 'line_groups', lineGroup)
             
         if lineGroup.visible and lineProps.visible:
-            bgl.glEnable(bgl.GL_DEPTH_TEST)
-            if lineProps.inFront:
-                bgl.glDisable(bgl.GL_DEPTH_TEST)
+            if layoutCapture is None:
+                bgl.glEnable(bgl.GL_DEPTH_TEST)
+                if lineProps.inFront:
+                    bgl.glDisable(bgl.GL_DEPTH_TEST)
 
 
             rawRGB = lineProps.color        
@@ -1642,7 +2041,8 @@ def draw_line_group(context, myobj, lineGen, mat):
             offset /= 1000
 
             #gl Settings
-            bgl.glDepthFunc(bgl.GL_LEQUAL) 
+            if layoutCapture is None:
+                bgl.glDepthFunc(bgl.GL_LEQUAL) 
 
             
             #Get line data to be drawn
@@ -1650,29 +2050,23 @@ def draw_line_group(context, myobj, lineGen, mat):
             evalMods = lineProps.evalMods
 
             # Flag for re-evaluation of batches & mesh data
-            verts=[]
-            global lastMode
-            recoordFlag = False
+            # Only rebuild when the geometry revision of myobj changed
             evalModsGlobal = sceneProps.eval_mods
-            if lastMode != myobj.mode or evalMods or evalModsGlobal:
+            batchKey = get_line_group_key(myobj, lineGroup)
+            revision = get_geometry_revision(myobj) + (evalMods or evalModsGlobal,)
+            recoordFlag = False
+            if lineGroupRevision.get(batchKey) != revision or batchKey not in lineCoords3D:
                 recoordFlag = True
-                lastMode = myobj.mode
-                
-            if myobj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(myobj.data)
-                verts = bm.verts
-            else:     
-                if (evalModsGlobal or evalMods) and check_mods(myobj):
-                    deps = bpy.context.view_layer.depsgraph
-                    obj_eval = myobj.evaluated_get(deps)
-                    mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
-                    verts = mesh.vertices          
-                else:
-                    verts = myobj.data.vertices
+                lineGroupRevision[batchKey] = revision
+                hiddenBatch3D.pop(batchKey, None)
+                dashedBatch3D.pop(batchKey, None)
+                lineBatch3D.pop(batchKey, None)
+
+            if recoordFlag:
+                vertCoords = get_frame_verts(myobj, evalMods)
+                if not isinstance(vertCoords, np.ndarray):
+                    vertCoords = get_vertex_coords(vertCoords)
 
-            # Get Coords
-            sceneProps = bpy.context.scene.MeasureItArchProps
-            if 'coordBuffer' not in lineGroup or evalMods or recoordFlag:
                 # Handle line groups created with older versions of measureIt-ARCH
                 if 'singleLine' in lineGroup and 'lineBuffer' not in lineGroup:
                     toLineBuffer = []
@@ -1680,20 +2074,29 @@ def draw_line_group(context, myobj, lineGen, mat):
                         toLineBuffer.append(line['pointA'])
                         toLineBuffer.append(line['pointB'])
                     lineGroup['lineBuffer'] = toLineBuffer
-                
-                if 'lineBuffer' in lineGroup:
-                    tempCoords = [get_line_vertex(idx,verts,mat) for idx in lineGroup['lineBuffer']]
-                    lineGroup['coordBuffer'] = tempCoords
-
 
+                # Coords used to be stored on the line group, drop them
+                if 'coordBuffer' in lineGroup:
+                    del lineGroup['coordBuffer']
 
+                if 'lineBuffer' in lineGroup:
+                    lineCoords3D[batchKey] = get_line_coords(lineGroup['lineBuffer'], vertCoords)
+                else:
+                    lineCoords3D[batchKey] = np.empty((0, 3), dtype=np.float32)
 
+                # Edges flagged in the group's mesh attribute
+                attrPairs = get_line_attribute_pairs(myobj, lineGroup, evalMods)
+                if attrPairs is not None and len(attrPairs) != 0:
+                    lineCoords3D[batchKey] = np.concatenate(
+                        (lineCoords3D[batchKey], get_line_coords(attrPairs.ravel(), vertCoords)))
 
-            coords = []            
-            coords = lineGroup['coordBuffer']
-            start = time.time ()
+            coords = lineCoords3D[batchKey]
 
+            if layoutCapture is not None:
+                capture_line_group(batchKey, coords, mat, lineProps, rgb)
+                continue
 
+            start = time.time ()
 
             if drawHidden == True:
                 # Invert The Depth test for hidden lines
@@ -1713,9 +2116,7 @@ def draw_line_group(context, myobj, lineGen, mat):
                 dashedLineShader.uniform_float("finalColor", (dashRGB[0], dashRGB[1], dashRGB[2], dashRGB[3]))
                 dashedLineShader.uniform_float("offset", -offset)
     
-                global hiddenBatch3D
-                batchKey = myobj.name + lineGroup.name
-                if  batchKey not in hiddenBatch3D or recoordFlag:
+                if batchKey not in hiddenBatch3D:
                     hiddenBatch3D[batchKey] = batch_for_shader(dashedLineShader,'LINES',{"pos":coords}) 
                 if sceneProps.is_render_draw:
                     batchHidden = batch_for_shader(dashedLineShader,'LINES',{"pos":coords}) 
@@ -1728,8 +2129,7 @@ def draw_line_group(context, myobj, lineGen, mat):
                 bgl.glDepthFunc(bgl.GL_LESS)
                 gpu.shader.unbind()
                 end= time.time()
-                post = ' Hidden Line Shader for ' + str(math.ceil(len(lineGroup['lineBuffer'])/2)) + ' line segemtns'
-                printTime(start,end,post)
+                printTime(start,end,'draw_line_group hidden lines')
                 start = time.time ()
             
  
@@ -1744,9 +2144,7 @@ def draw_line_group(context, myobj, lineGen, mat):
                 dashedLineShader.uniform_float("offset", -offset)
 
             
-                global dashedBatch3D
-                batchKey = myobj.name + lineGroup.name
-                if batchKey not in dashedBatch3D or recoordFlag:
+                if batchKey not in dashedBatch3D:
                     dashedBatch3D[batchKey] = batch_for_shader(dashedLineShader,'LINES',{"pos":coords}) 
                 if sceneProps.is_render_draw:
                     batchDashed = batch_for_shader(dashedLineShader,'LINES',{"pos":coords}) 
@@ -1756,8 +2154,7 @@ def draw_line_group(context, myobj, lineGen, mat):
                 batchDashed.program_set(dashedLineShader)
                 batchDashed.draw()
                 end= time.time()
-                post = 'All Dashed Line Shader for ' + str(math.ceil(len(lineGroup['lineBuffer'])/2)) + ' line segemtns'
-                printTime(start,end,post)
+                printTime(start,end,'draw_line_group dashed lines')
                 start = time.time ()
 
             else:
@@ -1771,11 +2168,8 @@ def draw_line_group(context, myobj, lineGen, mat):
                 
                 #colors = [(rgb[0], rgb[1], rgb[2], rgb[3]) for coord in range(len(coords))]
 
-                global lineBatch3D
-                batchKey = myobj.name + lineGroup.name
-                if batchKey not in lineBatch3D or recoordFlag:
+                if batchKey not in lineBatch3D:
                     lineBatch3D[batchKey] = batch_for_shader(lineGroupShader, 'LINES', {"pos": coords})
-                    batch3d = lineBatch3D[batchKey]
                 if sceneProps.is_render_draw:
                     batch3d = batch_for_shader(lineGroupShader, 'LINES', {"pos": coords})
                 else:
@@ -1785,187 +2179,171 @@ def draw_line_group(context, myobj, lineGen, mat):
                 batch3d.draw()
                 gpu.shader.unbind()
                 end= time.time()
-                post = ' Line Shader for ' + str(math.ceil(len(lineGroup['lineBuffer'])/2)) + ' line segemtns'
-                #printTime(start,end,post)
+                printTime(start,end,'draw_line_group lines')
                 start = time.time ()
     
-    gpu.shader.unbind()
-    bgl.glDisable(bgl.GL_DEPTH_TEST)
-    bgl.glDepthMask(True)
+    if layoutCapture is None:
+        gpu.shader.unbind()
+        bgl.glDisable(bgl.GL_DEPTH_TEST)
+        bgl.glDepthMask(True)
 
+def capture_line_group(batchKey, coords, mat, lineProps, rgb):
+    # Line group coords are in object space, the capture is in world space
+    rot = np.array(mat.to_3x3(), dtype=np.float32)
+    loc = np.array(mat.to_translation(), dtype=np.float32)
+    hidden = None
+    if lineProps.lineDrawHidden:
+        rawRGB = lineProps.lineHiddenColor
+        hidden = {
+            'color': (pow(rawRGB[0],(1/2.2)),pow(rawRGB[1],(1/2.2)),pow(rawRGB[2],(1/2.2)),rawRGB[3]),
+            'weight': lineProps.lineHiddenWeight,
+            'dashScale': lineProps.lineHiddenDashScale}
+
+    layoutCapture['lines'].append({
+        'coords': coords @ rot.T + loc,
+        'color': tuple(rgb),
+        'weight': lineProps.lineWeight,
+        'dashScale': lineProps.lineHiddenDashScale if lineProps.lineDrawDashed else 0,
+        'group': batchKey,
+        'hidden': hidden,
+        'occlude': not lineProps.inFront})
+
+@profile('draw_annotation')
 def draw_annotation(context, myobj, annotationGen, mat):
     scene = context.scene
-    bgl.glEnable(bgl.GL_MULTISAMPLE)
-    bgl.glEnable(bgl.GL_BLEND)
-
-    bgl.glDepthMask(False)
+    if layoutCapture is None:
+        bgl.glEnable(bgl.GL_MULTISAMPLE)
+        bgl.glEnable(bgl.GL_BLEND)
+        bgl.glDepthMask(False)
     sceneProps = scene.MeasureItArchProps
 
     if sceneProps.is_render_draw:
         viewport = [context.scene.render.resolution_x,context.scene.render.resolution_y]
     else:
         viewport = [context.area.width,context.area.height]
-    
 
+    # Anchors and local text cards of the visible annotations, the cards
+    # of all of them are moved to world space together below
+    visible = []
+    anchors = []
+    localCards = []
     for idx in range(0, annotationGen.num_annotations):
         annotation = annotationGen.annotations[idx]
-        annotationProps = annotation
-        if annotation.uses_style:
-            for annotationStyle in context.scene.StyleGenerator.annotations:
-                if annotationStyle.name == annotation.style:
-                    annotationProps= annotationStyle
+        annotationProps = get_style(context.scene, 'annotations', annotation)
+        if not (annotation.visible and annotationProps.visible):
+            continue
+
+        # Get Points
+        if annotation.annotationAnchorObject.type == 'MESH':
+            vert = get_mesh_vertex(myobj,annotation.annotationAnchor,annotationProps.evalMods)
+            if vert is None:
+                continue
+            p1 = get_point(vert, myobj, mat)
+        else:
+            p1 = mat @ Vector((0,0,0))
 
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        if annotationProps.inFront:
-            bgl.glDisable(bgl.GL_DEPTH_TEST)
+        if len(annotation.textFields) == 0:
+            annotation.textFields.add()
+
+        # Fields stack downwards from the annotation offset
+        cards = np.array([generate_text_card(context, textField, annotationProps, annotation.annotationRotation, (0, 0, 0))
+                          for textField in annotation.textFields])
+        heightOffsets = cards[:, 1] - cards[:, 0]
+        cards += np.array(annotation.annotationOffset) - heightOffsets[:, None] * np.arange(len(cards))[:, None, None]
+
+        visible.append((annotation, annotationProps, Vector(p1)))
+        anchors.extend([tuple(p1)] * len(cards))
+        localCards.append(cards)
+
+    if len(visible) == 0:
+        if layoutCapture is None:
+            bgl.glDepthMask(True)
+        return
+
+    # Offsets and cards follow the object's rotation but not its scale
+    rotMatrix = mat.to_quaternion().to_matrix()
+    worldCards = np.concatenate(localCards) @ np.array(rotMatrix).T + np.array(anchors)[:, None]
+
+    coneTips = {}
+    cardIdx = 0
+    for annotation, annotationProps, p1 in visible:
+        textcards = worldCards[cardIdx:cardIdx + len(annotation.textFields)]
+        cardIdx += len(annotation.textFields)
+
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            if annotationProps.inFront:
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
 
         endcap = annotationProps.endcapA
         endcapSize = annotationProps.endcapSize
+        lineWeight = annotationProps.lineWeight
+        rawRGB = annotationProps.color
+        #undo blenders Default Gamma Correction
+        rgb = (pow(rawRGB[0],(1/2.2)),pow(rawRGB[1],(1/2.2)),pow(rawRGB[2],(1/2.2)),rawRGB[3])
 
-        if annotation.visible and annotationProps.visible:
-            lineWeight = annotationProps.lineWeight
-            rawRGB = annotationProps.color
-            #undo blenders Default Gamma Correction
-            rgb = (pow(rawRGB[0],(1/2.2)),pow(rawRGB[1],(1/2.2)),pow(rawRGB[2],(1/2.2)),rawRGB[3])
-
-            pointShader.bind()
-            pointShader.uniform_float("Viewport",viewport)
-            pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-            pointShader.uniform_float("thickness", lineWeight)
-            pointShader.uniform_float("offset", -0.001)
-            gpu.shader.unbind()
-
-            lineShader.bind()
-            lineShader.uniform_float("Viewport",viewport)
-            lineShader.uniform_float("thickness",lineWeight)
-            lineShader.uniform_float("offset", -0.001)
-            lineShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-
-            # Get Points
-            if annotation.annotationAnchorObject.type == 'MESH':
-                p1 = get_point(get_mesh_vertex(myobj,annotation.annotationAnchor,annotationProps.evalMods), myobj,mat)
-            else:
-                p1 = mat @ Vector((0,0,0))
+        p2 = rotMatrix @ Vector(annotation.annotationOffset) + p1
 
-            loc = mat.to_translation()
-            diff = Vector(p1) - Vector(loc)
-            offset = annotation.annotationOffset
-            
-            p2 =  Vector(offset)
-
-            #Get local Rotation and Translation
-            rot = mat.to_quaternion()
-            loc = mat.to_translation()
-
-            #Compose Rotation and Translation Matrix
-            rotMatrix = Matrix.Identity(3)
-            rotMatrix.rotate(rot)
-            rotMatrix.resize_4x4()
-            locMatrix = Matrix.Translation(loc)
-            rotLocMatrix = locMatrix @ rotMatrix
-
-            # Transform offset with Composed Matrix
-            p2 = rotLocMatrix @ Vector(p2) + diff
-
-            fieldIdx = 0
-            if 'textFields' not in annotation:
-                annotation.textFields.add()
-            for textField in annotation.textFields:
-                textcard = generate_text_card(context,textField,annotationProps,annotation.annotationRotation,(0,0,0))
-                heightOffset = textcard[1] - textcard[0]
-                # Transform Text Card with Composed Matrix
-                textcard[0] = rotLocMatrix @ (textcard[0] + offset - (heightOffset*fieldIdx)) + diff
-                textcard[1] = rotLocMatrix @ (textcard[1] + offset - (heightOffset*fieldIdx)) + diff
-                textcard[2] = rotLocMatrix @ (textcard[2] + offset - (heightOffset*fieldIdx)) + diff
-                textcard[3] = rotLocMatrix @ (textcard[3] + offset - (heightOffset*fieldIdx)) + diff
-
-                textField['textcard'] = textcard
-                fieldIdx += 1
-            # Set Gizmo Properties
-            annotation.gizLoc = p2
-
-            # Draw
-            if  p1 is not None and p2 is not None:
-
-                coords =[]
-                
-                # Move end of line Back if arrow endcap
-                if endcap == 'T':
-                    axis = Vector(p1) - Vector(p2)
-                    lineEnd = Vector(p1) - axis * 0.02 * lineWeight
-                else: lineEnd = p1
-
-                coords.append(lineEnd)
-                coords.append(p2)
-                coords.append(p2)
-
-                textcard = annotation.textFields[0]['textcard']
-                if annotation.textPosition == 'T':
-                    coords.append(textcard[3])
-                    pointcoords = [p2]
-                elif annotation.textPosition == 'B':
-                    coords.append(textcard[2])
-                    pointcoords = [p2]
-
-                batch3d = batch_for_shader(lineShader, 'LINES', {"pos": coords})
-                batch3d.program_set(lineShader)
-                batch3d.draw()
-                gpu.shader.unbind()
-                
-                # Again This is Super Lazy, gotta write up a shader that handles
-                # Mitered thick lines, but for now this works.
-                if annotation.textPosition == 'T' or annotation.textPosition == 'B':
-                    batch3d = batch_for_shader(pointShader, 'POINTS', {"pos": pointcoords})
-                    batch3d.program_set(pointShader)
-                    batch3d.draw()
-            
-            # Draw Line Endcaps
-            if endcap == 'D':
-                pointShader.bind()
-                pointShader.uniform_float("Viewport",viewport)
-                pointShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-                pointShader.uniform_float("thickness", endcapSize)
-                pointShader.uniform_float("offset", -0.01)
-                gpu.shader.unbind()
-                
-                pointcoords = [p1]
-                batch3d = batch_for_shader(pointShader, 'POINTS', {"pos": pointcoords})
-                batch3d.program_set(pointShader)
-                batch3d.draw()
-            
-            if endcap == 'T':
-                axis = Vector(p1) - Vector(p2)
-                line = interpolate3d(Vector((0,0,0)), axis, -0.1)
-                line = Vector(line) * endcapSize/10
-                perp = line.orthogonal()
-                rotangle = annotationProps.endcapArrowAngle-radians(5)
-                line.rotate(Quaternion(perp,rotangle))
-                coords = []
-                for idx in range (12):
-                    rotangle = radians(360/12)
-                    coords.append(line.copy() + Vector(p1))
-                    coords.append(Vector((0,0,0)) + Vector(p1))
-                    line.rotate(Quaternion(axis,rotangle))
-                    coords.append(line.copy() + Vector(p1))
-
-                bgl.glEnable(bgl.GL_POLYGON_SMOOTH)
-                triShader.bind()
-                triShader.uniform_float("finalColor", (rgb[0], rgb[1], rgb[2], rgb[3]))
-                triShader.uniform_float("offset", (0,0,0))
-
-                batch = batch_for_shader(triShader, 'TRIS', {"pos": coords})
-                batch.program_set(triShader)
-                batch.draw()
-                gpu.shader.unbind()
-                bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
+        # Set Gizmo Properties
+        annotation.gizLoc = p2
 
-            if scene.measureit_arch_gl_show_d:
-                for textField in annotation.textFields:
-                    textcard = textField['textcard']
-                    draw_text_3D(context,textField,annotationProps,myobj,textcard)                
+        # Draw
+        coords =[]
+
+        # Move end of line Back if arrow endcap
+        if endcap == 'T':
+            axis = p1 - p2
+            lineEnd = p1 - axis * 0.02 * lineWeight
+        else: lineEnd = p1
+
+        coords.append(lineEnd)
+        coords.append(p2)
+        coords.append(p2)
+
+        if annotation.textPosition == 'T':
+            coords.append(Vector(textcards[0][3]))
+            pointcoords = [p2]
+        elif annotation.textPosition == 'B':
+            coords.append(Vector(textcards[0][2]))
+            pointcoords = [p2]
+
+        draw_lines(coords, rgb, lineWeight, viewport)
+
+        # Again This is Super Lazy, gotta write up a shader that handles
+        # Mitered thick lines, but for now this works.
+        if annotation.textPosition == 'T' or annotation.textPosition == 'B':
+            draw_points(pointcoords, rgb, lineWeight, viewport)
+
+        # Draw Line Endcaps
+        if endcap == 'D':
+            pointcoords = [p1]
+            draw_points(pointcoords, rgb, endcapSize, viewport, -0.01)
+
+        # Arrowheads are drawn together per style below
+        if endcap == 'T':
+            coneKey = (rgb, annotationProps.inFront, annotationProps.endcapArrowAngle, endcapSize)
+            coneTips.setdefault(coneKey, []).append((tuple(p1), tuple(p1 - p2)))
 
-    bgl.glDisable(bgl.GL_DEPTH_TEST)
-    bgl.glDepthMask(True)
+        if scene.measureit_arch_gl_show_d:
+            for textField, textcard in zip(annotation.textFields, textcards):
+                draw_text_3D(context,textField,annotationProps,myobj,list(textcard),get_card_anchor(annotationProps))
+
+    coneTris = {}
+    for (rgb, inFront, arrowAngle, endcapSize), tips in coneTips.items():
+        tips = np.array(tips, dtype=np.float64)
+        coords = place_cones(arrowAngle - radians(5), endcapSize, tips[:, 0], tips[:, 1])
+        coneTris.setdefault((rgb, inFront), []).append(coords)
+
+    for (rgb, inFront), coords in coneTris.items():
+        if layoutCapture is None:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            if inFront:
+                bgl.glDisable(bgl.GL_DEPTH_TEST)
+        draw_tris(np.concatenate(coords).astype(np.float32), rgb, 0)
+
+    if layoutCapture is None:
+        bgl.glDisable(bgl.GL_DEPTH_TEST)
+        bgl.glDepthMask(True)
 
 def draw_arc(basis,init_angle,current_angle):
     i = Vector((1,0,0))
@@ -2003,13 +2381,20 @@ def draw_arc(basis,init_angle,current_angle):
     gpu.shader.unbind()
     bgl.glDisable(bgl.GL_POLYGON_SMOOTH)
 
-def draw_text_3D(context,textobj,textprops,myobj,card):
+def draw_text_3D(context,textobj,textprops,myobj,card,anchor=(0.5, 0.0)):
     #get props
     sceneProps = context.scene.MeasureItArchProps
     card[0] = Vector(card[0])
     card[1] = Vector(card[1])
     card[2] = Vector(card[2])
     card[3] = Vector(card[3])
+
+    # Exports place the text themselves, only the card is needed
+    if layoutCapture is not None:
+        rawRGB = textprops.color
+        rgb = (pow(rawRGB[0], (1/2.2)), pow(rawRGB[1], (1/2.2)), pow(rawRGB[2], (1/2.2)), rawRGB[3])
+        capture_text(textobj, textprops, card, rgb)
+        return
     normalizedDeviceUVs= [(-1,-1),(-1,1),(1,1),(1,-1)]
 
     #i,j,k Basis Vectors
@@ -2119,198 +2504,182 @@ def draw_text_3D(context,textobj,textprops,myobj,card):
         uv = (Vector(normUV) + Vector((1,1)))*0.5
         uvs.append(uv)
 
-    # Batch Geometry
-    batch = batch_for_shader(
-        textShader, 'TRI_FAN',
-        {
-            "pos": card,
-            "uv": uvs,
-        },
-    )
-
-    # Gets Texture from Object
-    width = textobj.textWidth
-    height = textobj.textHeight 
-    dim = width * height * 4
-
-    if 'texture' in textobj and textobj.text != "":
-        # np.asarray takes advantage of the buffer protocol and solves the bottleneck here!!!
-        buffer = bgl.Buffer(bgl.GL_BYTE, dim, np.asarray(textobj['texture'], dtype=np.uint8))
-        bgl.glTexImage2D(bgl.GL_TEXTURE_2D, 0, bgl.GL_RGBA, width, height, 0, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, buffer)
-        bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MIN_FILTER, bgl.GL_LINEAR)
-        textobj.texture_updated=False
-     
-    # Draw Shader
-    textShader.bind()
-    textShader.uniform_float("image", 0)
-    batch.draw(textShader)
-    #bgl.glDeleteTextures(1, texBuf)
-    gpu.shader.unbind()
+    #undo blenders Default Gamma Correction
+    rawRGB = textprops.color
+    rgb = (pow(rawRGB[0], (1/2.2)), pow(rawRGB[1], (1/2.2)), pow(rawRGB[2], (1/2.2)), rawRGB[3])
 
-def generate_end_caps(context,item,capType,capSize,pos,userOffsetVector,midpoint,posflag,flipCaps):
-    capCoords = []
-    filledCoords = []
-    size = capSize/100
-    distVector = Vector(pos-Vector(midpoint)).normalized()
-    norm = distVector.cross(userOffsetVector).normalized()
-    line = distVector*size
-    arrowAngle = item.endcapArrowAngle
-
-    if flipCaps:
-        arrowAngle += radians(180)
-    
-    if capType == 99:
-        pass
-    
-    #Line and Triangle Geometry
-    elif capType == 'L' or capType == 'T' :
-        rotangle = arrowAngle
-        line.rotate(Quaternion(norm,rotangle))
-        p1 = (pos - line)
-        p2 = (pos)
-        line.rotate(Quaternion(norm,-(rotangle*2)))
-        p3 = (pos - line)
-        
-        if capType == 'T':
-            filledCoords.append(p1)
-            filledCoords.append(p2)
-            filledCoords.append(p3)
-
-        if capType == 'L':
-            capCoords.append(p1)
-            capCoords.append(p2)
-            capCoords.append(p3)
-            capCoords.append(p2)
+    # Labels whose text changed while rendering are drawn once they're
+    # rasterized again, see render_main()
+    if sceneProps.is_render_draw and textobj.text_updated and textobj.text != "":
+        defer_text(textobj, textprops.inFront, card, uvs, rgb, anchor)
+        return
 
-    #Dashed Endcap Geometry
+    # Queue the card, labels are drawn per atlas page by draw_text_queue()
+    if 'textureMask' in textobj and textobj.text != "":
+        queue_text(textobj, textprops.inFront, card, uvs, rgb)
+
+# ----------------------------------------------------
+# End caps, unit size templates per cap type and arrow angle
+# placed for many caps at once with NumPy. Template points are
+# 2D, x runs along the dimension line away from its middle and
+# y across it in the dimension's plane
+# ----------------------------------------------------
+endCapTemplates = {}
+
+# Architectural tick, in units of the line direction and offset vector
+tickSquare = np.array(((0.055, 0.085), (0.085, 0.055), (-0.055, -0.085), (-0.085, -0.055)))
+
+# Segments of the annotation arrowhead cone
+coneSegments = 12
+
+def get_end_cap_template(capType, arrowAngle):
+    # Returns (line points, triangle points) of a cap with size 1
+    key = (capType, round(arrowAngle, 6))
+    template = endCapTemplates.get(key)
+    if template is not None:
+        return template
+
+    lines = np.empty((0, 2))
+    tris = np.empty((0, 2))
+    if capType == 'L' or capType == 'T':
+        c = cos(arrowAngle)
+        s = sin(arrowAngle)
+        arrow = np.array(((-c, -s), (0, 0), (-c, s)))
+        if capType == 'T':
+            tris = arrow
+        else:
+            lines = arrow[[0, 1, 2, 1]]
     elif capType == 'D':
-        rotangle = radians(-90)
-        line = userOffsetVector.copy()
-        line *= 1/20
-        line.rotate(Quaternion(norm,rotangle))
-        p1 = (pos - line)
-        p2 = (pos + line)
-
-        # Define Overextension
-        capCoords.append(pos)
-        capCoords.append(line + pos)  
-
-        # Define Square
-        x = distVector.normalized() * capSize/20
-        y = userOffsetVector.normalized() * capSize/20
-        a = 0.055
-        b = 0.085
-       
-        s1 = (a*x) + (b*y)
-        s2 = (b*x) + (a*y)
-        s3 = (-a*x) + (-b*y)
-        s4 = (-b*x) + (-a*y)
-
-        square = (s1,s2,s3,s4)
-
-        for s in square:
-            if posflag < 1:
-                s.rotate(Quaternion(norm,rotangle))
-            s += pos
-
-        filledCoords.append(square[0])
-        filledCoords.append(square[1])
-        filledCoords.append(square[2])
-        filledCoords.append(square[0])
-        filledCoords.append(square[2])
-        filledCoords.append(square[3]) 
-    
-    return capCoords, filledCoords
-
-def generate_text_card(context,textobj,textProps,rotation,basePoint): 
-    width = textobj.textWidth
-    height = textobj.textHeight
-    resolution = textProps.textResolution
-    size = textProps.fontSize/fontSizeMult
-    #Define annotation Card Geometry
-    square = [(-0.5, 0.0, 0.0),(-0.5, 1.0, 0.0),(0.5, 1.0, 0.0),(0.5, 0.0, 0.0)]
-
-    #pick approprate card based on alignment
-    if textProps.textAlignment == 'R':
-        aOff = (0.5,0.0,0.0)
-    elif textProps.textAlignment == 'L':
-        aOff = (-0.5,0.0,0.0)
+        # Overextension along the offset vector and the tick square,
+        # both are placed relative to the offset vector
+        lines = np.array(((0, 0), (0, 1 / 20)))
+        tris = tickSquare[[0, 1, 2, 0, 2, 3]]
+    elif capType == 'CONE':
+        # Annotation arrowhead, 3D with z along the annotation line
+        angles = np.arange(coneSegments + 1) * (2 * pi / coneSegments)
+        rim = np.stack((np.cos(angles) * sin(arrowAngle), np.sin(angles) * sin(arrowAngle),
+                        np.full(len(angles), -cos(arrowAngle))), axis=1)
+        tris = np.stack((rim[:-1], np.zeros((coneSegments, 3)), rim[1:]), axis=1).reshape(-1, 3)
+
+    template = endCapTemplates[key] = (lines, tris)
+    return template
+
+def place_end_caps(capType, arrowAngle, capSize, positions, midpoints, userOffsetVectors, posFlags, flipCaps):
+    # Places one cap of capType at each of the (n, 3) positions.
+    # Returns (line coords, triangle coords) as (m, 3) arrays
+    count = len(positions)
+    if count == 0:
+        return np.empty((0, 3)), np.empty((0, 3))
+
+    dirs = normalize_rows(positions - midpoints)
+    norms = normalize_rows(np.cross(dirs, userOffsetVectors))
+    perps = np.cross(norms, dirs)
+
+    if capType == 'D':
+        # Offset vectors in the cap plane, the tick is turned a quarter
+        # turn clockwise on the first cap only
+        offsets2D = np.stack((np.einsum('ij,ij->i', userOffsetVectors, dirs),
+                              np.einsum('ij,ij->i', userOffsetVectors, perps)), axis=1)
+        lines, tris = get_end_cap_template(capType, 0)
+        lineCoords = lines[None, :, 1:2] * np.stack((offsets2D[:, 1], -offsets2D[:, 0]), axis=1)[:, None]
+
+        unitOffsets = normalize_rows(offsets2D)
+        tickX = tris[None, :, 0:1] * np.array((1.0, 0.0)) + tris[None, :, 1:2] * unitOffsets[:, None]
+        tickX = tickX * (capSize / 20)
+        turned = np.stack((tickX[..., 1], -tickX[..., 0]), axis=-1)
+        triCoords = np.where((np.asarray(posFlags) < 1)[:, None, None], turned, tickX)
     else:
-        aOff = (0.0,0.0,0.0)
-
-    if textProps.textPosition == 'M':
-        pOff = (0.0,0.5,0.0)
-    elif textProps.textPosition == 'B':
-        pOff = (0.0,1.0,0.0)
-    else:
-        pOff = (0.0,0.0,0.0)
-
-    #Define Transformation Matricies
-
-    #x Rotation
-    rx = rotation[0]
-    rotateXMatrix = Matrix([
-        [1,   0,      0,     0],
-        [0,cos(rx) ,sin(rx), 0],
-        [0,-sin(rx),cos(rx), 0],
-        [0,   0,      0,     1]
-    ])
-
-    #y Rotation
-    ry = rotation[1]
-    rotateYMatrix = Matrix([
-        [cos(ry),0,-sin(ry),0],
-        [  0,    1,   0,    0],
-        [sin(ry),0,cos(ry), 0],
-        [  0,    0,   0,    1]
-    ])
-
-    #z Rotation
-    rz = rotation[2]
-    rotateZMatrix = Matrix([
-        [cos(rz) ,sin(rz),0,0],
-        [-sin(rz),cos(rz),0,0],
-        [   0    ,   0   ,1,0],
-        [   0    ,   0   ,0,1]
-    ])
+        lines, tris = get_end_cap_template(capType, arrowAngle)
+        lineCoords = np.empty((count, len(lines), 2))
+        triCoords = np.empty((count, len(tris), 2))
+        flipCaps = np.asarray(flipCaps, dtype=bool)
+        for flip in (False, True):
+            # Flipped caps point back towards the dimension
+            mask = flipCaps == flip
+            lines, tris = get_end_cap_template(capType, arrowAngle + (pi if flip else 0))
+            lineCoords[mask] = lines * (capSize / 100)
+            triCoords[mask] = tris * (capSize / 100)
+
+    return cap_to_world(lineCoords, positions, dirs, perps), cap_to_world(triCoords, positions, dirs, perps)
+
+def cap_to_world(coords2D, positions, dirs, perps):
+    # (n, m, 2) cap plane coordinates to (n * m, 3) world coordinates
+    coords = positions[:, None] + coords2D[..., 0:1] * dirs[:, None] + coords2D[..., 1:2] * perps[:, None]
+    return coords.reshape(-1, 3)
+
+def place_cones(arrowAngle, capSize, tips, axes):
+    # Annotation arrowheads, a cone per tip pointing along its axis
+    lines, tris = get_end_cap_template('CONE', arrowAngle)
+    axes = normalize_rows(axes)
+    perps = normalize_rows(np.where(np.abs(axes[:, 0:1]) < 0.9, np.cross(axes, (1.0, 0.0, 0.0)),
+                                    np.cross(axes, (0.0, 1.0, 0.0))))
+    sides = np.cross(axes, perps)
+    size = capSize / 100
+    coords = (tips[:, None] + size * (tris[None, :, 0:1] * perps[:, None] + tris[None, :, 1:2] * sides[:, None]
+                                      + tris[None, :, 2:3] * axes[:, None]))
+    return coords.reshape(-1, 3)
 
-    #scale
-    sx = (width/resolution)*0.1*size
-    sy = (height/resolution)*0.1*size
-    scaleMatrix = Matrix([
-        [sx,0 ,0,0],
-        [0 ,sy,0,0],
-        [0 ,0 ,1,0],
-        [0 ,0 ,0,1]
-    ])
-
-    #Transform
-    tx = basePoint[0]
-    ty = basePoint[1]
-    tz = basePoint[2]
-    translateMatrix = Matrix([
-        [1,0,0,tx],
-        [0,1,0,ty],
-        [0,0,1,tz],
-        [0,0,0, 1]
-    ])
-
-    # Transform Card By Transformation Matricies (Scale -> XYZ Euler Rotation -> Translate)
-    xyzEulerRotMatrix = rotateXMatrix @ rotateYMatrix @ rotateZMatrix
-
-    coords = []
-    for coord in square:
-        coord= Vector(coord) - Vector(aOff)
-        coord= Vector(coord) - Vector(pOff)
-        coord = scaleMatrix@Vector(coord)
-        coord = rotateXMatrix@Vector(coord)
-        coord = rotateYMatrix@Vector(coord)
-        coord = rotateZMatrix@Vector(coord)
-        coord = translateMatrix@Vector(coord)
-        coords.append(coord)
+def generate_end_caps(context,item,capType,capSize,pos,userOffsetVector,midpoint,posflag,flipCaps):
+    # Single cap, see place_end_caps()
+    lineCoords, triCoords = place_end_caps(capType, item.endcapArrowAngle, capSize,
+                                           np.array((tuple(pos),)), np.array((tuple(midpoint),)),
+                                           np.array((tuple(userOffsetVector),)), (posflag,), (flipCaps,))
+    return [Vector(co) for co in lineCoords], [Vector(co) for co in triCoords]
+
+# ----------------------------------------------------
+# Text cards, the corners of a card at the origin only change
+# with its rotation, size, alignment and label texture, so they
+# are computed once per combination and reused every frame
+# ----------------------------------------------------
+textCards = {}
+textCardsLimit = 8192
+
+# Card corners before alignment, see draw_text_3D() for their order
+unitCard = np.array(((-0.5, 0.0, 0.0), (-0.5, 1.0, 0.0), (0.5, 1.0, 0.0), (0.5, 0.0, 0.0)))
+
+def get_text_card(rotation, size, alignment, position):
+    # size is the card's (width, height) in scene units
+    key = (tuple(rotation), size, alignment, position)
+    card = textCards.get(key)
+    if card is not None:
+        return card
 
-    
-    return (coords)
+    #pick approprate card based on alignment
+    offset = np.zeros(3)
+    if alignment == 'R':
+        offset[0] = 0.5
+    elif alignment == 'L':
+        offset[0] = -0.5
+    if position == 'M':
+        offset[1] = 0.5
+    elif position == 'B':
+        offset[1] = 1.0
+
+    # Scale, then rotate around X, Y and Z in that order
+    rx, ry, rz = rotation
+    rotateX = np.array(((1, 0, 0), (0, cos(rx), sin(rx)), (0, -sin(rx), cos(rx))))
+    rotateY = np.array(((cos(ry), 0, -sin(ry)), (0, 1, 0), (sin(ry), 0, cos(ry))))
+    rotateZ = np.array(((cos(rz), sin(rz), 0), (-sin(rz), cos(rz), 0), (0, 0, 1)))
+    card = ((unitCard - offset) * (size[0], size[1], 1)) @ (rotateZ @ rotateY @ rotateX).T
+
+    if len(textCards) >= textCardsLimit:
+        textCards.clear()
+    card.flags.writeable = False
+    textCards[key] = card
+    return card
+
+def get_card_anchor(textProps):
+    # Fraction of the card at the base point, see get_text_card()
+    anchorX = {'L': 0.0, 'C': 0.5, 'R': 1.0}.get(textProps.textAlignment, 0.5)
+    anchorY = {'T': 0.0, 'M': 0.5, 'B': 1.0}.get(textProps.textPosition, 0.0)
+    return (anchorX, anchorY)
+
+def generate_text_card(context,textobj,textProps,rotation,basePoint):
+    # (4, 3) array of the card corners of textobj placed at basePoint
+    scale = 0.1 * (textProps.fontSize/fontSizeMult) / textProps.textResolution
+    size = (textobj.textWidth * scale, textobj.textHeight * scale)
+    card = get_text_card(rotation, size, textProps.textAlignment, textProps.textPosition)
+    return card + np.array(basePoint)
 
 def sortPoints (p1, p2):
     tempDirVec = Vector(p1)-Vector(p2)
@@ -2626,113 +2995,9 @@ def get_arc_data(pointa, pointb, pointc, pointd):
 #
 # -------------------------------------------------------------
 def format_distance(fmt, value, factor=1):
-    s_code = "\u00b2"  # Superscript two THIS IS LEGACY (but being kept for when Area Measurements are re-implimented)
-    hide_units = bpy.context.scene.measureit_arch_hide_units # Also Legacy, Could be re-implimented... Requested now, should re-impliment
-
-    # Get Scene Unit Settings
-    scaleFactor = bpy.context.scene.unit_settings.scale_length
-    unit_system = bpy.context.scene.unit_settings.system
-    unit_length = bpy.context.scene.unit_settings.length_unit
-    seperate_units = bpy.context.scene.unit_settings.use_separate
-
-    toInches = 39.3700787401574887
-    value *= scaleFactor
-
-    # Imperial Formating
-    if unit_system == "IMPERIAL":
-        base = int(bpy.context.scene.measureit_arch_imperial_precision)
-        decInches = value * toInches
-
-        if hide_units is False:
-            fmt += "\""
-        
-        # Seperate ft and inches
-        # Unless Inches are the specified Length Unit
-        if unit_length != 'INCHES':
-            feet = floor(decInches/12)
-            decInches -= feet*12
-        else:
-            feet = 0
-        
-        #Seperate Fractional Inches
-        inches = floor(decInches)
-        if inches != 0:
-            frac = round(base*(decInches-inches))
-        else:
-            frac = round(base*(decInches))
-        
-        #Set proper numerator and denominator
-        if frac != base:
-            numcycles = int(math.log2(base))
-            for i in range(numcycles):
-                if frac%2 == 0:
-                    frac = int(frac/2)
-                    base = int(base/2)
-                else:
-                    break
-        else:
-            frac = 0
-            inches += 1
-
-        # Check values and compose string
-        if feet != 0:
-            feetString = str(feet) + "' "
-        else: feetString = ""
-
-        if inches !=0:
-            inchesString = str(inches)
-            if frac != 0: inchesString += "-"
-            else: inchesString += "\""
-        else: inchesString = ""
-
-        if frac != 0:
-            fracString = str(frac) + "/" + str(base) +"\""
-        else: fracString = ""
-
-        tx_dist = feetString + inchesString + fracString
-    
-
-    # METRIC FORMATING
-    elif unit_system == "METRIC":
-
-        # Meters
-        if unit_length == 'METERS':
-            if hide_units is False:
-                fmt += " m"
-                tx_dist = fmt % value
-        # Centimeters
-        elif unit_length == 'CENTIMETERS':
-            if hide_units is False:
-                fmt += " cm"
-                d_cm = value * (100)
-                tx_dist = fmt % d_cm
-        #Millimeters
-        elif unit_length == 'MILLIMETERS':
-            if hide_units is False:
-                fmt += " mm"
-                d_mm = value * (1000)
-                tx_dist = fmt % d_mm
-
-        # Otherwise Use Adaptive Units
-        else:
-            if round(value, 2) >= 1.0:
-                if hide_units is False:
-                    fmt += " m"
-                tx_dist = fmt % value
-            else:
-                if round(value, 2) >= 0.01:
-                    if hide_units is False:
-                        fmt += " cm"
-                    d_cm = value * (100)
-                    tx_dist = fmt % d_cm
-                else:
-                    if hide_units is False:
-                        fmt += " mm"
-                    d_mm = value * (1000)
-                    tx_dist = fmt % d_mm
-    else:
-        tx_dist = fmt % value
-    return tx_dist
+    # See measureit_arch_units.py, formatters are rebuilt when the
+    # scene's unit settings change
+    return get_formatter(bpy.context.scene, fmt).format(value)
 
 
 # -------------------------------------------------------------
@@ -2809,32 +3074,17 @@ def draw_text(myobj, pos2d, display_text, rgb, fsize, align='L', text_rot=0.0):
 # mainobject
 # --------------------------------------------------------------------
 def get_mesh_vertices(myobj):
-    sceneProps = bpy.context.scene.MeasureItArchProps
     try:
-        obverts = []
-        verts=[]
-        if myobj.type == 'MESH':
-            if myobj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(myobj.data)
-                verts = bm.verts
-            else:
-                eval_res = sceneProps.eval_mods
-                if eval_res or check_mods(myobj):
-                    deps = bpy.context.view_layer.depsgraph
-                    obj_eval = myobj.evaluated_get(deps)
-                    mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
-                    verts = mesh.vertices
-                else:
-                    verts = myobj.data.vertices
-
-            # We're going through every Vertex in the object here
-            # probably excessive, should figure out a better way to
-            # link dims to verts...
-
-            obverts = [vert.co for vert in verts]
-            
-            return obverts
-        else: return None 
+        verts = get_frame_verts(myobj, False)
+        if verts is None:
+            return None
+
+        # We're going through every Vertex in the object here
+        # probably excessive, should figure out a better way to
+        # link dims to verts...
+        if isinstance(verts, np.ndarray):
+            return [Vector(co) for co in verts]
+        return [vert.co for vert in verts]
     except AttributeError:
         return None
 
@@ -2845,30 +3095,92 @@ def get_line_vertex(idx,verts,mat):
     return vert
 
 
+# Read all vertex coordinates into a (n, 3) float32 array
+# Mesh vertices are read in one call, BMesh verts have no foreach_get
+def get_vertex_coords(verts):
+    if isinstance(verts, bmesh.types.BMVertSeq):
+        coords = np.array([vert.co for vert in verts], dtype=np.float32)
+        return coords.reshape(-1, 3)
+    coords = np.empty(len(verts) * 3, dtype=np.float32)
+    verts.foreach_get('co', coords)
+    return coords.reshape(-1, 3)
+
+
+# Gather the endpoints of a lineBuffer from a vertex coordinate array
+# Pairs pointing past the end of the mesh (deleted verts) are skipped
+def get_line_coords(lineBuffer, vertCoords):
+    indices = np.asarray(lineBuffer, dtype=np.int64)
+    pairs = indices[:len(indices) // 2 * 2].reshape(-1, 2)
+    pairs = pairs[(pairs < len(vertCoords)).all(axis=1)]
+    return vertCoords[pairs.ravel()]
+
+
 def get_mesh_vertex(myobj,idx,evalMods):
-    sceneProps = bpy.context.scene.MeasureItArchProps
     try:
-        verts=[]
-        if myobj.type == 'MESH':
-            if myobj.mode == 'EDIT':
-                bm = bmesh.from_edit_mesh(myobj.data)
-                verts = bm.verts
-            else:     
-                eval_res = sceneProps.eval_mods
-                if (eval_res or evalMods) and check_mods(myobj):
-                    deps = bpy.context.view_layer.depsgraph
-                    obj_eval = myobj.evaluated_get(deps)
-                    mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
-                    verts = mesh.vertices          
-                else:
-                    verts = myobj.data.vertices
-            if idx < len(verts):
-                return verts[idx].co
-            else: return None
-        else: return None 
+        verts = get_frame_verts(myobj, evalMods)
+        if verts is not None and idx < len(verts):
+            if isinstance(verts, np.ndarray):
+                return Vector(verts[idx])
+            return verts[idx].co
+        else: return None
     except AttributeError:
         return None
 
+
+# --------------------------------------------------------------------
+# Per frame vertex cache
+# Each object's mesh is read (and its modifiers evaluated) at most once
+# per redraw and shared by all of its dimensions, annotations and lines.
+# Evaluated meshes are copied into an array and freed right away, the
+# cache itself is emptied by clear_frame_cache() when the frame ends.
+# Outside of a draw pass, between begin_frame_cache() and
+# clear_frame_cache(), nothing is cached, edit bmeshes and meshes can
+# change between redraws.
+# --------------------------------------------------------------------
+def get_frame_key(myobj, evalMods):
+    if myobj.mode == 'EDIT':
+        return (myobj.name, 'EDIT')
+    useEval = (bpy.context.scene.MeasureItArchProps.eval_mods or evalMods) and check_mods(myobj)
+    return (myobj.name, useEval)
+
+def get_frame_verts(myobj, evalMods):
+    if myobj.type != 'MESH':
+        return None
+
+    key = get_frame_key(myobj, evalMods)
+    if not frameState['active']:
+        frameVerts.pop(key, None)
+    if key not in frameVerts:
+        if myobj.mode == 'EDIT':
+            bm = bmesh.from_edit_mesh(myobj.data)
+            bm.verts.ensure_lookup_table()
+            frameVerts[key] = bm.verts
+        elif key[1]:
+            deps = bpy.context.view_layer.depsgraph
+            obj_eval = myobj.evaluated_get(deps)
+            mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
+            frameVerts[key] = get_vertex_coords(mesh.vertices)
+            # Line attributes are carried through the modifiers
+            if hasattr(mesh, 'attributes'):
+                frameLineEdges[key] = {name: read_line_attribute(mesh, name)
+                                       for name in mesh.attributes.keys() if name.startswith(lineAttributePrefix)}
+            obj_eval.to_mesh_clear()
+        else:
+            frameVerts[key] = get_vertex_coords(myobj.data.vertices)
+    if not frameState['active']:
+        return frameVerts.pop(key)
+    return frameVerts[key]
+
+def begin_frame_cache():
+    frameVerts.clear()
+    frameLineEdges.clear()
+    frameState['active'] = True
+
+def clear_frame_cache():
+    frameVerts.clear()
+    frameLineEdges.clear()
+    frameState['active'] = False
+
 def check_mods(myobj):
     goodMods = ["DATA_TRANSFER ", "NORMAL_EDIT", "WEIGHTED_NORMAL",
                 'UV_PROJECT', 'UV_WARP', 'ARRAY', 
@@ -2888,7 +3200,6 @@ def check_mods(myobj):
     return True
 
 def printTime(start,end,post):
-    totalTime= (end-start)*1000
-    mystring = '{:.2f}'.format(totalTime) +' ms'
-    mystring += post
-    print(mystring)
\ No newline at end of file
+    # Records a span inside a profiled function as its own timer
+    if profilerState['enabled']:
+        add_time(post, end - start)
\ No newline at end of file
@@ -32,6 +32,7 @@ from bpy.types import (
     Gizmo,
     Scene
 )
+from .measureit_arch_baseclass import get_style
 
 class mArchGizmoGroup(GizmoGroup):
     bl_idname = "OBJECT_GG_mArch"
@@ -80,11 +81,7 @@ bpy.utils.register_class(mArchGizmoGroup)
 
 def createDimOffsetGiz(group,dim,objIndex):
     context = bpy.context
-    dimProps = dim
-    if dim.uses_style:
-        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-            if alignedDimStyle.name == dim.style:
-                dimProps = alignedDimStyle
+    dimProps = get_style(context.scene, 'alignedDimensions', dim)
 
 
     #Set Matrix
@@ -34,9 +34,12 @@ from bpy.types import PropertyGroup, Panel, Object, Operator, SpaceView3D, UILis
 from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, BoolProperty, StringProperty, \
                       FloatProperty, EnumProperty, PointerProperty
 from bpy.app.handlers import persistent
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from .measureit_arch_geometry import *
 from .measureit_arch_render import *
-from .measureit_arch_main import get_smart_selected, get_selected_vertex
+from .measureit_arch_main import get_selection_lists
 from .measureit_arch_baseclass import BaseProp
 
 class LineProperties(BaseProp, PropertyGroup):
@@ -91,6 +94,14 @@ class LineProperties(BaseProp, PropertyGroup):
                                     default=0.0)
     randomSeed: IntProperty() 
 
+    lineAttribute: StringProperty(name="Line Attribute",
+                        description="Mesh edge attribute holding the edges of this Line Group",
+                        default='')
+
+    groupId: IntProperty(name="Line Group ID",
+                        description="Unique ID of this Line Group within its object, keys its cached geometry",
+                        default=0)
+
 bpy.utils.register_class(LineProperties)
 
 class LineContainer(PropertyGroup):
@@ -101,6 +112,9 @@ class LineContainer(PropertyGroup):
 
     show_line_settings: BoolProperty(name='Show Line Settings', default=False)
 
+    last_group_id: IntProperty(name='Last Line Group ID', default=0,
+                                description='Last ID given to a line group')
+
     # Array of segments
     line_groups: CollectionProperty(type=LineProperties)
 
@@ -138,9 +152,10 @@ class AddLineButton(Operator):
             # Add properties
             scene = context.scene
             mainobject = context.object
-            mylist = get_smart_selected(mainobject)
+            selection = get_selection_lists((mainobject,))[mainobject.name]
+            mylist = selection['smart']
             if len(mylist) < 2:  # if not selected linked vertex
-                mylist = get_selected_vertex(mainobject)
+                mylist = selection['verts']
 
             if len(mylist) >= 2:
                 if 'LineGenerator' not in mainobject:
@@ -159,9 +174,11 @@ class AddLineButton(Operator):
                 lGroup.lineWeight = 1     
                 lGroup.lineColor = scene.measureit_arch_default_color
                 lGroup.name = 'Line ' + str(len(lineGen.line_groups))
+                lGroup.groupId = new_line_group_id(lineGen)
                 
 
-                lGroup['lineBuffer'] = mylist
+                invalidate_line_group(mainobject, lGroup)
+                add_line_group_pairs(mainobject, lGroup, mylist)
                 lineGen.line_num += 1
 
 
@@ -349,33 +366,25 @@ class AddToLineGroup(Operator):
     # Execute button action
     # ------------------------------
     def execute(self, context):
+         # get selected, the meshes are read once for all areas
+         mainobject = context.object
+         selection = get_selection_lists((mainobject,))[mainobject.name]
          for window in bpy.context.window_manager.windows:
             screen = window.screen
 
             for area in screen.areas:
                 if area.type == 'VIEW_3D':
-                    # get selected
-
-                    mainobject = context.object
-                    mylist = get_smart_selected(mainobject)
+                    mylist = selection['smart']
                     if len(mylist) < 2:  # if not selected linked vertex
-                        mylist = get_selected_vertex(mainobject)
+                        mylist = selection['verts']
 
                     if len(mylist) >= 2:
 
                         lineGen = mainobject.LineGenerator[0]
                         lGroup = lineGen.line_groups[self.tag]
-                        
-                        bufferList = lGroup['lineBuffer'].to_list()
-                        for x in range (0, len(mylist)-1, 2):
-                            #if lineExists(lGroup,mylist[x],mylist[x+1]) is False:
-                            bufferList.append(mylist[x])
-                            bufferList.append(mylist[x+1])
-                            lGroup.numLines +=1
-                    
+                        add_line_group_pairs(mainobject, lGroup, mylist)
 
                         # redraw
-                        lGroup['lineBuffer'] = bufferList
                         context.area.tag_redraw()
                         return {'FINISHED'}
 
@@ -408,89 +417,125 @@ class AddLineByProperty(Operator):
                 return False
 
 
+    _timer = None
+    executor = None
+
+    # Seconds spent reading meshes and writing line groups per
+    # timer tick before handing control back to Blender
+    tickBudget = 0.2
+
     # ------------------------------
     # Execute button action
     # ------------------------------
     def execute(self, context):
-         for window in bpy.context.window_manager.windows:
-            screen = window.screen
-            scene = context.scene
-            for area in screen.areas:
-                if area.type == 'VIEW_3D':
-                    # get selected
-                    selObjects = context.view_layer.objects.selected
-                    start = time.time()
-                    for obj in selObjects:
-                        
-                        if 'LineGenerator' not in obj:
-                            obj.LineGenerator.add()
+        objects = [obj for obj in context.view_layer.objects.selected if obj.type == 'MESH']
+        if len(objects) == 0:
+            self.report({'ERROR'}, "MeasureIt-ARCH: No mesh objects selected")
+            return {'CANCELLED'}
+
+        # Without a window (scripts, background) there's no modal, run it all now
+        if context.window is None:
+            for obj in objects:
+                index, creaseEdges = find_crease_edges(get_crease_arrays(obj, self.use_approximate),
+                                                       obj.data.auto_smooth_angle, self.use_approximate)
+                set_edge_face_index(obj, index, get_geometry_revision(obj))
+                add_crease_group(context, obj, creaseEdges)
+            return {'FINISHED'}
+
+        # Meshes are read on the main thread, creases are found by the
+        # pool and written back as they finish. Other events are blocked
+        # while it runs so meshes can't be edited under the workers
+        self.pending = [obj.name for obj in objects]
+        self.total = len(objects)
+        self.done = 0
+        self.futures = {}
+        self.workers = os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.startTime = time.time()
 
-                        lineGen = obj.LineGenerator[0]
-                        lGroup = lineGen.line_groups.add()
-                        
-                        # Set values
-                        lGroup.itemType = 'L'
-                        lGroup.style = scene.measureit_arch_default_line_style
-                        if scene.measureit_arch_default_line_style is not '':
-                            lGroup.uses_style = True
-                        else:
-                            lGroup.uses_style = False
-                        lGroup.lineWeight = 1     
-                        lGroup.lineColor = scene.measureit_arch_default_color
-                        lGroup.name = 'Line ' + str(len(lineGen.line_groups))
-                        angle = obj.data.auto_smooth_angle
-                        vertsToAdd=[]
-                        
-                        # faster method, uses the dot product of the face normal with the averaged normal of the two edges
-                        if self.use_approximate:
-                            for face in obj.data.polygons:
-                                lastVert = None
-                                keys = face.edge_keys
-                                faceNormal = Vector(face.normal)
-                                for key in keys:
-                                    pointA = obj.data.vertices[key[0]]
-                                    pointB = obj.data.vertices[key[1]]
-                                    aNorm = pointA.normal
-                                    bNorm = pointB.normal
-                                    edgeNormal = Vector(aNorm + bNorm).normalized()
-                                    edgeDir = pointB.co - pointA.co
-                                    dotProd = faceNormal.dot(edgeNormal)
-                                    if dotProd >= -1 and dotProd <= 1:
-                                        creaseAngle = math.acos(dotProd)
-                                        if creaseAngle > angle:
-                                            vertsToAdd.append(key[0])
-                                            vertsToAdd.append(key[1])
-                        
+        wm = context.window_manager
+        wm.progress_begin(0, self.total)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.finish(context)
+            self.report({'WARNING'}, "MeasureIt-ARCH: Crease lines cancelled, %d of %d objects done" % (self.done, self.total))
+            return {'CANCELLED'}
+
+        if event.type == 'TIMER':
+            tickStart = time.time()
+
+            # Write back finished objects
+            for name, (future, revision) in list(self.futures.items()):
+                if time.time() - tickStart > self.tickBudget:
+                    break
+                if future.done():
+                    del self.futures[name]
+                    obj = context.view_layer.objects.get(name)
+                    if obj is None:
+                        self.done += 1
+                        continue
+
+                    # Mesh changed since its arrays were read, read it again
+                    if get_geometry_revision(obj) != revision:
+                        self.pending.append(name)
+                        continue
+
+                    self.done += 1
+                    try:
+                        index, creaseEdges = future.result()
+                    except Exception as e:
+                        print("MeasureIt-ARCH: Unable to find creases on " + name + ", " + str(e))
+                        continue
+                    set_edge_face_index(obj, index, revision)
+                    add_crease_group(context, obj, creaseEdges)
+
+            # Queue more objects, keeping every worker busy
+            while (len(self.pending) != 0 and len(self.futures) < self.workers * 2
+                    and time.time() - tickStart < self.tickBudget):
+                name = self.pending.pop(0)
+                obj = context.view_layer.objects.get(name)
+                if obj is None:
+                    self.done += 1
+                    continue
+                arrays = get_crease_arrays(obj, self.use_approximate)
+                future = self.executor.submit(
+                    find_crease_edges, arrays, obj.data.auto_smooth_angle, self.use_approximate)
+                self.futures[name] = (future, get_geometry_revision(obj))
+
+            context.window_manager.progress_update(self.done)
+            context.workspace.status_text_set(
+                "MeasureIt-ARCH: Adding crease lines, %d of %d objects (ESC to cancel)" % (self.done, self.total))
+
+            # Timer events have no area, redraw every 3D view
+            for window in context.window_manager.windows:
+                for area in window.screen.areas:
+                    if area.type == 'VIEW_3D':
+                        area.tag_redraw()
+
+            if len(self.pending) == 0 and len(self.futures) == 0:
+                self.finish(context)
+                print("MeasureIt-ARCH: Added crease lines to %d objects in %.2f s" % (self.total, time.time() - self.startTime))
+                return {'FINISHED'}
+
+        return {'RUNNING_MODAL'}
 
-                        # More accurate Method, but requires face adjacency for each edge, super slow
-                        else:
-                            for edge in obj.data.edges:
-                                pointA = edge.vertices[0]
-                                pointB = edge.vertices[1]
-                                adjacentFaces =[]
-                                for face in obj.data.polygons:
-                                    if pointA in face.vertices and pointB in face.vertices:
-                                        adjacentFaces.append(face)
-                                if len(adjacentFaces) == 2:
-                                    normalA = Vector(adjacentFaces[0].normal)
-                                    normalB = Vector(adjacentFaces[1].normal)
-                                    dotProd = (normalA.dot(normalB))
-                                    #print (str(adjacentFaces[0].index) + ' dot(' + str(adjacentFaces[1].index) + ') = ' + str(dotProd))
-                                    if dotProd >= -1 and dotProd <= 1:
-                                        creaseAngle = math.acos(dotProd)
-                                        if creaseAngle > angle:
-                                            vertsToAdd.append(pointA)
-                                            vertsToAdd.append(pointB)
-                                else:
-                                    vertsToAdd.append(pointA)
-                                    vertsToAdd.append(pointB)
-                            
-
-                        lGroup['lineBuffer'] = vertsToAdd
-                        lineGen.line_num += 1
-                    end = time.time()
-                    #printTime(start,end,"")
-                    return {'FINISHED'}
+    def finish(self, context):
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        for future, revision in self.futures.values():
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        self.executor = None
+
+    def cancel(self, context):
+        # Blender ended the modal, a closed window or a file load
+        self.finish(context)
     
     def invoke(self, context, event):
         wm = context.window_manager
@@ -533,38 +578,26 @@ class RemoveFromLineGroup(Operator):
     # Execute button action
     # ------------------------------
     def execute(self, context):
+        # get selected, the meshes are read once for all areas
+        mainobject = context.object
+        selection = get_selection_lists((mainobject,))[mainobject.name]
         for window in bpy.context.window_manager.windows:
             screen = window.screen
 
             for area in screen.areas:
                 if area.type == 'VIEW_3D':
-                    # get selected
-
-                    mainobject = context.object
-                    mylist = get_smart_selected(mainobject)
+                    mylist = selection['smart']
 
                     if len(mylist) < 2:  # if not selected linked vertex
-                        mylist = get_selected_vertex(mainobject)
+                        mylist = selection['verts']
 
                     if len(mylist) >= 2:
 
                         lineGen = mainobject.LineGenerator[0]
                         lGroup = lineGen.line_groups[self.tag]
-                        idx = 0
-                        bufferList = lGroup['lineBuffer'].to_list()
-                        for x in range (0, len(lGroup['lineBuffer']), 2):
-                            pointA = lGroup['lineBuffer'][x]
-                            pointB = lGroup['lineBuffer'][x+1]
-                            for y in range (0, len(mylist), 2):
-                                if sLineExists(pointA,pointB,mylist[y],mylist[y+1]):
-                                    #print("checked Pair: (" + str(mylist[y]) +   "," + str(mylist[y+1]) + ")" )
-                                    #print("A:" + str(pointA) + "B:" + str(pointB) ) 
-                                    del bufferList[x] 
-                                    del bufferList[x] 
-                                    lGroup.numLines -= 1 
-
-                        # redraw      
-                        lGroup['lineBuffer'] = bufferList
+                        remove_line_group_pairs(mainobject, lGroup, mylist)
+
+                        # redraw
                         context.area.tag_redraw()
                         return {'FINISHED'}
 
@@ -598,6 +631,37 @@ class RemoveFromLineGroup(Operator):
 
 #         return {'FINISHED'}
 
+def get_crease_arrays(obj, approximate):
+    arrays = get_edge_face_arrays(obj.data)
+    if approximate:
+        arrays['vertNormals'] = get_vertex_normals(obj.data)
+    return arrays
+
+def add_crease_group(context, obj, creaseEdges):
+    scene = context.scene
+    if 'LineGenerator' not in obj:
+        obj.LineGenerator.add()
+
+    lineGen = obj.LineGenerator[0]
+    lGroup = lineGen.line_groups.add()
+
+    # Set values
+    lGroup.itemType = 'L'
+    lGroup.style = scene.measureit_arch_default_line_style
+    if scene.measureit_arch_default_line_style is not '':
+        lGroup.uses_style = True
+    else:
+        lGroup.uses_style = False
+    lGroup.lineWeight = 1
+    lGroup.lineColor = scene.measureit_arch_default_color
+    lGroup.name = 'Line ' + str(len(lineGen.line_groups))
+    lGroup.groupId = new_line_group_id(lineGen)
+
+    invalidate_line_group(obj, lGroup)
+    add_line_group_pairs(obj, lGroup, creaseEdges.ravel().tolist())
+    lineGen.line_num += 1
+    return lGroup
+
 def sLineExists(pointA,pointB,a,b):
     if (pointA == a and pointB == b):
         return True
@@ -606,12 +670,5 @@ def sLineExists(pointA,pointB,a,b):
     else:
         return False
 
-def lineExists(lGroup,a,b):
-    for x in range (0, len(lGroup['lineBuffer']), 2):
-        pointA = lGroup['lineBuffer'][x]
-        pointB = lGroup['lineBuffer'][x+1]
-        if (pointA == a and pointB == b):
-            return True
-        elif (pointA == b and pointB == a):
-            return True
-    return False
\ No newline at end of file
+def lineExists(myobj,lGroup,a,b):
+    return (min(a, b), max(a, b)) in get_line_group_keys(myobj, lGroup)
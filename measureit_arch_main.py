@@ -25,7 +25,6 @@
 # ----------------------------------------------------------
 import bpy
 import bmesh
-from bmesh import from_edit_mesh
 import bgl
 import gpu
 import time
@@ -36,7 +35,15 @@ from bpy.types import PropertyGroup, Panel, Object, Operator, SpaceView3D
 from bpy.props import IntProperty, CollectionProperty, FloatVectorProperty, BoolProperty, StringProperty, \
                       FloatProperty, EnumProperty
 from bpy.app.handlers import persistent
-from .measureit_arch_geometry import clear_batches, draw_annotation, draw_arcDimension, draw_alignedDimension, draw_line_group, draw_angleDimension, update_text, draw_axisDimension, draw_boundsDimension, get_mesh_vertices, printTime
+from .measureit_arch_baseclass import get_style, invalidate_style_index, invalidate_style_users, textQueue, \
+    textQueueState, textSources, scan_text_items, resolve_text_item, request_text_scan
+from .measureit_arch_text import draw_text_queue
+from .measureit_arch_visibility import clear_visibility_cache
+from .measureit_arch_profiling import profile, set_profiling
+from .measureit_arch_units import subscribe_unit_settings
+from .measureit_arch_selection import get_selection, get_select_history, get_edit_selection
+from .measureit_arch_selection import get_selected_faces as get_selected_face_verts
+from .measureit_arch_geometry import clear_batches, clear_object_batches, begin_frame_cache, clear_frame_cache, tag_geometry_update, draw_annotation, draw_arcDimension, draw_alignedDimensions, draw_line_group, draw_angleDimension, update_text, draw_axisDimension, draw_boundsDimension, get_mesh_vertices, printTime
 
 # ------------------------------------------------------
 # Handler to detect new Blend load
@@ -46,6 +53,43 @@ from .measureit_arch_geometry import clear_batches, draw_annotation, draw_arcDim
 @persistent
 def load_handler(dummy):
     ShowHideViewportButton.handle_remove(None, bpy.context)
+    clear_batches()
+    clear_visibility_cache()
+    invalidate_style_index()
+    objectNames.clear()
+    set_profiling(bpy.context.scene.MeasureItArchProps.enable_profiling)
+    subscribe_unit_settings()
+    request_text_scan()
+
+
+# ------------------------------------------------------
+# Handler to detect geometry changes, also run on frame changes
+# Bumps the revision used to invalidate cached line group and depth batches,
+# and detects renamed objects, items are indexed by object name
+#
+# ------------------------------------------------------
+
+# Object names keyed by object pointer
+objectNames = {}
+
+@persistent
+def depsgraph_update_handler(scene, depsgraph=None):
+    if depsgraph is None:
+        depsgraph = bpy.context.view_layer.depsgraph
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and isinstance(update.id, (bpy.types.Object, bpy.types.Mesh)):
+            tag_geometry_update(update.id.original)
+        if isinstance(update.id, bpy.types.Object):
+            obj = update.id.original
+            name = objectNames.get(obj.as_pointer())
+            if name is None:
+                # New or duplicated objects can bring their own style users
+                invalidate_style_users()
+            elif name != obj.name:
+                invalidate_style_users()
+                request_text_scan()
+                clear_object_batches(name)
+            objectNames[obj.as_pointer()] = obj.name
 
 
 # ------------------------------------------------------
@@ -99,6 +143,8 @@ def save_handler(dummy):
 
 bpy.app.handlers.load_post.append(load_handler)
 bpy.app.handlers.save_pre.append(save_handler)
+bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_handler)
+bpy.app.handlers.frame_change_post.append(depsgraph_update_handler)
 
 # Rough Attempts to add a m-ARCH tab to the properties panel navigation bar
 # Not solved yet (not entirely sure its possible), but kept for future reference.
@@ -417,6 +463,7 @@ class ShowHideViewportButton(Operator):
 # -------------------------------------------------------------
 # Handle all 2d draw routines (Text Updating mostly)
 # -------------------------------------------------------------
+@profile('draw_main')
 def draw_main(context):
     region = bpy.context.region
     # Detect if Quadview to get drawing area
@@ -437,92 +484,66 @@ def draw_main(context):
 
         rv3d = context.space_data.region_quadviews[i]
 
-    scene = bpy.context.scene
-
-    # Get visible collections
-    viewLayer = bpy.context.view_layer
-
-    # Display selected or all
-    if scene.measureit_arch_gl_ghost is False:
-        objlist = context.selected_objects
-    else:
-        objlist = context.view_layer.objects
-
     # Enable GL drawing
     bgl.glEnable(bgl.GL_BLEND)
+
+    update_queued_text(context)
+
+def update_queued_text(context):
     # ---------------------------------------
-    # Generate all OpenGL calls for measures
+    # Rasterize the labels of queued items only, the update
+    # callbacks and draw functions queue the items that changed
     # ---------------------------------------
+    scene = context.scene
+    if textQueueState['fullScan']:
+        scan_text_items()
+    poll_text_sources(scene)
+
+    queued = list(textQueue.items())
+    textQueue.clear()
+    for key, styleCollection in queued:
+        myobj, item = resolve_text_item(key)
+        if myobj is None:
+            # Renamed or deleted, find its items again
+            request_text_scan()
+            continue
+        if item is not None:
+            update_text(textobj=item,props=get_style(scene, styleCollection, item),context=context)
+
+def poll_text_sources(scene):
+    # Annotation text from custom properties, those have no update
+    # callback so the properties are read on every draw
+    pr = scene.measureit_arch_gl_precision
+    fmt = "%1." + str(pr) + "f"
+    for key in list(textSources):
+        myobj, annotation = resolve_text_item(key)
+        if annotation is None or annotation.annotationTextSource == '':
+            del textSources[key]
+            continue
+        source = annotation.annotationTextSource
+        if source not in myobj or len(annotation.textFields) == 0:
+            continue
+
+        value = myobj[source]
+        if isinstance(value, str):
+            text = value
+        else:
+            try:
+                text = fmt % value
+            except TypeError:
+                text = str(value)
 
-    for myobj in objlist:
-        if myobj.visible_get() is True:
-            if 'DimensionGenerator' in myobj:
-                DimGen = myobj.DimensionGenerator[0]
-                for alignedDim in DimGen.alignedDimensions:
-                    
-                    alignedDimProps = alignedDim
-                    if alignedDim.uses_style:
-                        for alignedDimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if alignedDimStyle.name == alignedDim.style:
-                                alignedDimProps= alignedDimStyle
-
-                    update_text(textobj=alignedDim,props=alignedDimProps,context=context)
-                
-                for angleDim in DimGen.angleDimensions: 
-                    dimProps = angleDim
-                    if angleDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == angleDim.style:
-                                dimProps= dimStyle
-                    update_text(textobj=angleDim,props=dimProps,context=context)
-                
-                for axisDim in DimGen.axisDimensions: 
-                    dimProps = axisDim
-                    if axisDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == axisDim.style:
-                                dimProps= dimStyle
-                    update_text(textobj=axisDim,props=dimProps,context=context)
-
-                for boundsDim in DimGen.boundsDimensions: 
-                    dimProps = boundsDim
-                    if boundsDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == boundsDim.style:
-                                dimProps= dimStyle
-                    update_text(textobj=boundsDim,props=dimProps,context=context)
-                
-                for arcDim in DimGen.arcDimensions: 
-                    dimProps = arcDim
-                    if arcDim.uses_style:
-                        for dimStyle in context.scene.StyleGenerator.alignedDimensions:
-                            if dimStyle.name == arcDim.style:
-                                dimProps= dimStyle
-                    update_text(textobj=arcDim,props=dimProps,context=context)
-            
-            if 'AnnotationGenerator' in myobj:
-                annotationGen = myobj.AnnotationGenerator[0]
-                for idx in range(0, annotationGen.num_annotations):
-                    annotation = annotationGen.annotations[idx]
-                    annotationProps = annotation
-                    if annotation.uses_style:
-                        for annotationStyle in context.scene.StyleGenerator.annotations:
-                            if annotationStyle.name == annotation.style:
-                                annotationProps = annotationStyle
-                    if annotation.annotationTextSource is not '':
-                        try:
-                            annotation.text = myobj[annotation.annotationTextSource]
-                        except:
-                            pr = scene.measureit_arch_gl_precision
-                            fmt = "%1." + str(pr) + "f"
-                            annotation.text = fmt % myobj[annotation.annotationTextSource]
-                    update_text(textobj=annotation,props=annotationProps,context=context)
+        # Setting the text queues the annotation
+        if annotation.textFields[0].text != text:
+            annotation.textFields[0].text = text
 
 
+@profile('draw_main_3d')
 def draw_main_3d (context):
    
     scene = context.scene
     sceneProps = scene.MeasureItArchProps
+    begin_frame_cache()
 
     # Display selected or all
     if scene.measureit_arch_gl_ghost is False:
@@ -555,8 +576,7 @@ def draw_main_3d (context):
             if 'DimensionGenerator' in myobj:
                 DimGen = myobj.DimensionGenerator[0]
                 
-                for alignedDim in DimGen.alignedDimensions:
-                    draw_alignedDimension(context, myobj, DimGen, alignedDim,mat)
+                draw_alignedDimensions(context, myobj, DimGen, DimGen.alignedDimensions, mat)
 
                 for angleDim in DimGen.angleDimensions:
                     draw_angleDimension(context, myobj, DimGen, angleDim,mat)
@@ -593,13 +613,18 @@ def draw_main_3d (context):
                 if sceneProps.instance_dims:
                     if 'DimensionGenerator' in myobj and myobj.DimensionGenerator[0].measureit_arch_num != 0:
                         DimGen = myobj.DimensionGenerator[0]
-                        for alignedDim in DimGen.alignedDimensions:
-                            draw_alignedDimension(context, myobj, DimGen, alignedDim,mat)
+                        draw_alignedDimensions(context, myobj, DimGen, DimGen.alignedDimensions, mat)
                         for angleDim in DimGen.angleDimensions:
                             draw_angleDimension(context, myobj, DimGen, angleDim,mat)
                         for axisDim in DimGen.axisDimensions:
                             draw_axisDimension(context,myobj,DimGen,axisDim,mat)
 
+    # Draw all queued text labels
+    draw_text_queue()
+
+    # Free this frame's mesh data
+    clear_frame_cache()
+
 # -------------------------------------------------------------
 # Handlers for drawing OpenGl
 # -------------------------------------------------------------
@@ -623,134 +648,65 @@ def exist_segment(mp, pointa, pointb, typ=1, pointc=None):
 
 
 # -------------------------------------------------------------
-# Get vertex selected
+# Get selected vertex and segment lists of several objects,
+# reading each mesh once
 # -------------------------------------------------------------
-def get_selected_vertex(myobject):
-    mylist = []
+def get_selection_entry(entry):
     # if not mesh, no vertex
-    if myobject.type != "MESH":
-        return mylist
-    # --------------------
-    # meshes
-    # --------------------
-    oldobj = bpy.context.object
-    bpy.context.view_layer.objects.active = myobject
-    flag = False
-    if myobject.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-        flag = True
-
-    bm = from_edit_mesh(myobject.data)
-    tv = len(bm.verts)
-    for v in bm.verts:
-        if v.select:
-            mylist.extend([v.index])
-
-    if flag is True:
-        bpy.ops.object.editmode_toggle()
-    # Back context object
-    bpy.context.view_layer.objects.active = oldobj
+    if entry is None:
+        return {'verts': [], 'smart': []}
+    mylist = entry['verts'].tolist()
 
     # if select all vertices, then use origin
-    if tv == len(mylist):
-        return []
+    if entry['vertCount'] == len(mylist):
+        mylist = []
+
+    return {'verts': mylist, 'smart': entry['edges'].ravel().tolist()}
+
 
-    return mylist
+def get_selection_lists(objects):
+    selection = get_selection(objects)
+    return {myobject.name: get_selection_entry(selection.get(myobject.name)) for myobject in objects}
+
+
+# -------------------------------------------------------------
+# Get vertex selected
+# -------------------------------------------------------------
+def get_selected_vertex(myobject):
+    return get_selection_lists((myobject,))[myobject.name]['verts']
 
 
 # -------------------------------------------------------------
 # Get vertex selected
 # -------------------------------------------------------------
 def get_selected_vertex_history(myobject):
-    mylist = []
-    # if not mesh, no vertex
-    if myobject.type != "MESH":
-        return mylist
-    # --------------------
-    # meshes
-    # --------------------
-    oldobj = bpy.context.object
-    bpy.context.view_layer.objects.active = myobject
-    flag = False
-    if myobject.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-        flag = True
-
-    bm = from_edit_mesh(myobject.data)
-    for v in bm.select_history:
-        mylist.extend([v.index])
-
-    if flag is True:
-        bpy.ops.object.editmode_toggle()
-    # Back context object
-    bpy.context.view_layer.objects.active = oldobj
-
-    return mylist
+    return get_select_history(myobject).tolist()
 
 
 # -------------------------------------------------------------
 # Get vertex selected segments
 # -------------------------------------------------------------
 def get_smart_selected(myobject):
-    mylist = []
-    # if not mesh, no vertex
-    if myobject.type != "MESH":
-        return mylist
-    # --------------------
-    # meshes
-    # --------------------
-    oldobj = bpy.context.object
-    bpy.context.view_layer.objects.active = myobject
-    flag = False
-    if myobject.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-        flag = True
-
-    bm = from_edit_mesh(myobject.data)
-    for e in bm.edges:
-        if e.select is True:
-            mylist.extend([e.verts[0].index])
-            mylist.extend([e.verts[1].index])
-
-    if flag is True:
-        bpy.ops.object.editmode_toggle()
-    # Back context object
-    bpy.context.view_layer.objects.active = oldobj
-
-    return mylist
+    return get_selection_lists((myobject,))[myobject.name]['smart']
 
 
 # -------------------------------------------------------------
 # Get vertex selected faces
 # -------------------------------------------------------------
 def get_selected_faces(myobject):
-    mylist = []
-    # if not mesh, no vertex
-    if myobject.type != "MESH":
-        return mylist
-    # --------------------
-    # meshes
-    # --------------------
-    oldobj = bpy.context.object
-    bpy.context.view_layer.objects.active = myobject
-    flag = False
-    if myobject.mode != 'EDIT':
-        bpy.ops.object.mode_set(mode='EDIT')
-        flag = True
-
-    bm = from_edit_mesh(myobject.data)
-    for e in bm.faces:
-        myface = []
-        if e.select is True:
-            for i in range(0, len(e.verts)):
-                myface.extend([e.verts[i].index])
-
-            mylist.extend([myface])
-
-    if flag is True:
-        bpy.ops.object.editmode_toggle()
-    # Back context object
-    bpy.context.view_layer.objects.active = oldobj
-
-    return mylist
+    return [face.tolist() for face in get_selected_face_verts(myobject)]
 
+
+# -------------------------------------------------------------
+# Get vertex selected segments of all objects in edit mode
+# -------------------------------------------------------------
+def get_smart_selection(context):
+    selection = get_edit_selection(context)
+    smartSelection = {}
+    for name, entry in selection.items():
+        entry = get_selection_entry(entry)
+        mylist = entry['smart']
+        if len(mylist) < 2:  # if not selected linked vertex
+            mylist = entry['verts']
+        smartSelection[name] = mylist
+    return smartSelection
@@ -0,0 +1,222 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_profiling.py
+# Named timers around the draw functions, keeps rolling per frame
+# statistics shown in the sidebar and exported to CSV or JSON
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import bpy
+import csv
+import json
+import time
+from collections import deque
+from functools import wraps
+
+import numpy as np
+from bpy.props import EnumProperty
+from bpy.types import Operator, Panel
+from bpy_extras.io_utils import ExportHelper
+
+
+# Number of frames the statistics are computed over
+historyLength = 240
+
+# Timers only measure while enabled, see the scene's enable_profiling.
+# depth counts the timed calls in progress, a frame ends when the
+# outermost one returns
+profilerState = {'enabled': False, 'depth': 0}
+
+# [milliseconds, calls] of each timer in the frame in progress
+frameTotals = {}
+
+# (milliseconds, calls) of each timer for the last frames it ran in
+profileHistory = {}
+
+
+def set_profiling(enabled):
+    if enabled != profilerState['enabled']:
+        profilerState['enabled'] = enabled
+        reset_profile()
+
+def update_profiling(self, context):
+    set_profiling(self.enable_profiling)
+
+def reset_profile():
+    profilerState['depth'] = 0
+    frameTotals.clear()
+    profileHistory.clear()
+
+def add_time(name, seconds):
+    totals = frameTotals.get(name)
+    if totals is None:
+        frameTotals[name] = [seconds * 1000, 1]
+    else:
+        totals[0] += seconds * 1000
+        totals[1] += 1
+
+def end_frame():
+    for name, totals in frameTotals.items():
+        history = profileHistory.get(name)
+        if history is None:
+            history = profileHistory[name] = deque(maxlen=historyLength)
+        history.append((totals[0], totals[1]))
+    frameTotals.clear()
+
+def profile(name):
+    # Decorator timing every call of a function as the named timer
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profilerState['enabled']:
+                return func(*args, **kwargs)
+            profilerState['depth'] += 1
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add_time(name, time.perf_counter() - start)
+                profilerState['depth'] -= 1
+                if profilerState['depth'] <= 0:
+                    profilerState['depth'] = 0
+                    end_frame()
+        return wrapper
+    return decorator
+
+def get_profile_stats():
+    # Per frame statistics of each timer, slowest mean first
+    stats = []
+    for name, history in profileHistory.items():
+        if len(history) == 0:
+            continue
+        frames = np.array(history, dtype=np.float64)
+        stats.append({
+            'name': name,
+            'frames': len(frames),
+            'calls': float(frames[:, 1].mean()),
+            'mean': float(frames[:, 0].mean()),
+            'p95': float(np.percentile(frames[:, 0], 95)),
+            'max': float(frames[:, 0].max()),
+        })
+    stats.sort(key=lambda stat: stat['mean'], reverse=True)
+    return stats
+
+def write_profile_csv(filepath, stats):
+    with open(filepath, 'w', newline='') as csvFile:
+        writer = csv.writer(csvFile)
+        writer.writerow(('timer', 'frames', 'calls_per_frame', 'mean_ms', 'p95_ms', 'max_ms'))
+        for stat in stats:
+            writer.writerow((stat['name'], stat['frames'], '%.2f' % stat['calls'],
+                             '%.4f' % stat['mean'], '%.4f' % stat['p95'], '%.4f' % stat['max']))
+
+def write_profile_json(filepath, stats):
+    history = {name: [round(ms, 4) for ms, calls in frames] for name, frames in profileHistory.items()}
+    with open(filepath, 'w') as jsonFile:
+        json.dump({'historyLength': historyLength, 'timers': stats, 'history': history}, jsonFile, indent=2)
+
+
+# ------------------------------------------------------------------
+# Sidebar panel showing the slowest timers
+# ------------------------------------------------------------------
+class MeasureitArchProfilePanel(Panel):
+    bl_idname = "MEASUREIT_PT_profile_panel"
+    bl_label = "Profiling"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = "UI"
+    bl_category = 'MeasureIt-ARCH'
+    bl_options = {'DEFAULT_CLOSED'}
+
+    def draw_header(self, context):
+        self.layout.prop(context.scene.MeasureItArchProps, 'enable_profiling', text="")
+
+    def draw(self, context):
+        layout = self.layout
+        sceneProps = context.scene.MeasureItArchProps
+        if not sceneProps.enable_profiling:
+            layout.label(text="Enable to time the draw functions")
+            return
+
+        stats = get_profile_stats()
+        col = layout.column(align=True)
+        row = col.row()
+        row.label(text="Timer")
+        row.label(text="Mean")
+        row.label(text="P95")
+        row.label(text="Max")
+        for stat in stats:
+            row = col.row()
+            row.label(text=stat['name'])
+            row.label(text='%.2f' % stat['mean'])
+            row.label(text='%.2f' % stat['p95'])
+            row.label(text='%.2f' % stat['max'])
+        if len(stats) == 0:
+            col.label(text="No frames timed yet")
+
+        row = layout.row(align=True)
+        row.operator("measureit_arch.export_profile", icon='EXPORT', text="Export")
+        row.operator("measureit_arch.reset_profile", icon='FILE_REFRESH', text="Reset")
+
+
+class ExportProfileButton(Operator, ExportHelper):
+    bl_idname = "measureit_arch.export_profile"
+    bl_label = "Export Profile"
+    bl_description = "Export the per frame draw timings as CSV or JSON"
+    bl_category = 'MeasureitArch'
+
+    filename_ext = ".csv"
+
+    format: EnumProperty(
+        items=(('CSV', "CSV", "Statistics of each timer"),
+               ('JSON', "JSON", "Statistics and per frame history of each timer")),
+        name="Format",
+        description="File format of the profile",
+        default='CSV')
+
+    def check(self, context):
+        # Keep the file extension in sync with the format
+        self.filename_ext = "." + self.format.lower()
+        return super().check(context)
+
+    def execute(self, context):
+        filepath = bpy.path.ensure_ext(self.filepath, "." + self.format.lower())
+        stats = get_profile_stats()
+        try:
+            if self.format == 'JSON':
+                write_profile_json(filepath, stats)
+            else:
+                write_profile_csv(filepath, stats)
+        except OSError as e:
+            self.report({'ERROR'}, "MeasureIt-ARCH: Unable to write " + filepath + ", " + str(e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, "MeasureIt-ARCH: Exported " + filepath)
+        return {'FINISHED'}
+
+
+class ResetProfileButton(Operator):
+    bl_idname = "measureit_arch.reset_profile"
+    bl_label = "Reset Profile"
+    bl_description = "Clear the collected draw timings"
+    bl_category = 'MeasureitArch'
+
+    def execute(self, context):
+        reset_profile()
+        return {'FINISHED'}
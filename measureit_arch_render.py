@@ -31,6 +31,11 @@ import gpu
 import blf
 from os import path, remove
 from sys import exc_info
+import struct
+import time
+import zlib
+from queue import Queue
+from threading import Thread
 
 import bpy_extras.image_utils as img_utils
 
@@ -44,7 +49,9 @@ from bgl import *
 import numpy as np
 import bmesh
 from .measureit_arch_geometry import *
-from .measureit_arch_main import draw_main, draw_main_3d
+from .measureit_arch_main import draw_main, draw_main_3d, update_queued_text
+from .measureit_arch_text import draw_text_queue, queue_pending_text
+from .measureit_arch_profiling import profile
 from bpy.props import IntProperty
 from bpy.types import PropertyGroup, Panel, Object, Operator, SpaceView3D
 
@@ -80,6 +87,7 @@ class MeasureitArchRenderPanel(Panel):
         col.scale_y = 1.5
         col.operator("measureit_arch.rendersegmentbutton", icon='RENDER_STILL', text= "MeasureIt-ARCH Image")
         col.operator("measureit_arch.render_anim", icon='RENDER_ANIMATION', text= "MeasureIt-ARCH Animation")
+        col.operator("measureit_arch.export_vector", icon='EXPORT', text= "MeasureIt-ARCH Vector")
         col = layout.column()
 
         col.prop(scene, "measureit_arch_render", text="Save Render to Output")
@@ -120,6 +128,12 @@ class RenderSegmentButton(Operator):
         if render_main(self, context) is True:
             self.report({'INFO'}, msg)
 
+        # A single image, wait for it so save errors can be reported
+        if scene.measureit_arch_render:
+            pngWriter.wait()
+            for error in pngWriter.take_errors():
+                self.report({'ERROR'}, error)
+
         
         return {'FINISHED'}
 
@@ -153,41 +167,59 @@ class RenderSegmentButton(Operator):
             s.show_only_render = status
 
 class MeasureitRenderAnim(bpy.types.Operator):
-    """Operator which runs its self from a timer"""
+    """Render the animation frame range in batches, ESC to cancel"""
     bl_idname = "measureit_arch.render_anim"
     bl_label = "Render Measureit-ARCH animation"
 
     _timer = None
-    _updating = False
-    view3d = None 
+    offscreen = None
+
+    # Seconds spent rendering frames per timer tick before
+    # handing control back to Blender to process events
+    frameBudget = 0.5
 
     def modal(self, context, event):
         scene = context.scene
-        wm = context.window_manager
         
         if event.type in {'RIGHTMOUSE', 'ESC'}:
-            self.cancel(context)
+            self.finish(context)
+            self.report({'WARNING'}, "MeasureIt-ARCH: Animation render cancelled")
             return {'CANCELLED'}
             
-        if event.type == 'TIMER' and not self._updating:
-            self._updating=True
-            if scene.frame_current <= scene.frame_end:
-                scene.frame_set(scene.frame_current)
-                self.view3d.tag_redraw()      
-                print("MeasureIt-ARCH: Rendering frame: " + str(scene.frame_current))
-                render_main(self, context, True)
-                self._updating = False
-                scene.frame_current += 1
+        if event.type == 'TIMER':
+            self.report_save_errors()
+            total = scene.frame_end - scene.frame_start + 1
+
+            if self.frame <= scene.frame_end:
+                tickStart = time.time()
+                while self.frame <= scene.frame_end and time.time() - tickStart < self.frameBudget:
+                    scene.frame_set(self.frame)
+                    render_main(self, context, True, self.offscreen)
+                    self.frame += 1
+
+                # Progress and ETA
+                done = self.frame - scene.frame_start
+                elapsed = time.time() - self.startTime
+                eta = elapsed / done * (total - done)
+                context.window_manager.progress_update(self.frame)
+                context.workspace.status_text_set(
+                    "MeasureIt-ARCH: Rendered frame %d of %d, %d:%02d remaining (ESC to cancel)"
+                    % (done, total, eta // 60, eta % 60))
+
+            # Frames still being written are polled here, not waited for
+            elif pngWriter.busy():
+                context.workspace.status_text_set(
+                    "MeasureIt-ARCH: Saving %d remaining frames" % pngWriter.queue.unfinished_tasks)
+
             else:
-                self.cancel(context)
-                return {'CANCELLED'}
+                self.finish(context)
+                print("MeasureIt-ARCH: Rendered %d frames in %.2f s" % (total, time.time() - self.startTime))
+                return {'FINISHED'}
 
-        self.view3d.tag_redraw() 
         return {'PASS_THROUGH'}
                 
     def execute(self, context):
         scene = context.scene
-        msg = "New image created with measures. Open it in UV/image editor"
         camera_msg = "Unable to render. No camera found"
         # -----------------------------
         # Check camera
@@ -196,32 +228,47 @@ class MeasureitRenderAnim(bpy.types.Operator):
             self.report({'ERROR'}, camera_msg)
             return {'FINISHED'}
 
-        for area in context.screen.areas:
-            if area.type == 'VIEW_3D':
-                self.view3d = area
-        
-        if self.view3d == None:
-            self.report({'ERROR'}, 'A 3D Viewport must be open to render MeasureIt-ARCH Animations')
-            self.cancel(context)
-            return {'CANCELLED'}
+        # Allocated once and reused for every frame
+        render_scale = scene.render.resolution_percentage / 100
+        width = int(scene.render.resolution_x * render_scale)
+        height = int(scene.render.resolution_y * render_scale)
+        self.offscreen = gpu.types.GPUOffScreen(width, height)
+
+        self.startFrame = scene.frame_current
+        self.frame = scene.frame_start
+        self.startTime = time.time()
 
         wm = context.window_manager
-        self._timer = wm.event_timer_add(0.1, window=context.window)
-        scene.frame_current = scene.frame_start
+        wm.progress_begin(scene.frame_start, scene.frame_end)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
         wm.modal_handler_add(self)
         return {'RUNNING_MODAL'}
 
-    def cancel(self, context):
+    def finish(self, context):
         wm = context.window_manager
         wm.event_timer_remove(self._timer)
-        return {'CANCELLED'}
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        self.report_save_errors()
+        self.offscreen.free()
+        self.offscreen = None
+        context.scene.frame_set(self.startFrame)
+
+    def report_save_errors(self):
+        for error in pngWriter.take_errors():
+            self.report({'ERROR'}, error)
+
+    def cancel(self, context):
+        # Blender ended the modal, a closed window or a file load
+        self.finish(context)
 
 
 # -------------------------------------------------------------
 # Render image main entry point
 #
 # -------------------------------------------------------------
-def render_main(self, context, animation=False):
+@profile('render_main')
+def render_main(self, context, animation=False, offscreen=None):
 
     # Save old info
     scene = context.scene
@@ -246,7 +293,10 @@ def render_main(self, context, animation=False):
     # --------------------------------------
     # Draw all lines in Offsecreen
     # --------------------------------------
-    offscreen = gpu.types.GPUOffScreen(width, height)
+    # Animations pass in an offscreen shared by all frames
+    ownOffscreen = offscreen is None
+    if ownOffscreen:
+        offscreen = gpu.types.GPUOffScreen(width, height)
     
     view_matrix = Matrix([
         [2 / width, 0, 0, -1],
@@ -257,204 +307,295 @@ def render_main(self, context, animation=False):
     view_matrix_3d = scene.camera.matrix_world.inverted()
     projection_matrix = scene.camera.calc_matrix_camera(context.view_layer.depsgraph, x=width, y=height)
     
-    with offscreen.bind():
-        # Clear Depth Buffer, set Clear Depth to Cameras Clip Distance
-        bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
-        bgl.glClearDepth(clipdepth)
-        bgl.glEnable(bgl.GL_DEPTH_TEST)
-        bgl.glDepthFunc(bgl.GL_LESS)  
-
-        gpu.matrix.reset()
-        gpu.matrix.load_matrix(view_matrix_3d)
-        gpu.matrix.load_projection_matrix(projection_matrix)
-
-        draw_scene(self, context, projection_matrix) 
+    # Labels changed since the last frame are rasterized before drawing,
+    # labels the draw functions change are rasterized after the geometry
+    # and drawn with their cards fitted to the new size. Labels that had
+    # no size yet need the frame to be laid out again
+    for renderPass in range(2):
+        update_queued_text(context)
+        with offscreen.bind():
+            # Clear Depth Buffer, set Clear Depth to Cameras Clip Distance
+            bgl.glClear(bgl.GL_DEPTH_BUFFER_BIT)
+            bgl.glClearDepth(clipdepth)
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+            bgl.glDepthFunc(bgl.GL_LESS)  
+
+            gpu.matrix.reset()
+            gpu.matrix.load_matrix(view_matrix_3d)
+            gpu.matrix.load_projection_matrix(projection_matrix)
+
+            draw_scene(self, context, projection_matrix) 
 
         
-        # Clear Color Keep on depth info
-        bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
-
-        # -----------------------------
-        # Loop to draw all objects
-        # -----------------------------
-        for myobj in objlist:
-            if myobj.visible_get() is True:
-                mat = myobj.matrix_world
-                if 'DimensionGenerator' in myobj:
-                    measureGen = myobj.DimensionGenerator[0]
-                    if 'alignedDimensions' in measureGen:
-                        for linDim in measureGen.alignedDimensions:
-                            draw_alignedDimension(context, myobj, measureGen,linDim,mat)
-                    if 'angleDimensions' in measureGen:
-                        for dim in measureGen.angleDimensions:
-                            draw_angleDimension(context, myobj, measureGen,dim,mat)
-                    if 'axisDimensions' in measureGen:
-                        for dim in measureGen.axisDimensions:
-                            draw_axisDimension(context, myobj, measureGen,dim,mat)
-                    if 'boundsDimensions' in measureGen:
-                        for dim in measureGen.boundsDimensions:
-                            draw_boundsDimension(context, myobj, measureGen,dim,mat)
-                    if 'arcDimensions' in measureGen:
-                        for dim in measureGen.arcDimensions:
-                            draw_arcDimension(context, myobj, measureGen,dim,mat)
-
-                if 'LineGenerator' in myobj:
-                    # Set 3D Projection Martix
-                    gpu.matrix.reset()
-                    gpu.matrix.load_matrix(view_matrix_3d)
-                    gpu.matrix.load_projection_matrix(projection_matrix)
-
-                    # Draw Line Groups
-                    op = myobj.LineGenerator[0]
-                    draw_line_group(context, myobj, op, mat)
+            # Clear Color Keep on depth info
+            bgl.glClear(bgl.GL_COLOR_BUFFER_BIT)
+            begin_frame_cache()
+
+            # -----------------------------
+            # Loop to draw all objects
+            # -----------------------------
+            for myobj in objlist:
+                if myobj.visible_get() is True:
+                    mat = myobj.matrix_world
+                    if 'DimensionGenerator' in myobj:
+                        measureGen = myobj.DimensionGenerator[0]
+                        if 'alignedDimensions' in measureGen:
+                            draw_alignedDimensions(context, myobj, measureGen, measureGen.alignedDimensions, mat)
+                        if 'angleDimensions' in measureGen:
+                            for dim in measureGen.angleDimensions:
+                                draw_angleDimension(context, myobj, measureGen,dim,mat)
+                        if 'axisDimensions' in measureGen:
+                            for dim in measureGen.axisDimensions:
+                                draw_axisDimension(context, myobj, measureGen,dim,mat)
+                        if 'boundsDimensions' in measureGen:
+                            for dim in measureGen.boundsDimensions:
+                                draw_boundsDimension(context, myobj, measureGen,dim,mat)
+                        if 'arcDimensions' in measureGen:
+                            for dim in measureGen.arcDimensions:
+                                draw_arcDimension(context, myobj, measureGen,dim,mat)
+
+                    if 'LineGenerator' in myobj:
+                        # Set 3D Projection Martix
+                        gpu.matrix.reset()
+                        gpu.matrix.load_matrix(view_matrix_3d)
+                        gpu.matrix.load_projection_matrix(projection_matrix)
+
+                        # Draw Line Groups
+                        op = myobj.LineGenerator[0]
+                        draw_line_group(context, myobj, op, mat)
              
-                if 'AnnotationGenerator' in myobj:
-                    # Set 3D Projection Martix
-                    gpu.matrix.reset()
-                    gpu.matrix.load_matrix(view_matrix_3d)
-                    gpu.matrix.load_projection_matrix(projection_matrix)
-
-                    # Draw Line Groups
-                    op = myobj.AnnotationGenerator[0]
-                    draw_annotation(context, myobj, op, mat)                
+                    if 'AnnotationGenerator' in myobj:
+                        # Set 3D Projection Martix
+                        gpu.matrix.reset()
+                        gpu.matrix.load_matrix(view_matrix_3d)
+                        gpu.matrix.load_projection_matrix(projection_matrix)
+
+                        # Draw Line Groups
+                        op = myobj.AnnotationGenerator[0]
+                        draw_annotation(context, myobj, op, mat)                
        
-        # Draw Instance 
-        deps = bpy.context.view_layer.depsgraph
-        for obj_int in deps.object_instances:
-            if obj_int.is_instance:
-                myobj = obj_int.object
-                mat = obj_int.matrix_world
-
-                if 'LineGenerator' in myobj:
-                    lineGen = myobj.LineGenerator[0]
-                    draw_line_group(context,myobj,lineGen,mat)
+            # Draw Instance 
+            deps = bpy.context.view_layer.depsgraph
+            for obj_int in deps.object_instances:
+                if obj_int.is_instance:
+                    myobj = obj_int.object
+                    mat = obj_int.matrix_world
+
+                    if 'LineGenerator' in myobj:
+                        lineGen = myobj.LineGenerator[0]
+                        draw_line_group(context,myobj,lineGen,mat)
                 
-                if sceneProps.instance_dims:
-                    if 'AnnotationGenerator' in myobj:
-                        annotationGen = myobj.AnnotationGenerator[0]
-                        draw_annotation(context,myobj,annotationGen,mat)
-
-                    if 'DimensionGenerator' in myobj:
-                        DimGen = myobj.DimensionGenerator[0]
-                        for alignedDim in DimGen.alignedDimensions:
-                            draw_alignedDimension(context, myobj, DimGen, alignedDim,mat)
-                        for angleDim in DimGen.angleDimensions:
-                            draw_angleDimension(context, myobj, DimGen, angleDim,mat)
-                        for axisDim in DimGen.axisDimensions:
-                            draw_axisDimension(context,myobj,DimGen,axisDim,mat)
+                    if sceneProps.instance_dims:
+                        if 'AnnotationGenerator' in myobj:
+                            annotationGen = myobj.AnnotationGenerator[0]
+                            draw_annotation(context,myobj,annotationGen,mat)
+
+                        if 'DimensionGenerator' in myobj:
+                            DimGen = myobj.DimensionGenerator[0]
+                            draw_alignedDimensions(context, myobj, DimGen, DimGen.alignedDimensions, mat)
+                            for angleDim in DimGen.angleDimensions:
+                                draw_angleDimension(context, myobj, DimGen, angleDim,mat)
+                            for axisDim in DimGen.axisDimensions:
+                                draw_axisDimension(context,myobj,DimGen,axisDim,mat)
+
+            update_queued_text(context)
+            fitted = queue_pending_text()
+
+            # Set 3D Projection Martix and draw all queued text labels
+            gpu.matrix.reset()
+            gpu.matrix.load_matrix(view_matrix_3d)
+            gpu.matrix.load_projection_matrix(projection_matrix)
+            draw_text_queue()
+            clear_frame_cache()
         
-        # -----------------------------
-        # Draw a rectangle frame
-        # -----------------------------
-        if scene.measureit_arch_rf is True:
-            rfcolor = scene.measureit_arch_rf_color
-            rfborder = scene.measureit_arch_rf_border
-            rfline = scene.measureit_arch_rf_line
-
-            bgl.glLineWidth(rfline)
-            x1 = rfborder
-            x2 = width - rfborder
-            y1 = int(ceil(rfborder / (width / height)))
-            y2 = height - y1
-            draw_rectangle((x1, y1), (x2, y2))
+            # -----------------------------
+            # Draw a rectangle frame
+            # -----------------------------
+            if scene.measureit_arch_rf is True:
+                rfcolor = scene.measureit_arch_rf_color
+                rfborder = scene.measureit_arch_rf_border
+                rfline = scene.measureit_arch_rf_line
+
+                bgl.glLineWidth(rfline)
+                x1 = rfborder
+                x2 = width - rfborder
+                y1 = int(ceil(rfborder / (width / height)))
+                y2 = height - y1
+                draw_rectangle((x1, y1), (x2, y2))
+
+            buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
+            bgl.glReadBuffer(bgl.GL_COLOR_ATTACHMENT0)
+            bgl.glReadPixels(0, 0, width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, buffer)
+        if fitted:
+            break
+    if ownOffscreen:
+        offscreen.free()
+    pixels = buffer_to_array(buffer)
 
-        buffer = bgl.Buffer(bgl.GL_BYTE, width * height * 4)
-        bgl.glReadBuffer(bgl.GL_COLOR_ATTACHMENT0)
-        bgl.glReadPixels(0, 0, width, height, bgl.GL_RGBA, bgl.GL_UNSIGNED_BYTE, buffer)
-    offscreen.free()
-
-    
     # -----------------------------
     # Create image
+    # Animations are only written to disk
     # -----------------------------
-    image_name = "measureit_arch_output"
-    if image_name not in bpy.data.images:
-        bpy.data.images.new(image_name, width, height)
-
-    image = bpy.data.images[image_name]
-    image.scale(width, height)
-    image.pixels = [v / 255 for v in buffer]
-
-    # Saves image
-    if image is not None and (scene.measureit_arch_render is True or animation is True):
-        settings = bpy.context.scene.render.image_settings
-        myformat = settings.file_format
+    if not animation:
+        image_name = "measureit_arch_output"
+        if image_name not in bpy.data.images:
+            bpy.data.images.new(image_name, width, height)
+
+        image = bpy.data.images[image_name]
+        image.scale(width, height)
+        image.pixels.foreach_set(pixels.astype(np.float32) / 255)
+
+    # Saves image, encoded and written by the background writer
+    if scene.measureit_arch_render is True or animation is True:
         ren_path = bpy.context.scene.render.filepath
         filename = "mit_frame"
         ftxt = "%04d" % scene.frame_current
-        outpath = (ren_path + filename + ftxt + '.png')
-        save_image(self, outpath, image)
+        outpath = bpy.path.abspath(ren_path + filename + ftxt + '.png')
+        pngWriter.add(outpath, pixels, width, height)
 
     # restore default value
     sceneProps.is_render_draw = False
 
 # -------------------------------------
-# Save image to file
+# Read a bgl Buffer of bytes into a uint8 array
 # -------------------------------------
-def save_image(self, filepath, myimage):
-    # noinspection PyBroadException
+def buffer_to_array(buffer):
     try:
+        # Newer bgl Buffers support the buffer protocol
+        return np.frombuffer(buffer, dtype=np.uint8)
+    except TypeError:
+        return np.array(buffer.to_list(), dtype=np.int8).view(np.uint8)
+
+# -------------------------------------
+# Encode RGBA pixels from glReadPixels as an 8-bit PNG
+# -------------------------------------
+def encode_png(pixels, width, height):
+    def png_chunk(tag, data):
+        chunk = struct.pack('>I', len(data)) + tag + data
+        return chunk + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
 
-        # Save old info
-        settings = bpy.context.scene.render.image_settings
-        myformat = settings.file_format
-        mode = settings.color_mode
-        depth = settings.color_depth
-
-        # Apply new info and save
-        settings.file_format = 'PNG'
-        settings.color_mode = "RGBA"
-        settings.color_depth = '16'
-        myimage.save_render(filepath)
-        print("MeasureIt-ARCH: Image " + filepath + " saved")
-
-        # Restore old info
-        settings.file_format = myformat
-        settings.color_mode = mode
-        settings.color_depth = depth
-    except:
-        print("Unexpected error:" + str(exc_info()))
-        self.report({'ERROR'}, "MeasureIt-ARCH: Unable to save render image")
-        return
+    # GL rows start at the bottom, each PNG row starts with a filter byte
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, width * 4)[::-1]
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', header)
+            + png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6))
+            + png_chunk(b'IEND', b''))
+
+# -------------------------------------
+# Background PNG writer
+# Frames are encoded and saved on a worker thread while the next
+# frame is drawn, zlib releases the GIL while compressing
+# -------------------------------------
+class PNGWriter():
+    def __init__(self):
+        self.queue = Queue(maxsize=4)
+        self.thread = None
+        # Messages of failed saves, reported by the operators
+        self.errors = []
+
+    def add(self, filepath, pixels, width, height):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = Thread(target=self.run, daemon=True)
+            self.thread.start()
+        self.queue.put((filepath, pixels, width, height))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            filepath, pixels, width, height = item
+            try:
+                with open(filepath, 'wb') as pngFile:
+                    pngFile.write(encode_png(pixels, width, height))
+                print("MeasureIt-ARCH: Image " + filepath + " saved")
+            except OSError:
+                error = "MeasureIt-ARCH: Unable to save render image " + filepath + ": " + str(exc_info()[1])
+                print(error)
+                self.errors.append(error)
+            self.queue.task_done()
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive() and self.queue.unfinished_tasks != 0
+
+    def take_errors(self):
+        errors = self.errors[:]
+        del self.errors[:len(errors)]
+        return errors
+
+    def wait(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.join()
+
+    def stop(self):
+        if self.thread is not None and self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.thread = None
+
+pngWriter = PNGWriter()
+
+def unregister():
+    pngWriter.stop()
+
+
+#--------------------------------------
+# Get the cached Depth Buffer batch of an object
+# rebuilt when its geometry revision changes
+#--------------------------------------
+
+def get_depth_batch(obj, deps):
+    obj_orig = obj.original
+    revision = get_geometry_revision(obj_orig)
+    if obj_orig.name in depthBatch3D and depthBatch3D[obj_orig.name][0] == revision:
+        return depthBatch3D[obj_orig.name][1]
+
+    obj_eval = obj.evaluated_get(deps)
+    mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=deps)
+    if mesh is None:
+        return None
+    mesh.calc_loop_triangles()
+
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', coords)
+    indices = np.empty(len(mesh.loop_triangles) * 3, dtype=np.int32)
+    mesh.loop_triangles.foreach_get('vertices', indices)
+
+    batch = batch_for_shader(depthShader, 'TRIS', {"pos": coords.reshape(-1, 3)}, indices=indices.reshape(-1, 3))
+    obj_eval.to_mesh_clear()
+
+    depthBatch3D[obj_orig.name] = (revision, batch)
+    return batch
 
 
 #--------------------------------------
 # Draw Scene Geometry for Depth Buffer
 #--------------------------------------
 
+@profile('draw_scene')
 def draw_scene(self, context, projection_matrix):
     bgl.glEnable(bgl.GL_DEPTH_TEST)
     bgl.glDepthFunc(bgl.GL_LESS)   
 
-    # Get List of Mesh Objects
-    objs = []
+    # Draw every visible mesh instance, batches are in object space and
+    # cached per object, so only changed geometry is extracted again
     deps = bpy.context.view_layer.depsgraph
+    depthShader.bind()
+    depthShader.uniform_float("offset", 0)
     for obj_int in deps.object_instances:
         obj = obj_int.object
         if obj.type == 'MESH' and obj.hide_render == False :
-
-            mat = obj_int.matrix_world
-            obj_eval = obj.evaluated_get(deps)
-            mesh = obj_eval.to_mesh(preserve_all_data_layers=True, depsgraph=bpy.context.view_layer.depsgraph)
-            mesh.calc_loop_triangles()
-            tris = mesh.loop_triangles
-            vertices = []
-            indices = []
-
-            for vert in mesh.vertices:
-                # Multipy vertex Position by Object Transform Matrix
-                vertices.append(mat @ vert.co)
-
-            for tri in tris:
-                indices.append(tri.vertices)      
-
-            #shader = gpu.shader.from_builtin('3D_UNIFORM_COLOR')
-            shader = gpu.types.GPUShader(Base_Shader_3D.vertex_shader, DepthOnlyFrag.fragment_shader)
-            batch = batch_for_shader(shader, 'TRIS', {"pos": vertices}, indices=indices)
-            batch.program_set(shader)
-            batch.draw()
-            gpu.shader.unbind()
-            obj_eval.to_mesh_clear()
+            batch = get_depth_batch(obj, deps)
+            if batch is None:
+                continue
+            with gpu.matrix.push_pop():
+                gpu.matrix.multiply_matrix(obj_int.matrix_world)
+                batch.draw(depthShader)
+    gpu.shader.unbind()
 
     #Write to Image for Debug
     debug=False
@@ -0,0 +1,115 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_selection.py
+# Selected vertices, edges and faces of meshes as NumPy index arrays,
+# read without switching the active object or mode. Objects in edit
+# mode are written back to their mesh once per read, then every mesh
+# is read with foreach_get
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import bmesh
+import numpy as np
+
+
+def sync_edit_meshes(objects):
+    # Write the edit bmesh of objects in edit mode back to their mesh,
+    # the mesh's select flags are only updated on mode changes
+    for myobject in objects:
+        if myobject.type == 'MESH' and myobject.mode == 'EDIT':
+            myobject.update_from_editmode()
+
+
+def get_select_flags(collection):
+    flags = np.zeros(len(collection), dtype=bool)
+    if len(collection) != 0:
+        collection.foreach_get('select', flags)
+    return flags
+
+
+def read_selected_verts(mesh):
+    # Indices of the selected vertices
+    return np.flatnonzero(get_select_flags(mesh.vertices)).astype(np.int32)
+
+
+def read_selected_edges(mesh):
+    # Vertex pairs of the selected edges as an (n, 2) array
+    edgeVerts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    if len(mesh.edges) != 0:
+        mesh.edges.foreach_get('vertices', edgeVerts)
+    return edgeVerts.reshape(-1, 2)[get_select_flags(mesh.edges)]
+
+
+def get_selected_faces(myobject):
+    # Vertex indices of each selected face, one array per face
+    if myobject.type != 'MESH':
+        return []
+    sync_edit_meshes((myobject,))
+    mesh = myobject.data
+    loopVerts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loopVerts)
+    loopStarts = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_start', loopStarts)
+    loopTotals = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', loopTotals)
+
+    selected = np.flatnonzero(get_select_flags(mesh.polygons))
+    return [loopVerts[loopStarts[idx]:loopStarts[idx] + loopTotals[idx]] for idx in selected.tolist()]
+
+
+def get_select_history(myobject):
+    # Elements in the order they were selected. The history is only
+    # exposed on a bmesh, the edit bmesh is used when there is one
+    if myobject.type != 'MESH':
+        return np.empty(0, dtype=np.int32)
+    if myobject.mode == 'EDIT':
+        bm = bmesh.from_edit_mesh(myobject.data)
+        history = [elem.index for elem in bm.select_history]
+    else:
+        bm = bmesh.new()
+        bm.from_mesh(myobject.data)
+        history = [elem.index for elem in bm.select_history]
+        bm.free()
+    return np.array(history, dtype=np.int32)
+
+
+def get_selection(objects):
+    # Selected verts and edges of each mesh object, keyed by object name.
+    # Edit meshes are synced once, so an operator reading several
+    # objects pays for one write back per object
+    sync_edit_meshes(objects)
+    selection = {}
+    for myobject in objects:
+        if myobject.type != 'MESH':
+            continue
+        mesh = myobject.data
+        selection[myobject.name] = {
+            'verts': read_selected_verts(mesh),
+            'edges': read_selected_edges(mesh),
+            'vertCount': len(mesh.vertices),
+        }
+    return selection
+
+
+def get_edit_selection(context):
+    # Selected verts and edges of every object in edit mode,
+    # keyed by object name
+    return get_selection(list(context.objects_in_mode))
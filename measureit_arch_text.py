@@ -0,0 +1,404 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_text.py
+# Text label atlas, packs rasterized labels into shared textures
+# and font registry used for rasterizing them
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import bpy
+import bgl
+import blf
+import gpu
+from gpu_extras.batch import batch_for_shader
+import numpy as np
+
+from .shaders import Text_Shader
+
+
+# Shaders need a GPU, background sessions only use the layout capture
+if not bpy.app.background:
+    textShader = gpu.types.GPUShader(
+        Text_Shader.vertex_shader,
+        Text_Shader.fragment_shader)
+else:
+    textShader = None
+
+# Size of an atlas page in pixels, and the most pages kept. Labels
+# that don't fit in a full atlas get a texture of their own, pages
+# are only evicted between frames
+atlasSize = 2048
+atlasMaxPages = 8
+atlasPadding = 1
+
+# Pages where less than this part of the allocated area still holds
+# live labels are reset when the atlas is full
+atlasCompactRatio = 0.5
+
+# Atlas pages, each page is a dict holding its GL texture name,
+# shelves as [y, height, x] lists filled left to right, the frame it
+# was last drawn from and its allocated and live area in pixels.
+# Pages are single channel, labels are stored as 8-bit coverage masks
+atlasPages = []
+
+# Label rects keyed by (ID name, text field path)
+atlasEntries = {}
+
+# Textures of labels that didn't fit in the atlas, keyed like atlasEntries
+overflowTextures = {}
+
+# Quads queued for this frame, keyed by (texture, inFront)
+atlasQuads = {}
+
+# Frame counter, and whether an allocation failed this frame
+atlasState = {'frame': 0, 'full': False}
+
+# Cards of labels whose text changed while rendering a frame, queued
+# by queue_pending_text() once the labels are rasterized again
+pendingText = []
+
+# Reused offscreen for rasterizing labels, grown when needed
+textOffscreen = None
+
+# Fonts loaded with blf keyed by (font name, filepath), and text
+# heights keyed by (font_id, size, resolution)
+fontIds = {}
+fontHeights = {}
+
+
+def get_font_id(font):
+    # Each font file is only loaded once, the default font is id 0
+    if font is None or font.name == 'Bfont' or font.filepath == '<builtin>':
+        return 0
+    key = (font.name, font.filepath)
+    if key not in fontIds:
+        font_id = blf.load(font.filepath)
+        if font_id == -1:
+            print("MeasureIt-ARCH: Unable to load font " + font.filepath)
+            font_id = 0
+        fontIds[key] = font_id
+    return fontIds[key]
+
+
+def get_font_height(font_id, size, resolution):
+    key = (font_id, size, resolution)
+    if key not in fontHeights:
+        blf.size(font_id, size, resolution)
+        fontHeights[key] = blf.dimensions(font_id, 'Tp')[1]
+    return fontHeights[key]
+
+
+def clear_fonts():
+    for (name, filepath), font_id in fontIds.items():
+        if font_id != 0:
+            blf.unload(filepath)
+    fontIds.clear()
+    fontHeights.clear()
+
+
+def get_text_offscreen(width, height):
+    global textOffscreen
+    if textOffscreen is None or textOffscreen.width < width or textOffscreen.height < height:
+        if textOffscreen is not None:
+            width = max(width, textOffscreen.width)
+            height = max(height, textOffscreen.height)
+            textOffscreen.free()
+        textOffscreen = gpu.types.GPUOffScreen(width, height)
+    return textOffscreen
+
+
+def new_mask_texture(width, height, buffer):
+    # Single channel texture, buffer holds its initial contents
+    texName = bgl.Buffer(bgl.GL_INT, 1)
+    bgl.glGenTextures(1, texName)
+    bgl.glBindTexture(bgl.GL_TEXTURE_2D, texName[0])
+    bgl.glPixelStorei(bgl.GL_UNPACK_ALIGNMENT, 1)
+    bgl.glTexImage2D(bgl.GL_TEXTURE_2D, 0, bgl.GL_R8, width, height, 0,
+                     bgl.GL_RED, bgl.GL_UNSIGNED_BYTE, buffer)
+    bgl.glPixelStorei(bgl.GL_UNPACK_ALIGNMENT, 4)
+    bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MIN_FILTER, bgl.GL_LINEAR)
+    bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_MAG_FILTER, bgl.GL_LINEAR)
+    bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+    return texName[0]
+
+
+def delete_texture(texture):
+    texName = bgl.Buffer(bgl.GL_INT, 1, [texture])
+    bgl.glDeleteTextures(1, texName)
+
+
+def new_atlas_page():
+    emptyBuffer = bgl.Buffer(bgl.GL_BYTE, atlasSize * atlasSize)
+    page = {'texture': new_mask_texture(atlasSize, atlasSize, emptyBuffer),
+            'shelves': [], 'top': 0, 'used': atlasState['frame'],
+            'allocated': 0, 'live': 0}
+    atlasPages.append(page)
+    return len(atlasPages) - 1
+
+
+def clear_text_atlas():
+    for page in atlasPages:
+        delete_texture(page['texture'])
+    for overflow in overflowTextures.values():
+        delete_texture(overflow['texture'])
+    atlasPages.clear()
+    atlasEntries.clear()
+    overflowTextures.clear()
+    atlasQuads.clear()
+    atlasState['full'] = False
+
+
+def reset_atlas_page(pageIdx):
+    # Empties a page, its labels are uploaded again when next drawn
+    page = atlasPages[pageIdx]
+    page['shelves'] = []
+    page['top'] = 0
+    page['allocated'] = 0
+    page['live'] = 0
+    for key in [key for key, entry in atlasEntries.items() if entry['alloc'][0] == pageIdx]:
+        del atlasEntries[key]
+
+
+def evict_atlas_pages():
+    # Runs between frames when an allocation failed. Pages no label was
+    # drawn from last frame are reset first, otherwise the page that
+    # lost the most area to old and resized labels
+    lastFrame = atlasState['frame']
+    stale = [idx for idx, page in enumerate(atlasPages) if page['used'] < lastFrame]
+    if len(stale) == 0:
+        ratios = [(page['live'] / page['allocated'], idx)
+                  for idx, page in enumerate(atlasPages) if page['allocated'] > 0]
+        if len(ratios) > 0 and min(ratios)[0] < atlasCompactRatio:
+            stale = [min(ratios)[1]]
+    for pageIdx in stale:
+        reset_atlas_page(pageIdx)
+
+
+def pack_rect(page, width, height):
+    # Simple shelf packer, returns the (x, y) of the rect or None if full
+    width += atlasPadding * 2
+    height += atlasPadding * 2
+    for shelf in page['shelves']:
+        if shelf[1] >= height and shelf[2] + width <= atlasSize:
+            x = shelf[2]
+            shelf[2] += width
+            page['allocated'] += shelf[1] * width
+            return (x + atlasPadding, shelf[0] + atlasPadding)
+
+    if page['top'] + height <= atlasSize and width <= atlasSize:
+        page['shelves'].append([page['top'], height, width])
+        y = page['top']
+        page['top'] += height
+        page['allocated'] += height * width
+        return (atlasPadding, y + atlasPadding)
+    return None
+
+
+def allocate_rect(width, height):
+    # Returns None when every page is full, the pages in use this
+    # frame are kept and evict_atlas_pages() makes room after it
+    for pageIdx, page in enumerate(atlasPages):
+        pos = pack_rect(page, width, height)
+        if pos is not None:
+            return (pageIdx, pos[0], pos[1])
+
+    if len(atlasPages) >= atlasMaxPages:
+        atlasState['full'] = True
+        return None
+    pageIdx = new_atlas_page()
+    pos = pack_rect(atlasPages[pageIdx], width, height)
+    if pos is None:
+        return None
+    return (pageIdx, pos[0], pos[1])
+
+
+def rect_area(width, height):
+    return (width + atlasPadding * 2) * (height + atlasPadding * 2)
+
+
+def get_overflow_texture(key, textField, mask):
+    # Texture of its own for a label that didn't fit in the atlas
+    width = textField.textWidth
+    height = textField.textHeight
+    overflow = overflowTextures.get(key)
+    if (overflow is not None and not textField.texture_updated
+            and overflow['text'] == textField.text
+            and overflow['size'] == (width, height)):
+        overflow['used'] = atlasState['frame']
+        return overflow['rect']
+
+    if overflow is not None:
+        delete_texture(overflow['texture'])
+    buffer = bgl.Buffer(bgl.GL_BYTE, width * height, mask)
+    texture = new_mask_texture(width, height, buffer)
+    textField.texture_updated = False
+
+    rect = (texture, 0, 0, width, height, width, height)
+    overflowTextures[key] = {'texture': texture, 'rect': rect, 'text': textField.text,
+                             'size': (width, height), 'used': atlasState['frame']}
+    return rect
+
+
+def get_atlas_entry(textField):
+    # Returns (texture, x, y, width, height, texture width, texture height)
+    # of textField, uploading its mask only if it isn't there or has changed
+    width = textField.textWidth
+    height = textField.textHeight
+    if 'textureMask' not in textField or width == 0 or height == 0:
+        return None
+
+    key = (textField.id_data.name, textField.path_from_id())
+    entry = atlasEntries.get(key)
+    if (entry is not None and not textField.texture_updated
+            and entry['text'] == textField.text
+            and entry['size'] == (width, height)):
+        atlasPages[entry['alloc'][0]]['used'] = atlasState['frame']
+        return entry['rect']
+
+    mask = np.frombuffer(textField['textureMask'], dtype=np.int8)
+    if len(mask) != width * height:
+        return None
+
+    # Reuse the old rect if the new label still fits in it
+    if entry is not None and entry['alloc'][3] >= width and entry['alloc'][4] >= height:
+        alloc = entry['alloc']
+    else:
+        pos = None
+        if width + atlasPadding * 2 <= atlasSize and height + atlasPadding * 2 <= atlasSize:
+            pos = allocate_rect(width, height)
+        if entry is not None:
+            # The old rect is dead space until its page is reset
+            atlasPages[entry['alloc'][0]]['live'] -= rect_area(entry['alloc'][3], entry['alloc'][4])
+            del atlasEntries[key]
+        if pos is None:
+            return get_overflow_texture(key, textField, mask)
+        alloc = (pos[0], pos[1], pos[2], width, height)
+        atlasPages[pos[0]]['live'] += rect_area(width, height)
+
+    if key in overflowTextures:
+        delete_texture(overflowTextures.pop(key)['texture'])
+
+    pageIdx, x, y = alloc[0], alloc[1], alloc[2]
+    atlasPages[pageIdx]['used'] = atlasState['frame']
+    buffer = bgl.Buffer(bgl.GL_BYTE, width * height, mask)
+    bgl.glBindTexture(bgl.GL_TEXTURE_2D, atlasPages[pageIdx]['texture'])
+    bgl.glPixelStorei(bgl.GL_UNPACK_ALIGNMENT, 1)
+    bgl.glTexSubImage2D(bgl.GL_TEXTURE_2D, 0, x, y, width, height,
+                        bgl.GL_RED, bgl.GL_UNSIGNED_BYTE, buffer)
+    bgl.glPixelStorei(bgl.GL_UNPACK_ALIGNMENT, 4)
+    bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+    textField.texture_updated = False
+
+    rect = (atlasPages[pageIdx]['texture'], x, y, width, height, atlasSize, atlasSize)
+    atlasEntries[key] = {'rect': rect, 'alloc': alloc, 'text': textField.text, 'size': (width, height)}
+    return rect
+
+
+def queue_text(textField, inFront, card, uvs, color):
+    # Queue a text card to be drawn with the rest of its atlas page
+    rect = get_atlas_entry(textField)
+    if rect is None:
+        return
+    texture, x, y, width, height, texWidth, texHeight = rect
+
+    # Map the card's 0-1 uvs into the label's rect on its texture
+    atlasUVs = [((x + uv[0] * width) / texWidth, (y + uv[1] * height) / texHeight) for uv in uvs]
+
+    quads = atlasQuads.setdefault((texture, inFront), {'pos': [], 'uv': [], 'color': []})
+    for idx in (0, 1, 2, 0, 2, 3):
+        quads['pos'].append(tuple(card[idx]))
+        quads['uv'].append(atlasUVs[idx])
+        quads['color'].append(color)
+
+
+def defer_text(textField, inFront, card, uvs, color, anchor):
+    # anchor is the (x, y) fraction of the card that stays in place when
+    # its size changes, the size the card was laid out for is kept with it
+    pendingText.append((textField, inFront, [tuple(co) for co in card], uvs, color, anchor,
+                        (textField.textWidth, textField.textHeight)))
+
+
+def queue_pending_text():
+    # Queues the deferred cards fitted to their labels' new size. Returns
+    # False if a card was laid out before its label had a size, the
+    # frame has to be laid out again for those
+    fitted = True
+    for textField, inFront, card, uvs, color, anchor, size in pendingText:
+        if size[0] == 0 or size[1] == 0:
+            fitted = False
+            continue
+        card = np.array(card)
+        axisX = (card[3] - card[0]) * (textField.textWidth / size[0])
+        axisY = (card[1] - card[0]) * (textField.textHeight / size[1])
+        base = card[0] + (card[3] - card[0]) * anchor[0] + (card[1] - card[0]) * anchor[1]
+        corner = base - axisX * anchor[0] - axisY * anchor[1]
+        card = (corner, corner + axisY, corner + axisX + axisY, corner + axisX)
+        queue_text(textField, inFront, card, uvs, color)
+    pendingText.clear()
+    return fitted
+
+
+def draw_text_queue():
+    # Draw all queued labels, one batch per atlas page or overflow texture
+    bgl.glEnable(bgl.GL_BLEND)
+    bgl.glDepthMask(False)
+    textShader.bind()
+    textShader.uniform_int("image", 0)
+    bgl.glActiveTexture(bgl.GL_TEXTURE0)
+
+    for (texture, inFront), quads in atlasQuads.items():
+        if inFront:
+            bgl.glDisable(bgl.GL_DEPTH_TEST)
+        else:
+            bgl.glEnable(bgl.GL_DEPTH_TEST)
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, texture)
+        batch = batch_for_shader(textShader, 'TRIS', {"pos": quads['pos'], "uv": quads['uv'], "color": quads['color']})
+        batch.draw(textShader)
+
+    bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+    gpu.shader.unbind()
+    bgl.glDisable(bgl.GL_DEPTH_TEST)
+    bgl.glDepthMask(True)
+    atlasQuads.clear()
+    end_text_frame()
+
+
+def end_text_frame():
+    # Frees the overflow textures not drawn this frame, and makes room
+    # in the atlas if it ran out this frame. Nothing drawn from the
+    # atlas is queued between frames, so pages can be reset here
+    frame = atlasState['frame']
+    for key in [key for key, overflow in overflowTextures.items() if overflow['used'] < frame]:
+        delete_texture(overflowTextures.pop(key)['texture'])
+
+    if atlasState['full']:
+        atlasState['full'] = False
+        evict_atlas_pages()
+    atlasState['frame'] += 1
+
+
+def unregister():
+    global textOffscreen
+    clear_text_atlas()
+    clear_fonts()
+    if textOffscreen is not None:
+        textOffscreen.free()
+        textOffscreen = None
@@ -0,0 +1,194 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_units.py
+# Distance formatting, formatters are compiled once from the scene's
+# unit settings and rebuilt when those settings change
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import bpy
+from bpy.app.handlers import persistent
+from collections import OrderedDict
+from math import floor, log2
+
+import numpy as np
+
+
+toInches = 39.3700787401574887
+
+# Formatted strings kept by each formatter
+cacheSize = 4096
+
+# generation is bumped whenever unit settings change, formatters
+# compiled for an older generation are rebuilt on their next use
+unitState = {'generation': 0}
+
+# Compiled formatters keyed by (scene name, number format)
+formatters = {}
+
+# Owner of the unit settings subscriptions
+msgbusOwner = object()
+
+# Suffix and multiplier of the metric length units, adaptive units
+# use the first of these the value rounds to at least 1 in
+metricUnits = {
+    'METERS': (" m", 1),
+    'CENTIMETERS': (" cm", 100),
+    'MILLIMETERS': (" mm", 1000),
+}
+adaptiveUnits = ('METERS', 'CENTIMETERS', 'MILLIMETERS')
+
+
+def invalidate_formatters(*args):
+    unitState['generation'] += 1
+
+def update_units(self, context):
+    invalidate_formatters()
+
+def subscribe_unit_settings():
+    # msgbus subscriptions don't survive file loads, see load_handler()
+    bpy.msgbus.clear_by_owner(msgbusOwner)
+    for prop in ('system', 'scale_length', 'length_unit'):
+        bpy.msgbus.subscribe_rna(
+            key=(bpy.types.UnitSettings, prop),
+            owner=msgbusOwner,
+            args=(),
+            notify=invalidate_formatters)
+    invalidate_formatters()
+
+@persistent
+def unit_change_handler(dummy):
+    # Undo, keyframes and drivers change unit settings without msgbus
+    # notifications or update callbacks
+    invalidate_formatters()
+
+def get_formatter(scene, fmt):
+    key = (scene.name, fmt)
+    formatter = formatters.get(key)
+    if formatter is None or formatter.generation != unitState['generation']:
+        formatter = formatters[key] = DistanceFormatter(scene, fmt)
+    return formatter
+
+
+class DistanceFormatter():
+    # Formats lengths in scene units with fmt, a "%1.2f" style format.
+    # Imperial lengths are feet, inches and fractions of an inch
+    def __init__(self, scene, fmt):
+        unitSettings = scene.unit_settings
+        self.generation = unitState['generation']
+        self.scale = unitSettings.scale_length
+        self.system = unitSettings.system
+        self.lengthUnit = unitSettings.length_unit
+        self.fmt = fmt
+        self.cache = OrderedDict()
+
+        # Formats and multipliers of the metric units this formatter uses
+        hideUnits = scene.measureit_arch_hide_units
+        if self.lengthUnit in metricUnits:
+            units = (self.lengthUnit,)
+        else:
+            units = adaptiveUnits
+        self.metricFormats = tuple(fmt if hideUnits else fmt + metricUnits[unit][0] for unit in units)
+        self.metricMultipliers = np.array([metricUnits[unit][1] for unit in units], dtype=np.float64)
+
+        # Reduced numerator and denominator of every fraction of an inch
+        self.base = int(scene.measureit_arch_imperial_precision)
+        self.fractions = []
+        for frac in range(self.base + 1):
+            numerator = frac
+            denominator = self.base
+            for i in range(int(log2(self.base))):
+                if numerator % 2 != 0:
+                    break
+                numerator //= 2
+                denominator //= 2
+            self.fractions.append((numerator, denominator))
+
+    def format(self, value):
+        text = self.cache.get(value)
+        if text is not None:
+            self.cache.move_to_end(value)
+            return text
+
+        scaled = value * self.scale
+        if self.system == 'IMPERIAL':
+            text = self.format_imperial(*self.split_imperial(scaled))
+        elif self.system == 'METRIC':
+            unitIdx = 0
+            if len(self.metricFormats) > 1:
+                if round(scaled, 2) < 1.0:
+                    unitIdx = 1 if round(scaled, 2) >= 0.01 else 2
+            text = self.metricFormats[unitIdx] % (scaled * self.metricMultipliers[unitIdx])
+        else:
+            text = self.fmt % scaled
+
+        self.cache[value] = text
+        if len(self.cache) > cacheSize:
+            self.cache.popitem(last=False)
+        return text
+
+    def split_imperial(self, value):
+        # Feet, whole inches and fraction numerator of a length in meters
+        decInches = value * toInches
+
+        # Seperate ft and inches
+        # Unless Inches are the specified Length Unit
+        feet = 0
+        if self.lengthUnit != 'INCHES':
+            feet = floor(decInches / 12)
+            decInches -= feet * 12
+
+        inches = floor(decInches)
+        frac = round(self.base * (decInches - inches))
+        if frac == self.base:
+            frac = 0
+            inches += 1
+        return feet, inches, frac
+
+    def format_imperial(self, feet, inches, frac):
+        numerator, denominator = self.fractions[frac]
+
+        # Check values and compose string
+        text = ""
+        if feet != 0:
+            text += str(feet) + "' "
+        if inches != 0:
+            text += str(inches)
+            text += "-" if numerator != 0 else "\""
+        if numerator != 0:
+            text += str(numerator) + "/" + str(denominator) + "\""
+        return text
+
+
+unitHandlers = (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post, bpy.app.handlers.frame_change_post)
+
+def register():
+    subscribe_unit_settings()
+    for handlers in unitHandlers:
+        if unit_change_handler not in handlers:
+            handlers.append(unit_change_handler)
+
+def unregister():
+    bpy.msgbus.clear_by_owner(msgbusOwner)
+    for handlers in unitHandlers:
+        if unit_change_handler in handlers:
+            handlers.remove(unit_change_handler)
+    formatters.clear()
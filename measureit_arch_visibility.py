@@ -0,0 +1,217 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+
+# ----------------------------------------------------------
+# File: measureit_arch_visibility.py
+# Hidden line classification on the CPU, splits line segments
+# into visible and hidden pieces for a camera by ray casting
+# against a BVH of the scene's meshes
+# Author: Kevan Cress
+#
+# ----------------------------------------------------------
+import numpy as np
+from mathutils.bvhtree import BVHTree
+
+from .measureit_arch_geometry import get_geometry_revision
+
+
+# Segments are split into pieces about this many pixels long,
+# each piece is visible or hidden as a whole
+samplePixels = 6
+maxSamples = 256
+
+# Samples are processed in chunks to bound the memory used
+chunkSize = 65536
+
+# Occluders in front of a sample by less than this fraction of
+# its depth are ignored, lines lie on the faces they outline
+depthTolerance = 0.001
+
+# BVH of the scene's meshes in world space, see get_scene_bvh()
+sceneBVH = {'key': None, 'tree': None}
+
+# Classified segments keyed by (camera name, line group key), each
+# entry holds the splits of every set of coords drawn for the group
+# (instances share a group) until the camera or the scene changes
+visibilityCache = {}
+
+
+def clear_visibility_cache():
+    sceneBVH['key'] = None
+    sceneBVH['tree'] = None
+    visibilityCache.clear()
+
+
+def get_camera_matrix(scene, depsgraph, width, height):
+    # Combined projection and view matrix of the scene camera
+    projection = scene.camera.calc_matrix_camera(depsgraph, x=width, y=height)
+    return np.array(projection @ scene.camera.matrix_world.inverted(), dtype=np.float64)
+
+
+def project_coords(coords, matrix, width, height):
+    # Projects world coords to sheet pixels, y down. Also returns
+    # w, points behind the camera have w <= 0
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 3)
+    co = coords @ matrix[:3, :3].T + matrix[:3, 3]
+    w = coords @ matrix[3, :3] + matrix[3, 3]
+    safeW = np.where(np.abs(w) < 1e-12, 1e-12, w)
+    x = (co[:, 0] / safeW + 1) * 0.5 * width
+    y = (1 - co[:, 1] / safeW) * 0.5 * height
+    return np.stack((x, y), axis=1), w
+
+
+def get_scene_bvh(depsgraph):
+    # One BVH for every mesh draw_scene() renders, rebuilt only when one
+    # of them moved or its geometry revision changed
+    instances = []
+    for obj_int in depsgraph.object_instances:
+        obj = obj_int.object
+        if obj.type != 'MESH' or obj.hide_render:
+            continue
+        matrix = obj_int.matrix_world.copy()
+        key = (obj.original.name, get_geometry_revision(obj.original), tuple(tuple(row) for row in matrix))
+        instances.append((key, obj, matrix))
+
+    bvhKey = tuple(instance[0] for instance in instances)
+    if sceneBVH['key'] == bvhKey:
+        return sceneBVH['tree']
+
+    allVerts = []
+    allTris = []
+    vertOffset = 0
+    for key, obj, matrix in instances:
+        mesh = obj.to_mesh()
+        if mesh is None:
+            continue
+        mesh.calc_loop_triangles()
+        numVerts = len(mesh.vertices)
+        numTris = len(mesh.loop_triangles)
+        if numVerts != 0 and numTris != 0:
+            verts = np.empty(numVerts * 3, dtype=np.float64)
+            mesh.vertices.foreach_get('co', verts)
+            verts = verts.reshape(-1, 3)
+            rot = np.array(matrix.to_3x3(), dtype=np.float64)
+            loc = np.array(matrix.to_translation(), dtype=np.float64)
+            allVerts.append(verts @ rot.T + loc)
+
+            tris = np.empty(numTris * 3, dtype=np.int64)
+            mesh.loop_triangles.foreach_get('vertices', tris)
+            allTris.append(tris.reshape(-1, 3) + vertOffset)
+            vertOffset += numVerts
+        obj.to_mesh_clear()
+
+    if len(allVerts) != 0:
+        tree = BVHTree.FromPolygons(np.concatenate(allVerts).tolist(), np.concatenate(allTris).tolist())
+    else:
+        tree = None
+
+    sceneBVH['key'] = bvhKey
+    sceneBVH['tree'] = tree
+    return tree
+
+
+def classify_samples(tree, points, camera):
+    # Returns a bool array, True where a sample is hidden by the scene
+    camMatrix = np.array(camera.matrix_world, dtype=np.float64)
+    camLoc = camMatrix[:3, 3]
+    viewDir = -camMatrix[:3, 2] / np.linalg.norm(camMatrix[:3, 2])
+
+    # Rays start at the camera, or on its plane for orthographic cameras
+    if camera.data.type == 'ORTHO':
+        dists = (points - camLoc) @ viewDir
+        origins = points - viewDir * dists[:, None]
+        directions = np.broadcast_to(viewDir, points.shape)
+    else:
+        directions = points - camLoc
+        dists = np.linalg.norm(directions, axis=1)
+        origins = np.broadcast_to(camLoc, points.shape)
+    maxDists = dists * (1 - depthTolerance)
+
+    hidden = np.zeros(len(points), dtype=bool)
+    for idx, (origin, direction, maxDist) in enumerate(zip(origins.tolist(), directions.tolist(), maxDists.tolist())):
+        if maxDist <= 0:
+            continue
+        location, normal, faceIdx, hitDist = tree.ray_cast(origin, direction, maxDist)
+        if location is not None:
+            hidden[idx] = True
+    return hidden
+
+
+def split_segments(coords, camera, tree, matrix, width, height):
+    # Splits the segments in coords, pairs of world space points, into
+    # (visible, hidden) coords. Pieces with the same state are merged
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2, 3)
+    if tree is None or len(coords) == 0:
+        return coords.reshape(-1, 3), np.empty((0, 3))
+
+    # Number of pieces per segment from its length on the sheet
+    points, w = project_coords(coords.reshape(-1, 3), matrix, width, height)
+    pixelLength = np.linalg.norm(points[1::2] - points[0::2], axis=1)
+    pixelLength[(w.reshape(-1, 2) <= 0).any(axis=1)] = 0
+    numPieces = np.clip(np.ceil(pixelLength / samplePixels), 1, maxSamples).astype(np.int64)
+
+    segIdx = np.repeat(np.arange(len(coords)), numPieces)
+    firstPiece = np.repeat(np.cumsum(numPieces) - numPieces, numPieces)
+    pieceIdx = np.arange(len(segIdx)) - firstPiece
+    t0 = (pieceIdx / numPieces[segIdx])[:, None]
+    t1 = ((pieceIdx + 1) / numPieces[segIdx])[:, None]
+    starts = coords[segIdx, 0]
+    delta = coords[segIdx, 1] - starts
+    pieceStarts = starts + delta * t0
+    pieceEnds = starts + delta * t1
+
+    # Classify the middle of each piece
+    mids = (pieceStarts + pieceEnds) / 2
+    hidden = np.empty(len(mids), dtype=bool)
+    for chunk in range(0, len(mids), chunkSize):
+        hidden[chunk:chunk + chunkSize] = classify_samples(tree, mids[chunk:chunk + chunkSize], camera)
+
+    # Merge runs of pieces on the same segment with the same state
+    runStart = np.ones(len(mids), dtype=bool)
+    runStart[1:] = (segIdx[1:] != segIdx[:-1]) | (hidden[1:] != hidden[:-1])
+    startIdx = np.flatnonzero(runStart)
+    endIdx = np.append(startIdx[1:], len(mids)) - 1
+    runs = np.stack((pieceStarts[startIdx], pieceEnds[endIdx]), axis=1)
+    runHidden = hidden[startIdx]
+
+    return runs[~runHidden].reshape(-1, 3), runs[runHidden].reshape(-1, 3)
+
+
+def get_line_visibility(scene, depsgraph, group, coords, matrix, width, height):
+    # Cached split_segments() for a line group, reused until the camera,
+    # the sheet, the scene meshes or the line group's coords change
+    tree = get_scene_bvh(depsgraph)
+    coords = np.ascontiguousarray(coords, dtype=np.float32)
+    cacheKey = (scene.camera.name, group)
+    revision = (sceneBVH['key'], matrix.tobytes(), width, height)
+
+    entry = visibilityCache.get(cacheKey)
+    if entry is None or entry['revision'] != revision:
+        entry = {'revision': revision, 'splits': {}}
+        visibilityCache[cacheKey] = entry
+
+    # Keyed by the coords themselves, a checksum can collide
+    coordsKey = coords.tobytes()
+    if coordsKey not in entry['splits']:
+        entry['splits'][coordsKey] = split_segments(coords, scene.camera, tree, matrix, width, height)
+    return entry['splits'][coordsKey]
+
+
+def unregister():
+    clear_visibility_cache()
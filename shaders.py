@@ -553,8 +553,10 @@ class Text_Shader():
 
     in vec3 pos;
     in vec2 uv;
+    in vec4 color;
 
     out vec2 uvInterp;
+    out vec4 colorInterp;
 
     vec4 project = ModelViewProjectionMatrix * vec4(pos, 1.0);
     vec4 vecOffset = vec4(0.0,0.0,-0.001,0.0);
@@ -562,6 +564,7 @@ class Text_Shader():
     void main()
     {
         uvInterp = uv;
+        colorInterp = color;
         gl_Position = project + vecOffset;
     }
     '''
@@ -570,11 +573,13 @@ class Text_Shader():
         uniform sampler2D image;
 
         in vec2 uvInterp;
+        in vec4 colorInterp;
         out vec4 fragColor;
 
+        // image is a single channel coverage mask
         void main()
         {
-            fragColor = texture(image, uvInterp);
+            fragColor = vec4(colorInterp.rgb, colorInterp.a * texture(image, uvInterp).r);
         }
     '''
 